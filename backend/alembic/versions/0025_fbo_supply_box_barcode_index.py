@@ -0,0 +1,24 @@
+"""Index fbo_supply_boxes.external_barcode for scanner lookups.
+
+Revision ID: 0025_fbo_supply_box_barcode_index
+Revises: 0024_fbo_supply_box_external_id
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+
+
+revision = "0025_fbo_supply_box_barcode_index"
+down_revision = "0024_fbo_supply_box_external_id"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_fbo_supply_boxes_external_barcode", "fbo_supply_boxes", ["external_barcode"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_fbo_supply_boxes_external_barcode", table_name="fbo_supply_boxes")
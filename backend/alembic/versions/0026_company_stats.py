@@ -0,0 +1,84 @@
+"""Add company_stats (materialized per-company aggregates) and orders.defect_qty.
+
+Revision ID: 0026_company_stats
+Revises: 0025_fbo_supply_box_barcode_index
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0026_company_stats"
+down_revision = "0025_fbo_supply_box_barcode_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("orders", sa.Column("defect_qty", sa.Integer(), nullable=False, server_default="0"))
+    op.execute(
+        """
+        UPDATE orders SET defect_qty = sub.total
+        FROM (SELECT order_id, COALESCE(SUM(defect_qty), 0) AS total FROM order_items GROUP BY order_id) AS sub
+        WHERE orders.id = sub.order_id
+        """
+    )
+    op.create_table(
+        "company_stats",
+        sa.Column("company_id", sa.Integer(), nullable=False),
+        sa.Column("products_total", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("stock_quantity", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("defect_quantity", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("products_with_defects", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("orders_total", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("orders_open", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("orders_planned_qty", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("orders_received_qty", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("orders_packed_qty", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.ForeignKeyConstraint(["company_id"], ["companies.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("company_id"),
+    )
+    op.execute(
+        """
+        INSERT INTO company_stats (
+            company_id, products_total, stock_quantity, defect_quantity, products_with_defects,
+            orders_total, orders_open, orders_planned_qty, orders_received_qty, orders_packed_qty
+        )
+        SELECT
+            c.id,
+            COALESCE(p.products_total, 0),
+            COALESCE(p.stock_quantity, 0),
+            COALESCE(p.defect_quantity, 0),
+            COALESCE(p.products_with_defects, 0),
+            COALESCE(o.orders_total, 0),
+            COALESCE(o.orders_open, 0),
+            COALESCE(o.planned, 0),
+            COALESCE(o.received, 0),
+            COALESCE(o.packed, 0)
+        FROM companies c
+        LEFT JOIN (
+            SELECT company_id,
+                   COUNT(*) AS products_total,
+                   SUM(stock_quantity) AS stock_quantity,
+                   SUM(defect_quantity) AS defect_quantity,
+                   SUM(CASE WHEN defect_quantity > 0 THEN 1 ELSE 0 END) AS products_with_defects
+            FROM products GROUP BY company_id
+        ) p ON p.company_id = c.id
+        LEFT JOIN (
+            SELECT company_id,
+                   COUNT(*) AS orders_total,
+                   SUM(CASE WHEN status <> 'Завершено' THEN 1 ELSE 0 END) AS orders_open,
+                   SUM(planned_qty) AS planned,
+                   SUM(received_qty) AS received,
+                   SUM(packed_qty) AS packed
+            FROM orders GROUP BY company_id
+        ) o ON o.company_id = c.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("company_stats")
+    op.drop_column("orders", "defect_qty")
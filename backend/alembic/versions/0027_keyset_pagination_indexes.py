@@ -0,0 +1,26 @@
+"""Composite (company_id, created_at, id) indexes for keyset pagination.
+
+Revision ID: 0027_keyset_pagination_indexes
+Revises: 0026_company_stats
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+
+
+revision = "0027_keyset_pagination_indexes"
+down_revision = "0026_company_stats"
+branch_labels = None
+depends_on = None
+
+TABLES = ("orders", "products", "fbo_supplies", "shipment_requests")
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        op.create_index(f"ix_{table}_company_created_id", table, ["company_id", "created_at", "id"], unique=False)
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.drop_index(f"ix_{table}_company_created_id", table_name=table)
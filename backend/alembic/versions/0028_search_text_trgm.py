@@ -0,0 +1,53 @@
+"""Normalized search_text with pg_trgm GIN indexes for products and users.
+
+Revision ID: 0028_search_text_trgm
+Revises: 0027_keyset_pagination_indexes
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0028_search_text_trgm"
+down_revision = "0027_keyset_pagination_indexes"
+branch_labels = None
+depends_on = None
+
+# Та же нормализация, что normalize_search_text: нижний регистр, ё → е, одиночные пробелы.
+NORMALIZE_SQL = "btrim(regexp_replace(translate(lower(concat_ws(' ', {columns})), 'ё', 'е'), '\\s+', ' ', 'g'))"
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column("products", sa.Column("search_text", sa.Text(), nullable=True))
+    op.add_column("users", sa.Column("search_text", sa.Text(), nullable=True))
+    op.execute(
+        "UPDATE products SET search_text = "
+        + NORMALIZE_SQL.format(columns="name, brand, barcode, wb_article")
+    )
+    op.execute(
+        "UPDATE users SET search_text = "
+        + NORMALIZE_SQL.format(columns="first_name, last_name, telegram_username")
+    )
+    op.create_index(
+        "ix_products_search_text_trgm",
+        "products",
+        ["search_text"],
+        postgresql_using="gin",
+        postgresql_ops={"search_text": "gin_trgm_ops"},
+    )
+    op.create_index(
+        "ix_users_search_text_trgm",
+        "users",
+        ["search_text"],
+        postgresql_using="gin",
+        postgresql_ops={"search_text": "gin_trgm_ops"},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_search_text_trgm", table_name="users")
+    op.drop_index("ix_products_search_text_trgm", table_name="products")
+    op.drop_column("users", "search_text")
+    op.drop_column("products", "search_text")
@@ -0,0 +1,26 @@
+"""Add variants (variant name → S3 key) to order_photos and product_photos.
+
+Revision ID: 0029_photo_variants
+Revises: 0028_search_text_trgm
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0029_photo_variants"
+down_revision = "0028_search_text_trgm"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("order_photos", sa.Column("variants", postgresql.JSONB(), nullable=True))
+    op.add_column("product_photos", sa.Column("variants", postgresql.JSONB(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("product_photos", "variants")
+    op.drop_column("order_photos", "variants")
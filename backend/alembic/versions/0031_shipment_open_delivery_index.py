@@ -0,0 +1,28 @@
+"""Partial index on delivery_date of not yet shipped shipment requests (auto-close scheduler).
+
+Revision ID: 0031_shipment_open_delivery_index
+Revises: 0030_notification_outbox
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0031_shipment_open_delivery_index"
+down_revision = "0030_notification_outbox"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_shipment_requests_open_delivery_date",
+        "shipment_requests",
+        ["delivery_date"],
+        postgresql_where=sa.text("status <> 'Отгружено'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_shipment_requests_open_delivery_date", table_name="shipment_requests")
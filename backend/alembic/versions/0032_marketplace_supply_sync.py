@@ -0,0 +1,42 @@
+"""Add marketplace_sync_state and fbo_supplies.synced_at (background supply sync).
+
+Revision ID: 0032_marketplace_supply_sync
+Revises: 0031_shipment_open_delivery_index
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0032_marketplace_supply_sync"
+down_revision = "0031_shipment_open_delivery_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("fbo_supplies", sa.Column("synced_at", sa.DateTime(), nullable=True))
+    op.create_index(
+        "ix_fbo_supplies_company_marketplace_external",
+        "fbo_supplies",
+        ["company_id", "marketplace", "external_supply_id"],
+    )
+    op.create_table(
+        "marketplace_sync_state",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("companies.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("marketplace", sa.String(length=32), nullable=False),
+        sa.Column("cursor", sa.String(length=64), nullable=True),
+        sa.Column("synced_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.String(length=512), nullable=True),
+        sa.UniqueConstraint("company_id", "marketplace", name="uq_marketplace_sync_state_company"),
+    )
+    op.create_index("ix_marketplace_sync_state_company_id", "marketplace_sync_state", ["company_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_marketplace_sync_state_company_id", table_name="marketplace_sync_state")
+    op.drop_table("marketplace_sync_state")
+    op.drop_index("ix_fbo_supplies_company_marketplace_external", table_name="fbo_supplies")
+    op.drop_column("fbo_supplies", "synced_at")
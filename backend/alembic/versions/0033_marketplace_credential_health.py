@@ -0,0 +1,37 @@
+"""Add marketplace_credential_health (cached WB/Ozon credential validation).
+
+Revision ID: 0033_marketplace_credential_health
+Revises: 0032_marketplace_supply_sync
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0033_marketplace_credential_health"
+down_revision = "0032_marketplace_supply_sync"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "marketplace_credential_health",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("companies.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("marketplace", sa.String(length=32), nullable=False),
+        sa.Column("checked_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("last_ok_at", sa.DateTime(), nullable=True),
+        sa.Column("last_failed_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.String(length=512), nullable=True),
+        sa.UniqueConstraint("company_id", "marketplace", name="uq_marketplace_credential_health_company"),
+    )
+    op.create_index(
+        "ix_marketplace_credential_health_company_id", "marketplace_credential_health", ["company_id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_marketplace_credential_health_company_id", table_name="marketplace_credential_health")
+    op.drop_table("marketplace_credential_health")
@@ -0,0 +1,28 @@
+"""Add maintenance_checkpoints (progress of batched background jobs).
+
+Revision ID: 0034_maintenance_checkpoints
+Revises: 0033_marketplace_credential_health
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0034_maintenance_checkpoints"
+down_revision = "0033_marketplace_credential_health"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "maintenance_checkpoints",
+        sa.Column("name", sa.String(length=64), primary_key=True),
+        sa.Column("value", sa.String(length=256), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("maintenance_checkpoints")
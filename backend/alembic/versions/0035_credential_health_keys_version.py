@@ -0,0 +1,23 @@
+"""Add keys_updated_at to marketplace_credential_health (result tied to the checked keys).
+
+Revision ID: 0035_credential_health_keys_version
+Revises: 0034_maintenance_checkpoints
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0035_credential_health_keys_version"
+down_revision = "0034_maintenance_checkpoints"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("marketplace_credential_health", sa.Column("keys_updated_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("marketplace_credential_health", "keys_updated_at")
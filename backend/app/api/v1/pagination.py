@@ -0,0 +1,127 @@
+"""Keyset (cursor) pagination on (created_at, id), newest first.
+
+Курсор — непрозрачная строка (base64 от created_at и id последней строки страницы).
+Следующая страница — WHERE (created_at, id) < курсор по индексу (company_id, created_at, id):
+время ответа не растёт с глубиной, в отличие от OFFSET.
+Поиск ранжирован по релевантности, поэтому его курсор — значения ключей ранжирования и id
+последней строки (ranked_query): порядок страниц тот же, что и в режиме page.
+"""
+import base64
+import json
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy import Select, and_, or_, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql.elements import ColumnElement
+
+RANK_KEY_PREFIX = "rank_key_"
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor for the row after which the next page starts."""
+    raw = json.dumps({"c": created_at.isoformat(), "i": row_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple[datetime, int]:
+    """Parse cursor token. 400 on malformed input."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["c"]), int(data["i"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор пагинации")
+
+
+def keyset_query(
+    query: Select,
+    created_col: InstrumentedAttribute,
+    id_col: InstrumentedAttribute,
+    limit: int,
+    cursor: str | None = None,
+    page: int = 1,
+) -> Select:
+    """Order by (created_at, id) desc and fetch limit + 1 rows (the extra row tells if there is a next page).
+
+    With cursor — keyset condition; without — legacy OFFSET by page (backward compatible).
+    """
+    query = query.order_by(created_col.desc(), id_col.desc())
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(created_col, id_col) < tuple_(created_at, row_id))
+    else:
+        query = query.offset((page - 1) * limit)
+    return query.limit(limit + 1)
+
+
+def _encode_keys(*values: Any) -> str:
+    raw = json.dumps({"k": list(values)}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_keys(token: str, count: int) -> list:
+    """Parse ranked cursor token. 400 on malformed input or a cursor of another list."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))["k"]
+    except (ValueError, KeyError, TypeError):
+        values = None
+    if not isinstance(values, list) or len(values) != count:
+        raise HTTPException(status_code=400, detail="Некорректный курсор пагинации")
+    return values
+
+
+def _after(keys: Sequence[tuple[ColumnElement, bool]], values: Sequence) -> ColumnElement[bool]:
+    """Rows strictly after values in ORDER BY keys (lexicographic, per-key direction)."""
+    condition = None
+    for (expr, descending), value in reversed(list(zip(keys, values))):
+        after = expr < value if descending else expr > value
+        condition = after if condition is None else or_(after, and_(expr == value, condition))
+    return condition
+
+
+def ranked_query(
+    query: Select,
+    keys: Sequence[tuple[ColumnElement, bool]],
+    limit: int,
+    cursor: str | None = None,
+    page: int = 1,
+) -> Select:
+    """Like keyset_query, but ordered by arbitrary (expression, descending) keys, e.g. search relevance + id.
+
+    Значения ключей добавляются в выборку колонками rank_key_N (для next_cursor, см. split_ranked_page).
+    """
+    query = query.add_columns(*(expr.label(f"{RANK_KEY_PREFIX}{index}") for index, (expr, _) in enumerate(keys)))
+    query = query.order_by(*(expr.desc() if descending else expr.asc() for expr, descending in keys))
+    if cursor:
+        query = query.where(_after(keys, _decode_keys(cursor, len(keys))))
+    else:
+        query = query.offset((page - 1) * limit)
+    return query.limit(limit + 1)
+
+
+def split_page(
+    rows: Sequence[Any],
+    limit: int,
+    key=lambda row: (row.created_at, row.id),
+    encode=encode_cursor,
+) -> tuple[list, str | None]:
+    """Trim the extra row and build next_cursor (None on the last page)."""
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode(*key(rows[-1]))
+
+
+def split_ranked_page(rows: Sequence[Any], limit: int, key_count: int) -> tuple[list, str | None]:
+    """split_page for rows of ranked_query with key_count keys."""
+    return split_page(
+        rows,
+        limit,
+        key=lambda row: tuple(row._mapping[f"{RANK_KEY_PREFIX}{index}"] for index in range(key_count)),
+        encode=_encode_keys,
+    )
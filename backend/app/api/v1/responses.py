@@ -0,0 +1,64 @@
+"""Fast JSON for read-only listings: orjson rendering, rows mapped straight to dicts, ETag revalidation.
+
+Списки выбираются select() по колонкам схемы ответа (schema_columns) и отдаются FastJSONResponse
+как есть: без ORM-объектов (identity map, отслеживание изменений) и без повторной валидации
+pydantic. response_model у маршрута остаётся для OpenAPI, набор ключей совпадает с полями схемы.
+"""
+import hashlib
+from collections.abc import Iterable, Sequence
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi import Request
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel
+from sqlalchemy import Row
+from sqlalchemy.sql.elements import ColumnElement
+
+
+def _default(value: Any) -> Any:
+    # Как pydantic в режиме JSON: Decimal — строкой, без потери точности.
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(ORJSONResponse):
+    """orjson response (default response class of the app); Decimal rendered as string."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def schema_columns(schema: type[BaseModel], model: type, **computed: ColumnElement) -> list[ColumnElement]:
+    """Model columns named like the schema fields; computed fields (counts, joined columns) by label."""
+    columns = [getattr(model, name) for name in schema.model_fields if name not in computed]
+    return columns + [expr.label(name) for name, expr in computed.items()]
+
+
+def as_dicts(rows: Iterable[Row], schema: type[BaseModel]) -> list[dict[str, Any]]:
+    """Rows of a schema_columns() select as response dicts (extra columns, e.g. cursor keys, dropped)."""
+    fields: Sequence[str] = tuple(schema.model_fields)
+    return [{name: row._mapping[name] for name in fields} for row in rows]
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match list check: "*" or any listed tag equal to etag by weak comparison (W/ ignored)."""
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def etag_response(request: Request, body: bytes, cache_control: str = "private, no-cache") -> Response:
+    """Pre-rendered JSON body with a strong ETag; 304 without body if If-None-Match matches.
+
+    no-cache: клиент хранит ответ, но каждый раз сверяет ETag — после изменения данных сразу получает новые.
+    """
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -18,13 +18,21 @@ from app.db.models.document_chunk import DocumentChunk
 from app.db.models.service import Service
 from app.db.models.user import User
 from app.db.session import get_db
-from app.schemas.admin import AdminUserOut, AISettingsOut, AISettingsUpdate, RoleUpdate
+from app.schemas.admin import (
+    AdminUserOut,
+    AISettingsOut,
+    AISettingsUpdate,
+    MaintenanceTaskOut,
+    NotificationQueueStats,
+    RoleUpdate,
+)
 from app.schemas.contract_template import (
     ContractTemplateCreate,
     ContractTemplateOut,
     ContractTemplateUpdate,
 )
 from app.services.contract_template_service import (
+    MAX_TEMPLATE_SIZE_BYTES,
     delete_template_files,
     head_check_upload,
     upload_template_file,
@@ -34,10 +42,14 @@ from app.services.document_processor import (
     MAX_DOCUMENT_SIZE_BYTES,
     index_document,
 )
+from app.services.maintenance import maintenance_runner
+from app.services.notifications import outbox_stats
 from app.services.rag import upload_document_to_rag
 from app.services.files import content_disposition
 from app.services.s3 import S3Service
-from app.services.telegram import send_document
+from app.services.search import build_search
+from app.services.telegram import send_cached_document
+from app.services.uploads import UploadTooLarge, read_upload_bytes
 
 router = APIRouter()
 
@@ -49,16 +61,14 @@ async def list_users(
     _: User = Depends(require_roles("admin")),
 ) -> list[AdminUserOut]:
     """List users for admin with optional search by name, telegram_id, username."""
-    query = select(User).order_by(User.created_at.desc())
-    if search and (s := search.strip()):
-        conditions = [
-            User.first_name.ilike(f"%{s}%"),
-            User.last_name.ilike(f"%{s}%"),
-            User.telegram_username.ilike(f"%{s}%"),
-        ]
-        if s.isdigit():
-            conditions.append(User.telegram_id == int(s))
-        query = query.where(or_(*conditions))
+    query = select(User)
+    clause = build_search(User.search_text, search, db.get_bind().dialect.name)
+    if clause is not None:
+        s = search.strip()
+        condition = or_(clause.condition, User.telegram_id == int(s)) if s.isdigit() else clause.condition
+        query = query.where(condition).order_by(*clause.order_by, User.created_at.desc())
+    else:
+        query = query.order_by(User.created_at.desc())
     result = await db.execute(query)
     return list(result.scalars().all())
 
@@ -132,7 +142,12 @@ async def upload_contract_template(
     Upload DOCX or RTF as contract template. RTF is converted to DOCX when generating the contract.
     """
     try:
-        content = await file.read()
+        content = await read_upload_bytes(file, MAX_TEMPLATE_SIZE_BYTES)
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Файл слишком большой. Максимум {MAX_TEMPLATE_SIZE_BYTES // (1024 * 1024)} MB",
+        )
     except Exception as e:
         logger.exception("contract_template_upload_read_failed", error=str(e))
         raise HTTPException(
@@ -145,9 +160,7 @@ async def upload_contract_template(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=err)
     s3 = S3Service()
     try:
-        file_key, docx_key = await asyncio.to_thread(
-            upload_template_file, s3, content, filename, file_type
-        )
+        file_key, docx_key = await s3.run(upload_template_file, s3, content, filename, file_type)
     except Exception as e:
         logger.exception("contract_template_upload_s3_failed", error=str(e))
         raise HTTPException(
@@ -160,7 +173,7 @@ async def upload_contract_template(
     if docx_key:
         ok_docx = await head_check_upload(s3, docx_key)
     if not ok_file or not ok_docx:
-        delete_template_files(s3, file_key, docx_key)
+        await s3.run(delete_template_files, s3, file_key, docx_key)
         logger.warning("contract_template_head_check_failed", file_key=file_key, docx_key=docx_key)
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -184,7 +197,7 @@ async def upload_contract_template(
         await db.refresh(template)
     except IntegrityError:
         await db.rollback()
-        delete_template_files(s3, file_key, docx_key)
+        await s3.run(delete_template_files, s3, file_key, docx_key)
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Другой шаблон уже выбран по умолчанию. Повторите попытку.",
@@ -254,7 +267,7 @@ async def send_contract_template_to_telegram(
     telegram_id = current_user.telegram_id
     s3 = S3Service()
     try:
-        file_bytes = await asyncio.to_thread(s3.get_bytes, template.file_key)
+        file_bytes = await s3.get_bytes_async(template.file_key)
     except Exception as e:
         logger.exception("contract_template_send_failed", template_id=template_id, error=str(e))
         raise HTTPException(
@@ -262,7 +275,7 @@ async def send_contract_template_to_telegram(
         ) from e
 
     filename = template.file_name or "template"
-    sent = await send_document(telegram_id, file_bytes, filename, caption="Шаблон договора")
+    sent = await send_cached_document(telegram_id, file_bytes, filename, caption="Шаблон договора")
     if not sent:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
@@ -313,7 +326,7 @@ async def delete_contract_template(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Template not found")
     if template.file_key:
         s3 = S3Service()
-        delete_template_files(s3, template.file_key, template.docx_key)
+        await s3.run(delete_template_files, s3, template.file_key, template.docx_key)
     await db.delete(template)
     await db.commit()
     return {"status": "ok"}
@@ -363,18 +376,18 @@ async def upload_document(
     Ограничения: размер до 15 MB, до 80 чанков. TXT — UTF-8.
     """
     try:
-        content = await file.read()
+        content = await read_upload_bytes(file, MAX_DOCUMENT_SIZE_BYTES)
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Файл слишком большой. Максимум {MAX_DOCUMENT_SIZE_BYTES // (1024*1024)} MB",
+        )
     except Exception as e:
         logger.exception("document_upload_read_failed", error=str(e))
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Не удалось прочитать файл",
         ) from e
-    if len(content) > MAX_DOCUMENT_SIZE_BYTES:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"Файл слишком большой. Максимум {MAX_DOCUMENT_SIZE_BYTES // (1024*1024)} MB",
-        )
     raw_name = (file.filename or "document").strip() or "document"
     name = raw_name.replace("\\", "/").split("/")[-1] or "document"
     if name.lower().endswith(".docx"):
@@ -550,3 +563,20 @@ async def test_ai_settings(
     except Exception as e:
         logger.warning("ai_settings_test_failed", error=str(e))
         raise HTTPException(status_code=502, detail=f"Ошибка запроса к AI: {e!s}")
+
+
+@router.get("/notifications/stats", response_model=NotificationQueueStats)
+async def notification_queue_stats(
+    db: AsyncSession = Depends(get_db),
+    _: User = Depends(require_roles("admin")),
+) -> NotificationQueueStats:
+    """Notification outbox depth: pending, failed, age of the oldest pending message."""
+    return NotificationQueueStats(**await outbox_stats(db))
+
+
+@router.get("/maintenance/tasks", response_model=list[MaintenanceTaskOut])
+async def maintenance_tasks(
+    _: User = Depends(require_roles("admin")),
+) -> list[MaintenanceTaskOut]:
+    """Periodic maintenance tasks with metrics of this worker."""
+    return [MaintenanceTaskOut(**item) for item in maintenance_runner.snapshot()]
@@ -56,8 +56,6 @@ async def telegram_auth(
             await db.commit()
             await db.refresh(user)
 
-    await db.execute(delete(Session).where(Session.expires_at <= datetime.utcnow()))
-
     token = secrets.token_hex(32)
     expires_at = datetime.utcnow() + timedelta(days=7)
     user_id = user.id
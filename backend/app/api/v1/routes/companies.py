@@ -1,5 +1,6 @@
 """Company endpoints."""
 import asyncio
+from dataclasses import asdict
 from datetime import date
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
@@ -21,16 +22,23 @@ from app.schemas.company import (
     CompanyCreate,
     CompanyList,
     CompanyOut,
+    CompanyStatsOut,
     CompanyUpdate,
 )
 from app.schemas.company import _mask_key
 from app.core.config import settings
 from app.core.crypto import decrypt_value, encrypt_value
 from app.core.logging import logger
-from app.services.contract_template_service import render_contract_pdf_from_docx_template
+from app.services.aggregates import get_company_counters
+from app.services.contract_template_service import (
+    get_docx_bytes_for_template,
+    render_contract_pdf_from_docx_template,
+)
+from app.services.credential_health import invalidate_credential_health
 from app.services.dadata import fetch_bank_by_bik, fetch_company_by_inn
 from app.services.pdf import ContractData, render_contract_pdf
 from app.services.files import content_disposition
+from app.services.marketplace_credentials import marketplace_client_cache
 from app.services.s3 import S3Service
 from app.services.api_keys_guide import API_KEYS_GUIDE_HTML
 from app.services.telegram import send_document, send_notification
@@ -226,10 +234,10 @@ async def _generate_contract_pdf_bytes(
     template = template_result.scalar_one_or_none()
     if template and template.file_key:
         s3 = S3Service()
-        pdf_bytes = await asyncio.to_thread(
-            render_contract_pdf_from_docx_template,
-            s3, template.file_key, template.file_type, template.docx_key, contract,
+        docx_bytes = await s3.run(
+            get_docx_bytes_for_template, s3, template.file_key, template.file_type or "", template.docx_key
         )
+        pdf_bytes = await asyncio.to_thread(render_contract_pdf_from_docx_template, docx_bytes, contract)
     else:
         pdf_bytes = await asyncio.to_thread(
             render_contract_pdf,
@@ -292,6 +300,25 @@ def _company_access(company: Company, current_user: User) -> bool:
     return company.user_id == current_user.id or current_user.role == "admin"
 
 
+@router.get("/{company_id}/stats", response_model=CompanyStatsOut)
+async def get_company_stats(
+    company_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> CompanyStatsOut:
+    """Company counters (stock, defects, orders) from materialized aggregates."""
+    if current_user.role in {"warehouse", "admin"}:
+        company_result = await db.execute(select(Company.id).where(Company.id == company_id))
+    else:
+        company_result = await db.execute(
+            select(Company.id).where(Company.id == company_id, Company.user_id == current_user.id)
+        )
+    if company_result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Компания не найдена")
+    counters = await get_company_counters(db, company_id)
+    return CompanyStatsOut(company_id=company_id, **asdict(counters))
+
+
 @router.get("/{company_id}/api-keys", response_model=CompanyAPIKeysOut)
 async def get_company_api_keys(
     company_id: int,
@@ -364,7 +391,9 @@ async def update_company_api_keys(
             row.ozon_client_id = encrypt_value(data["ozon_client_id"], secret)
         if "ozon_api_key" in data:
             row.ozon_api_key = encrypt_value(data["ozon_api_key"], secret)
+    await invalidate_credential_health(db, company_id)
     await db.commit()
+    marketplace_client_cache.invalidate(company_id)
     await db.refresh(row)
 
     return CompanyAPIKeysOut(
@@ -1,29 +1,30 @@
 """Destination (address) endpoints."""
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import Response
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.v1.deps import get_current_user, require_roles
+from app.api.v1.responses import etag_response
 from app.db.models.destination import Destination
 from app.db.models.user import User
 from app.db.session import get_db
 from app.schemas.destination import DestinationCreate, DestinationOut, DestinationUpdate
+from app.services.catalog import catalog_cache
 
 router = APIRouter()
 
 
 @router.get("", response_model=list[DestinationOut])
 async def list_destinations(
+    request: Request,
     active_only: bool = Query(True, description="Only active destinations"),
     db: AsyncSession = Depends(get_db),
     _: User = Depends(get_current_user),
-) -> list[DestinationOut]:
-    """List destinations (for order form)."""
-    query = select(Destination).order_by(Destination.name.asc())
-    if active_only:
-        query = query.where(Destination.is_active.is_(True))
-    result = await db.execute(query)
-    return list(result.scalars().all())
+) -> Response:
+    """List destinations (for order form) from the catalog cache, with ETag."""
+    catalog = await catalog_cache.get(db)
+    return etag_response(request, catalog.destinations_body(active_only))
 
 
 @router.post("", response_model=DestinationOut)
@@ -36,6 +37,7 @@ async def create_destination(
     dest = Destination(name=payload.name.strip(), is_active=True)
     db.add(dest)
     await db.commit()
+    catalog_cache.invalidate()
     await db.refresh(dest)
     return dest
 
@@ -55,6 +57,7 @@ async def update_destination(
     for key, value in payload.model_dump(exclude_unset=True).items():
         setattr(dest, key, value)
     await db.commit()
+    catalog_cache.invalidate()
     await db.refresh(dest)
     return dest
 
@@ -72,3 +75,4 @@ async def delete_destination(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Адрес не найден")
     dest.is_active = False
     await db.commit()
+    catalog_cache.invalidate()
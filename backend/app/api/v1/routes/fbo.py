@@ -1,14 +1,14 @@
 """FBO supply endpoints (WB/Ozon)."""
+from datetime import datetime
+
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
 from app.api.v1.deps import get_current_user
-from app.core.config import settings
-from app.core.crypto import decrypt_value
+from app.api.v1.pagination import keyset_query, split_page
 from app.db.models.company import Company
-from app.db.models.company_api_keys import CompanyAPIKeys
 from app.db.models.fbo_supply import FBOSupply, FBOSupplyBox
 from app.db.models.user import User
 from app.db.session import get_db
@@ -21,8 +21,10 @@ from app.schemas.fbo import (
     FBOSupplyOut,
     FBOSupplyBoxOut,
 )
-from app.services.ozon_api import OzonAPI
-from app.services.wb_api import WildberriesAPI
+from app.schemas.pagination import CursorPage
+from app.services.barcode_index import barcode_index, box_entry
+from app.services.marketplace_credentials import get_marketplace_clients
+from app.services.supply_sync import apply_supply_boxes, fetch_supply_boxes, reindex_supply_boxes
 
 router = APIRouter()
 
@@ -55,37 +57,42 @@ def _supply_to_out(supply: FBOSupply) -> FBOSupplyOut:
         status=supply.status,
         warehouse_name=supply.warehouse_name,
         created_at=supply.created_at,
+        synced_at=supply.synced_at,
         boxes=sorted(boxes, key=lambda x: x.box_number),
     )
 
 
-@router.get("/supplies", response_model=FBOSupplyList)
+@router.get("/supplies", response_model=FBOSupplyList | CursorPage[FBOSupplyOut])
 async def list_fbo_supplies(
     company_id: int = Query(...),
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None, description="Курсор следующей страницы (next_cursor); page игнорируется"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
-) -> FBOSupplyList:
-    """List FBO supplies for company."""
+) -> FBOSupplyList | CursorPage[FBOSupplyOut]:
+    """List FBO supplies for company: page/limit with total (FBOSupplyList) or keyset cursor without total (CursorPage)."""
     await _get_company_or_404(db, company_id, current_user)
 
+    result = await db.execute(
+        keyset_query(
+            select(FBOSupply).where(FBOSupply.company_id == company_id).options(joinedload(FBOSupply.boxes)),
+            FBOSupply.created_at,
+            FBOSupply.id,
+            limit,
+            cursor=cursor,
+            page=page,
+        )
+    )
+    supplies, next_cursor = split_page(result.unique().scalars().all(), limit)
+    items = [_supply_to_out(s) for s in supplies]
+    if cursor:
+        return CursorPage[FBOSupplyOut](items=items, limit=limit, next_cursor=next_cursor)
     count_q = await db.execute(
         select(func.count()).select_from(FBOSupply).where(FBOSupply.company_id == company_id)
     )
     total = count_q.scalar() or 0
-    offset = (page - 1) * limit
-    result = await db.execute(
-        select(FBOSupply)
-        .where(FBOSupply.company_id == company_id)
-        .options(joinedload(FBOSupply.boxes))
-        .order_by(FBOSupply.created_at.desc())
-        .offset(offset)
-        .limit(limit)
-    )
-    supplies = list(result.unique().scalars().all())
-    items = [_supply_to_out(s) for s in supplies]
-    return FBOSupplyList(items=items, total=total, page=page, limit=limit)
+    return FBOSupplyList(items=items, total=total, page=page, limit=limit, next_cursor=next_cursor)
 
 
 @router.get("/supplies/{supply_id}", response_model=FBOSupplyOut)
@@ -123,27 +130,14 @@ async def create_fbo_supply(
     if marketplace == "wb":
         box_count = getattr(payload, "box_count", None) or 0
         if box_count > 0:
-            keys_r = await db.execute(
-                select(CompanyAPIKeys).where(CompanyAPIKeys.company_id == payload.company_id)
-            )
-            keys = keys_r.scalar_one_or_none()
-            secret = settings.ENCRYPTION_KEY or ""
-            wb_key = decrypt_value(keys.wb_api_key, secret) if keys else None
-            if wb_key:
-                api = WildberriesAPI(api_key=wb_key)
+            api = (await get_marketplace_clients(db, payload.company_id, interactive=True)).get("wb")
+            if api:
                 external_id = await api.create_supply(name="Поставка")
                 if external_id:
                     await api.create_supply_boxes(external_id, box_count)
     elif marketplace == "ozon":
-        keys_r = await db.execute(
-            select(CompanyAPIKeys).where(CompanyAPIKeys.company_id == payload.company_id)
-        )
-        keys = keys_r.scalar_one_or_none()
-        secret = settings.ENCRYPTION_KEY or ""
-        ozon_cid = decrypt_value(keys.ozon_client_id, secret) if keys else None
-        ozon_key = decrypt_value(keys.ozon_api_key, secret) if keys else None
-        if ozon_cid and ozon_key:
-            api = OzonAPI(client_id=ozon_cid, api_key=ozon_key)
+        api = (await get_marketplace_clients(db, payload.company_id, interactive=True)).get("ozon")
+        if api:
             sid = await api.create_supply_draft()
             external_id = str(sid) if sid is not None else None
 
@@ -170,7 +164,7 @@ async def sync_fbo_supply_barcodes(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> FBOSupplyOut:
-    """Fetch box barcodes from WB/Ozon and update supply boxes."""
+    """Fetch box barcodes from WB/Ozon now and update supply boxes (the background sync does the same periodically)."""
     result = await db.execute(
         select(FBOSupply).where(FBOSupply.id == supply_id).options(joinedload(FBOSupply.boxes))
     )
@@ -181,52 +175,21 @@ async def sync_fbo_supply_barcodes(
     if not supply.external_supply_id:
         raise HTTPException(status_code=400, detail="Нет внешнего ID поставки для синхронизации")
 
-    keys_r = await db.execute(
-        select(CompanyAPIKeys).where(CompanyAPIKeys.company_id == supply.company_id)
-    )
-    keys = keys_r.scalar_one_or_none()
-    secret = settings.ENCRYPTION_KEY or ""
-    boxes_data: list[tuple[str | None, str]] = []  # (external_box_id, external_barcode)
-    if supply.marketplace == "wb":
-        wb_key = decrypt_value(keys.wb_api_key, secret) if keys else None
-        if not wb_key:
+    api = (await get_marketplace_clients(db, supply.company_id, interactive=True)).get(supply.marketplace)
+    if api is None:
+        if supply.marketplace == "wb":
             raise HTTPException(status_code=400, detail="Укажите API-ключ WB для компании")
-        api = WildberriesAPI(api_key=wb_key)
-        wb_boxes = await api.get_supply_boxes(supply.external_supply_id)
-        for b in wb_boxes:
-            bid = b.get("id")
-            if bid:
-                boxes_data.append((str(bid), str(bid)))
-    elif supply.marketplace == "ozon":
-        ozon_cid = decrypt_value(keys.ozon_client_id, secret) if keys else None
-        ozon_key = decrypt_value(keys.ozon_api_key, secret) if keys else None
-        if not ozon_cid or not ozon_key:
-            raise HTTPException(status_code=400, detail="Укажите Client ID и API Key Ozon для компании")
-        api = OzonAPI(client_id=ozon_cid, api_key=ozon_key)
-        try:
-            sid = int(supply.external_supply_id)
-        except ValueError:
-            sid = 0
-        if sid:
-            barcodes = await api.get_supply_barcodes(sid)
-            for b in barcodes:
-                if b:
-                    boxes_data.append((None, b.strip()))
-
-    for box in supply.boxes:
-        await db.delete(box)
-    await db.flush()
-    for i, (ext_box_id, ext_barcode) in enumerate(boxes_data):
-        box = FBOSupplyBox(
-            supply_id=supply.id,
-            box_number=i + 1,
-            external_box_id=ext_box_id,
-            external_barcode=ext_barcode,
-        )
-        db.add(box)
+        raise HTTPException(status_code=400, detail="Укажите Client ID и API Key Ozon для компании")
+    boxes_data = await fetch_supply_boxes(supply, api)
+    changes = await apply_supply_boxes(db, supply, boxes_data)
+    supply.synced_at = datetime.utcnow()
     await db.commit()
+    await reindex_supply_boxes(db, supply_id, changes)
     result2 = await db.execute(
-        select(FBOSupply).where(FBOSupply.id == supply_id).options(joinedload(FBOSupply.boxes))
+        select(FBOSupply)
+        .where(FBOSupply.id == supply_id)
+        .options(joinedload(FBOSupply.boxes))
+        .execution_options(populate_existing=True)
     )
     supply = result2.unique().scalar_one()
     return _supply_to_out(supply)
@@ -257,17 +220,9 @@ async def get_fbo_box_stickers(
     trbx_ids = [b.external_box_id for b in supply.boxes if b.external_box_id]
     if not trbx_ids:
         return BoxStickersOut(stickers=[])
-    keys_r = await db.execute(
-        select(CompanyAPIKeys).where(CompanyAPIKeys.company_id == supply.company_id)
-    )
-    keys = keys_r.scalar_one_or_none()
-    if not keys or not keys.wb_api_key:
-        raise HTTPException(status_code=400, detail="Укажите API-ключ WB для компании")
-    secret = settings.ENCRYPTION_KEY or ""
-    wb_key = decrypt_value(keys.wb_api_key, secret)
-    if not wb_key:
+    api = (await get_marketplace_clients(db, supply.company_id, interactive=True)).get("wb")
+    if api is None:
         raise HTTPException(status_code=400, detail="Укажите API-ключ WB для компании")
-    api = WildberriesAPI(api_key=wb_key)
     raw = await api.get_box_stickers(supply.external_supply_id, trbx_ids, fmt=fmt)
     content_type = "image/png" if fmt == "png" else "image/svg+xml" if fmt == "svg" else "application/octet-stream"
     stickers = []
@@ -302,6 +257,7 @@ async def import_fbo_barcodes(
         raise HTTPException(status_code=404, detail="Поставка не найдена")
     await _get_company_or_404(db, supply.company_id, current_user)
 
+    added: list[FBOSupplyBox] = []
     for i, barcode in enumerate(payload.barcodes or []):
         b = (barcode or "").strip()
         if not b:
@@ -313,7 +269,12 @@ async def import_fbo_barcodes(
             external_barcode=b,
         )
         db.add(box)
+        added.append(box)
+    await db.flush()
+    entries = [box_entry(box) for box in added]
     await db.commit()
+    for entry in entries:
+        barcode_index.put(entry)
     result2 = await db.execute(
         select(FBOSupply).where(FBOSupply.id == supply_id).options(joinedload(FBOSupply.boxes))
     )
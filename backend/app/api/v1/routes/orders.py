@@ -1,30 +1,55 @@
 """Order endpoints."""
-from datetime import date, datetime
-from io import BytesIO
+from datetime import datetime
 
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, UploadFile
 from fastapi.responses import StreamingResponse
-from PIL import Image
-from sqlalchemy import func, select
+from sqlalchemy import func, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
 from app.api.v1.deps import get_current_user
+from app.api.v1.pagination import keyset_query, split_page
+from app.api.v1.responses import FastJSONResponse, as_dicts, schema_columns
 from app.db.models.company import Company
 from app.db.models.order import Order, OrderItem
-from app.db.models.order_counter import OrderCounter
 from app.db.models.packing_record import PackingRecord
 from app.db.models.order_service import OrderService
 from app.db.models.service import Service
 from app.db.models.order_photo import OrderPhoto
 from app.db.models.product import Product
 from app.db.session import get_db
-from app.schemas.order import OrderCreate, OrderItemOut, OrderList, OrderOut, OrderPhotoOut, OrderStatusUpdate
+from app.schemas.order import (
+    OrderBatchCreate,
+    OrderBatchResult,
+    OrderBatchResultItem,
+    OrderCreate,
+    OrderItemOut,
+    OrderList,
+    OrderOut,
+    OrderPhotoConfirm,
+    OrderPhotoOut,
+    OrderStatusUpdate,
+)
+from app.schemas.pagination import CursorPage
+from app.schemas.photo import PhotoUploadRequest, PhotoUploadTicket
 from app.schemas.warehouse import PackingRecordOut
+from app.services.aggregates import bump_company_stats, open_orders_delta
 from app.services.excel import export_receiving
 from app.services.files import content_disposition
+from app.services.notifications import enqueue_notification, order_coalesce_key
+from app.services.order_numbers import allocate_order_numbers
+from app.services.photos import (
+    PhotoUploadError,
+    check_uploaded_photo,
+    create_upload_ticket,
+    legacy_photo_key,
+    photo_variant_url,
+    process_uploaded_photo,
+    store_photo_variants,
+)
 from app.services.s3 import S3Service
-from app.services.telegram import send_document, send_notification
+from app.services.telegram import send_document
+from app.services.uploads import UploadTooLarge, read_upload_bytes
 from app.core.config import settings
 from app.core.logging import logger
 from app.db.models.user import User
@@ -71,21 +96,10 @@ async def create_order(
             raise HTTPException(status_code=400, detail="Одна или несколько услуг не найдены или неактивны")
 
     try:
-        today = date.today()
-        prefix = datetime.utcnow().strftime("Заявка %d/%m/%y")
         total_planned = sum(item.planned_qty for item in payload.items)
         transaction = db.begin_nested() if db.in_transaction() else db.begin()
         async with transaction:
-            counter_result = await db.execute(
-                select(OrderCounter).where(OrderCounter.counter_date == today).with_for_update()
-            )
-            counter = counter_result.scalar_one_or_none()
-            if not counter:
-                counter = OrderCounter(counter_date=today, value=0)
-                db.add(counter)
-                await db.flush()
-            counter.value += 1
-            order_number = f"{prefix} №{counter.value}"
+            [order_number] = await allocate_order_numbers(db)
 
             order = Order(
                 company_id=payload.company_id,
@@ -120,6 +134,14 @@ async def create_order(
                         price_at_order=service.price,
                     )
                 )
+            await db.flush()
+            await bump_company_stats(
+                db,
+                payload.company_id,
+                orders_total=1,
+                orders_open=1,
+                orders_planned_qty=total_planned,
+            )
 
         await db.commit()
         await db.refresh(order)
@@ -132,16 +154,151 @@ async def create_order(
         raise HTTPException(status_code=500, detail="Не удалось создать заявку")
 
 
-@router.get("", response_model=OrderList)
+def _order_error(
+    order: OrderCreate,
+    companies: set[int],
+    product_companies: dict[int, int],
+    services_by_id: dict[int, Service],
+) -> str | None:
+    """Why the order of a batch cannot be created (same checks as POST /orders), None if valid."""
+    if order.company_id not in companies:
+        return "Компания не найдена"
+    if not order.items:
+        return "Order must have at least one item"
+    if any(item.planned_qty <= 0 for item in order.items):
+        return "Планируемое количество должно быть больше нуля"
+    if any(product_companies.get(item.product_id) != order.company_id for item in order.items):
+        return "Один или несколько товаров не найдены"
+    if any(s.quantity <= 0 for s in order.services or []):
+        return "Количество услуги должно быть больше нуля"
+    if any(s.service_id not in services_by_id for s in order.services or []):
+        return "Одна или несколько услуг не найдены или неактивны"
+    return None
+
+
+@router.post("/batch", response_model=OrderBatchResult)
+async def create_orders_batch(
+    payload: OrderBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> OrderBatchResult:
+    """Create many orders in one transaction; invalid orders are skipped and reported per index.
+
+    Компании, товары и услуги проверяются тремя запросами на весь пакет, номера выделяются
+    одним блоком, заявки, позиции и услуги вставляются многострочными INSERT.
+    """
+    company_ids = {order.company_id for order in payload.orders}
+    product_ids = {item.product_id for order in payload.orders for item in order.items}
+    service_ids = {svc.service_id for order in payload.orders for svc in order.services or []}
+    companies_result = await db.execute(
+        select(Company.id).where(Company.id.in_(company_ids), Company.user_id == current_user.id)
+    )
+    companies = set(companies_result.scalars().all())
+    product_companies: dict[int, int] = {}
+    if product_ids:
+        products_result = await db.execute(
+            select(Product.id, Product.company_id).where(Product.id.in_(product_ids), Product.company_id.in_(companies))
+        )
+        product_companies = dict(products_result.tuples().all())
+    services_by_id: dict[int, Service] = {}
+    if service_ids:
+        svc_result = await db.execute(select(Service).where(Service.id.in_(service_ids), Service.is_active.is_(True)))
+        services_by_id = {s.id: s for s in svc_result.scalars().all()}
+
+    errors = {
+        index: _order_error(order, companies, product_companies, services_by_id)
+        for index, order in enumerate(payload.orders)
+    }
+    valid = [(index, order) for index, order in enumerate(payload.orders) if errors[index] is None]
+    created: dict[int, OrderOut] = {}
+    if valid:
+        try:
+            transaction = db.begin_nested() if db.in_transaction() else db.begin()
+            async with transaction:
+                numbers = await allocate_order_numbers(db, count=len(valid))
+                now = datetime.utcnow()
+                rows = [
+                    {
+                        "company_id": order.company_id,
+                        "order_number": number,
+                        "status": "На приемке",
+                        "destination": order.destination,
+                        "planned_qty": sum(item.planned_qty for item in order.items),
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                    for (_, order), number in zip(valid, numbers)
+                ]
+                result = await db.scalars(insert(Order).returning(Order, sort_by_parameter_order=True), rows)
+                orders = result.all()
+                item_rows = []
+                service_rows = []
+                for (index, order), db_order in zip(valid, orders):
+                    # Ответ собирается до commit: после него атрибуты заявок истекают.
+                    created[index] = OrderOut.model_validate(db_order)
+                    for item in order.items:
+                        dest = (item.destination or "").strip()[:64] or None
+                        item_rows.append(
+                            {
+                                "order_id": db_order.id,
+                                "product_id": item.product_id,
+                                "planned_qty": item.planned_qty,
+                                "destination": dest,
+                            }
+                        )
+                    for svc in order.services or []:
+                        service_rows.append(
+                            {
+                                "order_id": db_order.id,
+                                "service_id": svc.service_id,
+                                "quantity": svc.quantity,
+                                "price_at_order": services_by_id[svc.service_id].price,
+                            }
+                        )
+                await db.execute(insert(OrderItem), item_rows)
+                if service_rows:
+                    await db.execute(insert(OrderService), service_rows)
+                per_company: dict[int, list[Order]] = {}
+                for db_order in orders:
+                    per_company.setdefault(db_order.company_id, []).append(db_order)
+                for company_id, company_orders in per_company.items():
+                    await bump_company_stats(
+                        db,
+                        company_id,
+                        orders_total=len(company_orders),
+                        orders_open=len(company_orders),
+                        orders_planned_qty=sum(o.planned_qty for o in company_orders),
+                    )
+            await db.commit()
+        except Exception as exc:
+            await db.rollback()
+            logger.exception("order_batch_create_failed", orders=len(valid), error=str(exc))
+            raise HTTPException(status_code=500, detail="Не удалось создать заявки")
+        logger.info("order_batch_created", created=len(created), skipped=len(payload.orders) - len(created))
+    return OrderBatchResult(
+        created=len(created),
+        results=[
+            OrderBatchResultItem(
+                index=index,
+                order=created.get(index),
+                error=errors[index],
+            )
+            for index in range(len(payload.orders))
+        ],
+    )
+
+
+@router.get("", response_model=OrderList | CursorPage[OrderOut])
 async def list_orders(
     company_id: int,
     status: str | None = Query(None),
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None, description="Курсор следующей страницы (next_cursor); page игнорируется"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
-) -> OrderList:
-    """List orders by company with pagination."""
+) -> FastJSONResponse:
+    """List orders by company: page/limit with exact total (OrderList) or keyset cursor without total (CursorPage)."""
     if current_user.role in {"warehouse", "admin"}:
         company_result = await db.execute(select(Company).where(Company.id == company_id))
     else:
@@ -150,36 +307,29 @@ async def list_orders(
         )
     if not company_result.scalar_one_or_none():
         raise HTTPException(status_code=404, detail="Компания не найдена")
-    base_query = select(Order).where(Order.company_id == company_id).order_by(Order.created_at.desc())
-    if status:
-        statuses = [value.strip() for value in status.split(",") if value.strip()]
-        if statuses:
-            base_query = base_query.where(Order.status.in_(statuses))
-    total_result = await db.execute(select(func.count()).select_from(base_query.subquery()))
-    total = int(total_result.scalar_one())
-    offset = (page - 1) * limit
     conditions = [Order.company_id == company_id]
-    if status:
-        statuses = [value.strip() for value in status.split(",") if value.strip()]
-        if statuses:
-            conditions.append(Order.status.in_(statuses))
+    statuses = [value.strip() for value in (status or "").split(",") if value.strip()]
+    if statuses:
+        conditions.append(Order.status.in_(statuses))
     result = await db.execute(
-        select(Order, func.count(OrderPhoto.id))
-        .outerjoin(OrderPhoto, OrderPhoto.order_id == Order.id)
-        .where(*conditions)
-        .group_by(Order.id)
-        .order_by(Order.created_at.desc())
-        .offset(offset)
-        .limit(limit)
-    )
-    items: list[OrderOut] = []
-    for order, photo_count in result.all():
-        items.append(
-            OrderOut.model_validate(order, from_attributes=True).model_copy(
-                update={"photo_count": int(photo_count)}
-            )
+        keyset_query(
+            select(*schema_columns(OrderOut, Order, photo_count=func.count(OrderPhoto.id)), Order.created_at)
+            .outerjoin(OrderPhoto, OrderPhoto.order_id == Order.id)
+            .where(*conditions)
+            .group_by(Order.id),
+            Order.created_at,
+            Order.id,
+            limit,
+            cursor=cursor,
+            page=page,
         )
-    return OrderList(items=items, total=total, page=page, limit=limit)
+    )
+    rows, next_cursor = split_page(result.all(), limit)
+    body = {"items": as_dicts(rows, OrderOut), "limit": limit, "next_cursor": next_cursor}
+    if not cursor:
+        total_result = await db.execute(select(func.count()).select_from(Order).where(*conditions))
+        body.update(total=int(total_result.scalar_one()), page=page)
+    return FastJSONResponse(body)
 
 
 @router.get("/{order_id}/items", response_model=list[OrderItemOut])
@@ -187,7 +337,7 @@ async def list_order_items(
     order_id: int,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
-) -> list[OrderItemOut]:
+) -> FastJSONResponse:
     """List items for a specific order."""
     order_result = await db.execute(select(Order).where(Order.id == order_id))
     order = order_result.scalar_one_or_none()
@@ -203,35 +353,25 @@ async def list_order_items(
         raise HTTPException(status_code=404, detail="Компания не найдена")
 
     result = await db.execute(
-        select(OrderItem, Product)
+        select(
+            *schema_columns(
+                OrderItemOut,
+                OrderItem,
+                product_name=Product.name,
+                barcode=Product.barcode,
+                brand=Product.brand,
+                size=Product.size,
+                color=Product.color,
+                wb_article=Product.wb_article,
+                wb_url=Product.wb_url,
+                packing_instructions=Product.packing_instructions,
+                supplier_name=Product.supplier_name,
+            )
+        )
         .join(Product, Product.id == OrderItem.product_id)
         .where(OrderItem.order_id == order_id)
     )
-    items: list[OrderItemOut] = []
-    for item, product in result.all():
-        items.append(
-            OrderItemOut(
-                id=item.id,
-                product_id=item.product_id,
-                product_name=product.name,
-                barcode=product.barcode,
-                brand=product.brand,
-                size=product.size,
-                color=product.color,
-                wb_article=product.wb_article,
-                wb_url=product.wb_url,
-                packing_instructions=product.packing_instructions,
-                supplier_name=product.supplier_name,
-                planned_qty=item.planned_qty,
-                received_qty=item.received_qty,
-                defect_qty=item.defect_qty,
-                packed_qty=item.packed_qty,
-                adjustment_qty=item.adjustment_qty,
-                adjustment_note=item.adjustment_note,
-                destination=item.destination,
-            )
-        )
-    return items
+    return FastJSONResponse(as_dicts(result.all(), OrderItemOut))
 
 
 @router.patch("/{order_id}/status", response_model=OrderOut)
@@ -262,17 +402,95 @@ async def update_order_status(
     telegram_id = company.user.telegram_id if company.user else None
     order_number = order.order_number
     new_status = payload.status
+    open_delta = open_orders_delta(order.status, new_status)
     order.status = new_status
-    await db.commit()
-    await db.refresh(order)
+    await db.flush()
+    await bump_company_stats(db, order.company_id, orders_open=open_delta)
     if telegram_id and new_status in ("Принято", "Готово к отгрузке", "Завершено"):
-        await send_notification(
+        enqueue_notification(
+            db,
             telegram_id,
             f"Заявка {order_number}: статус изменен на {new_status}.",
+            coalesce_key=order_coalesce_key(order.id),
         )
+    await db.commit()
+    await db.refresh(order)
     return order
 
 
+async def _get_accessible_order(db: AsyncSession, order_id: int, user: User) -> Order:
+    """Order visible to the user (warehouse/admin — any, client — own company). 404 otherwise."""
+    order_result = await db.execute(select(Order).where(Order.id == order_id))
+    order = order_result.scalar_one_or_none()
+    if not order:
+        raise HTTPException(status_code=404, detail="Заявка не найдена")
+    if user.role in {"warehouse", "admin"}:
+        company_result = await db.execute(select(Company.id).where(Company.id == order.company_id))
+    else:
+        company_result = await db.execute(
+            select(Company.id).where(Company.id == order.company_id, Company.user_id == user.id)
+        )
+    if company_result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Компания не найдена")
+    return order
+
+
+@router.post("/{order_id}/photo/upload-url", response_model=PhotoUploadTicket)
+async def create_order_photo_upload(
+    order_id: int,
+    payload: PhotoUploadRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> PhotoUploadTicket:
+    """Presigned POST for uploading an order photo directly to S3 (then call /photo/confirm)."""
+    await _get_accessible_order(db, order_id, current_user)
+    try:
+        return create_upload_ticket(S3Service(), f"orders/{order_id}", payload.content_type)
+    except PhotoUploadError as exc:
+        raise HTTPException(status_code=400, detail=exc.detail)
+
+
+@router.post("/{order_id}/photo/confirm")
+async def confirm_order_photo(
+    order_id: int,
+    payload: OrderPhotoConfirm,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> dict:
+    """Register an order photo uploaded via presigned POST; the image is shrunk in the background."""
+    await _get_accessible_order(db, order_id, current_user)
+    existing = await db.execute(
+        select(OrderPhoto.id).where(OrderPhoto.order_id == order_id, OrderPhoto.s3_key == payload.key)
+    )
+    if existing.scalar_one_or_none() is not None:
+        return {"key": payload.key}
+    photo_count = await db.execute(select(func.count()).select_from(OrderPhoto).where(OrderPhoto.order_id == order_id))
+    if int(photo_count.scalar_one()) >= 20:
+        raise HTTPException(status_code=400, detail="Достигнут лимит фотографий")
+    if payload.product_id:
+        product_result = await db.execute(
+            select(OrderItem.id).where(OrderItem.order_id == order_id, OrderItem.product_id == payload.product_id)
+        )
+        if product_result.first() is None:
+            raise HTTPException(status_code=400, detail="Товар не входит в эту заявку")
+    s3 = S3Service()
+    try:
+        await check_uploaded_photo(s3, payload.key, f"orders/{order_id}")
+    except PhotoUploadError as exc:
+        raise HTTPException(status_code=400, detail=exc.detail)
+
+    photo = OrderPhoto(order_id=order_id, s3_key=payload.key, photo_type=payload.photo_type, product_id=payload.product_id)
+    db.add(photo)
+    await db.flush()
+    # После commit атрибуты истекают: id читаем до фиксации.
+    photo_id = photo.id
+    await db.commit()
+    background_tasks.add_task(process_uploaded_photo, s3, OrderPhoto, photo_id, payload.key)
+    logger.info("order_photo_confirmed", order_id=order_id, key=payload.key)
+    return {"key": payload.key}
+
+
 @router.post("/{order_id}/photo")
 async def upload_order_photo(
     order_id: int,
@@ -286,16 +504,10 @@ async def upload_order_photo(
     s3 = S3Service()
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Неподдерживаемый тип файла")
-    data = await file.read()
-    if len(data) > settings.MAX_UPLOAD_SIZE_BYTES:
+    try:
+        data = await read_upload_bytes(file, settings.MAX_UPLOAD_SIZE_BYTES)
+    except UploadTooLarge:
         raise HTTPException(status_code=400, detail="Файл слишком большой")
-    image = Image.open(BytesIO(data))
-    image.thumbnail((1200, 1200))
-    output = BytesIO()
-    if image.mode in ("RGBA", "P"):
-        image = image.convert("RGB")
-    image.save(output, format="JPEG")
-    data = output.getvalue()
     photo_count = await db.execute(select(func.count()).select_from(OrderPhoto).where(OrderPhoto.order_id == order_id))
     if int(photo_count.scalar_one()) >= 20:
         raise HTTPException(status_code=400, detail="Достигнут лимит фотографий")
@@ -319,13 +531,13 @@ async def upload_order_photo(
         if not product_result.scalar_one_or_none():
             raise HTTPException(status_code=400, detail="Товар не входит в эту заявку")
 
-    key = f"orders/{order_id}/{datetime.utcnow().timestamp()}_{file.filename}"
-    s3.upload_bytes(key, data, file.content_type or "image/jpeg")
-    url = s3.build_public_url(key)
+    key = legacy_photo_key(f"orders/{order_id}", file.filename)
+    variants = await store_photo_variants(s3, key, data)
+    url = s3.build_public_url(variants["full"])
     if not await s3.head_check(url):
         raise HTTPException(status_code=400, detail="Upload verification failed")
 
-    photo = OrderPhoto(order_id=order_id, s3_key=key, photo_type=photo_type, product_id=product_id)
+    photo = OrderPhoto(order_id=order_id, s3_key=key, photo_type=photo_type, product_id=product_id, variants=variants)
     db.add(photo)
     await db.commit()
     return {"key": key}
@@ -363,6 +575,8 @@ async def list_order_photos(
                 photo_type=photo.photo_type,
                 product_id=photo.product_id,
                 created_at=photo.created_at,
+                thumb_url=photo_variant_url(s3, photo.s3_key, photo.variants, "thumb"),
+                medium_url=photo_variant_url(s3, photo.s3_key, photo.variants, "medium"),
             )
         )
     return response
@@ -1,25 +1,40 @@
 """Product endpoints."""
-from datetime import date, datetime
-from io import BytesIO
+from datetime import date
 
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, UploadFile
 from fastapi.responses import StreamingResponse
-from PIL import Image
-from sqlalchemy import func, or_, select
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
 from app.api.v1.deps import get_current_user
+from app.api.v1.pagination import keyset_query, ranked_query, split_page, split_ranked_page
+from app.api.v1.responses import FastJSONResponse, as_dicts, schema_columns
 from app.db.models.company import Company
 from app.db.models.order_photo import OrderPhoto
 from app.db.models.product import Product, ProductPhoto
 from app.db.session import get_db
+from app.schemas.pagination import CursorPage
+from app.schemas.photo import PhotoConfirm, PhotoUploadRequest, PhotoUploadTicket
 from app.schemas.product import ImportResult, ImportSkipped, ProductCreate, ProductList, ProductOut, ProductUpdate
+from app.services.aggregates import bump_company_stats
+from app.services.barcode_index import KIND_PRODUCT, barcode_index, product_entry
 from app.services.excel import export_products, export_products_template, parse_products_excel
 from app.services.files import content_disposition
 from app.services.pdf import LabelData, render_label_pdf
+from app.services.photos import (
+    PhotoUploadError,
+    check_uploaded_photo,
+    create_upload_ticket,
+    legacy_photo_key,
+    photo_variant_url,
+    process_uploaded_photo,
+    store_photo_variants,
+)
 from app.services.s3 import S3Service
-from app.services.telegram import send_document
+from app.services.search import build_search
+from app.services.telegram import send_cached_document, send_document
+from app.services.uploads import UploadTooLarge, read_upload_bytes
 from app.core.config import settings
 from app.core.logging import logger
 from app.db.models.user import User
@@ -41,21 +56,25 @@ async def create_product(
         raise HTTPException(status_code=404, detail="Компания не найдена")
     product = Product(**payload.model_dump())
     db.add(product)
+    await db.flush()
+    await bump_company_stats(db, payload.company_id, products_total=1)
     await db.commit()
     await db.refresh(product)
+    barcode_index.put(product_entry(product))
     return product
 
 
-@router.get("", response_model=ProductList)
+@router.get("", response_model=ProductList | CursorPage[ProductOut])
 async def list_products(
     company_id: int,
     search: str | None = Query(None),
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None, description="Курсор следующей страницы (next_cursor); page игнорируется"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
-) -> ProductList:
-    """List products by company with pagination."""
+) -> FastJSONResponse:
+    """List products by company: page/limit with exact total (ProductList) or keyset cursor without total (CursorPage)."""
     if current_user.role in {"warehouse", "admin"}:
         company_result = await db.execute(select(Company).where(Company.id == company_id))
     else:
@@ -65,22 +84,28 @@ async def list_products(
     company = company_result.scalar_one_or_none()
     if not company:
         raise HTTPException(status_code=404, detail="Компания не найдена")
-    base_query = select(Product).where(Product.company_id == company_id)
-    if search:
-        term = f"%{search.strip()}%"
-        base_query = base_query.where(
-            or_(
-                Product.name.ilike(term),
-                Product.barcode.ilike(term),
-                Product.wb_article.ilike(term),
-            )
+    base_query = select(*schema_columns(ProductOut, Product), Product.created_at).where(
+        Product.company_id == company_id
+    )
+    clause = build_search(
+        Product.search_text, search, db.get_bind().dialect.name, exact=(Product.barcode, Product.wb_article)
+    )
+    if clause is not None:
+        # Поиск ранжирован по релевантности: страницы (page или курсор) — по ключам ранжирования и id.
+        base_query = base_query.where(clause.condition)
+        keys = (*clause.keys, (Product.id, True))
+        result = await db.execute(ranked_query(base_query, keys, limit, cursor=cursor, page=page))
+        rows, next_cursor = split_ranked_page(result.all(), limit, len(keys))
+    else:
+        result = await db.execute(
+            keyset_query(base_query, Product.created_at, Product.id, limit, cursor=cursor, page=page)
         )
-    total_result = await db.execute(select(func.count()).select_from(base_query.subquery()))
-    total = int(total_result.scalar_one())
-    offset = (page - 1) * limit
-    result = await db.execute(base_query.offset(offset).limit(limit))
-    items = list(result.scalars().all())
-    return ProductList(items=items, total=total, page=page, limit=limit)
+        rows, next_cursor = split_page(result.all(), limit)
+    body = {"items": as_dicts(rows, ProductOut), "limit": limit, "next_cursor": next_cursor}
+    if not cursor:
+        total_result = await db.execute(select(func.count()).select_from(base_query.subquery()))
+        body.update(total=int(total_result.scalar_one()), page=page)
+    return FastJSONResponse(body)
 
 
 @router.patch("/{product_id}", response_model=ProductOut)
@@ -103,10 +128,14 @@ async def update_product(
         )
     if not company_result.scalar_one_or_none():
         raise HTTPException(status_code=404, detail="Компания не найдена")
+    old_barcode = product.barcode
     for key, value in payload.model_dump(exclude_unset=True).items():
         setattr(product, key, value)
     await db.commit()
     await db.refresh(product)
+    if old_barcode != product.barcode:
+        barcode_index.discard(old_barcode, KIND_PRODUCT, product.id)
+    barcode_index.put(product_entry(product))
     return product
 
 
@@ -128,14 +157,16 @@ async def import_products(
     )
     if not company_result.scalar_one_or_none():
         raise HTTPException(status_code=404, detail="Компания не найдена")
-    data = await file.read()
-    if len(data) > settings.MAX_UPLOAD_SIZE_BYTES:
+    try:
+        data = await read_upload_bytes(file, settings.MAX_UPLOAD_SIZE_BYTES)
+    except UploadTooLarge:
         raise HTTPException(status_code=400, detail="Файл слишком большой")
     try:
         parsed = parse_products_excel(data)
         created = 0
         updated = 0
         skipped: list[ImportSkipped] = []
+        touched: list[Product] = []
         for row in parsed:
             if not row.get("name"):
                 continue
@@ -152,6 +183,7 @@ async def import_products(
                                 continue
                             if value is not None and hasattr(existing, key):
                                 setattr(existing, key, value)
+                        touched.append(existing)
                         updated += 1
                     else:
                         skipped.append(
@@ -164,8 +196,14 @@ async def import_products(
                     continue
             product = Product(company_id=company_id, **row)
             db.add(product)
+            touched.append(product)
             created += 1
+        await db.flush()
+        await bump_company_stats(db, company_id, products_total=created)
+        entries = [product_entry(p) for p in touched]
         await db.commit()
+        for entry in entries:
+            barcode_index.put(entry)
         return ImportResult(imported=created, updated=updated, skipped=skipped)
     except Exception as exc:
         await db.rollback()
@@ -273,12 +311,76 @@ async def send_products_template_to_telegram(
     file_bytes = buffer.getvalue()
     filename = "Шаблон_импорта_товаров.xlsx"
     telegram_id = current_user.telegram_id
-    sent = await send_document(telegram_id, file_bytes, filename, caption="Шаблон импорта товаров")
+    sent = await send_cached_document(telegram_id, file_bytes, filename, caption="Шаблон импорта товаров")
     if not sent:
         raise HTTPException(status_code=502, detail="Не удалось отправить файл в Telegram. Попробуйте позже.")
     return {"sent": True}
 
 
+async def _get_accessible_product(db: AsyncSession, product_id: int, user: User) -> Product:
+    """Product visible to the user (warehouse/admin — any, client — own company). 404 otherwise."""
+    product_result = await db.execute(select(Product).where(Product.id == product_id))
+    product = product_result.scalar_one_or_none()
+    if not product:
+        raise HTTPException(status_code=404, detail="Товар не найден")
+    if user.role in {"warehouse", "admin"}:
+        company_result = await db.execute(select(Company.id).where(Company.id == product.company_id))
+    else:
+        company_result = await db.execute(
+            select(Company.id).where(Company.id == product.company_id, Company.user_id == user.id)
+        )
+    if company_result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Компания не найдена")
+    return product
+
+
+@router.post("/{product_id}/photo/upload-url", response_model=PhotoUploadTicket)
+async def create_product_photo_upload(
+    product_id: int,
+    payload: PhotoUploadRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> PhotoUploadTicket:
+    """Presigned POST for uploading a product photo directly to S3 (then call /photo/confirm)."""
+    await _get_accessible_product(db, product_id, current_user)
+    try:
+        return create_upload_ticket(S3Service(), f"products/{product_id}", payload.content_type)
+    except PhotoUploadError as exc:
+        raise HTTPException(status_code=400, detail=exc.detail)
+
+
+@router.post("/{product_id}/photo/confirm")
+async def confirm_product_photo(
+    product_id: int,
+    payload: PhotoConfirm,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> dict:
+    """Register a product photo uploaded via presigned POST; the image is shrunk in the background."""
+    await _get_accessible_product(db, product_id, current_user)
+    existing = await db.execute(
+        select(ProductPhoto.id).where(ProductPhoto.product_id == product_id, ProductPhoto.s3_key == payload.key)
+    )
+    if existing.scalar_one_or_none() is not None:
+        return {"key": payload.key}
+    s3 = S3Service()
+    try:
+        await check_uploaded_photo(s3, payload.key, f"products/{product_id}")
+    except PhotoUploadError as exc:
+        raise HTTPException(status_code=400, detail=exc.detail)
+
+    photo = ProductPhoto(product_id=product_id, s3_key=payload.key)
+    db.add(photo)
+    await db.flush()
+    # После commit атрибуты истекают: id читаем до фиксации.
+    photo_id = photo.id
+    await db.commit()
+    background_tasks.add_task(process_uploaded_photo, s3, ProductPhoto, photo_id, payload.key)
+    logger.info("product_photo_confirmed", product_id=product_id, key=payload.key)
+    return {"key": payload.key}
+
+
 @router.post("/{product_id}/photo")
 async def upload_product_photo(
     product_id: int,
@@ -290,19 +392,13 @@ async def upload_product_photo(
     s3 = S3Service()
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Неподдерживаемый тип файла")
-    data = await file.read()
-    if len(data) > settings.MAX_UPLOAD_SIZE_BYTES:
+    try:
+        data = await read_upload_bytes(file, settings.MAX_UPLOAD_SIZE_BYTES)
+    except UploadTooLarge:
         raise HTTPException(status_code=400, detail="Файл слишком большой")
-    image = Image.open(BytesIO(data))
-    image.thumbnail((1200, 1200))
-    output = BytesIO()
-    if image.mode in ("RGBA", "P"):
-        image = image.convert("RGB")
-    image.save(output, format="JPEG")
-    data = output.getvalue()
-    key = f"products/{product_id}/{datetime.utcnow().timestamp()}_{file.filename}"
-    s3.upload_bytes(key, data, file.content_type or "image/jpeg")
-    url = s3.build_public_url(key)
+    key = legacy_photo_key(f"products/{product_id}", file.filename)
+    variants = await store_photo_variants(s3, key, data)
+    url = s3.build_public_url(variants["full"])
     if not await s3.head_check(url):
         raise HTTPException(status_code=400, detail="Ошибка проверки загруженного файла")
 
@@ -319,7 +415,7 @@ async def upload_product_photo(
     if not company_result.scalar_one_or_none():
         raise HTTPException(status_code=404, detail="Компания не найдена")
 
-    photo = ProductPhoto(product_id=product_id, s3_key=key)
+    photo = ProductPhoto(product_id=product_id, s3_key=key, variants=variants)
     db.add(photo)
     await db.commit()
     return {"key": key}
@@ -416,7 +512,7 @@ async def list_defect_photos(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> list[str]:
-    """List defect photo URLs for a product."""
+    """List defect photo thumbnail URLs for a product."""
     result = await db.execute(select(Product).where(Product.id == product_id))
     product = result.scalar_one_or_none()
     if not product:
@@ -433,4 +529,4 @@ async def list_defect_photos(
         select(OrderPhoto).where(OrderPhoto.product_id == product_id, OrderPhoto.photo_type == "defect")
     )
     s3 = S3Service()
-    return [s3.build_public_url(photo.s3_key) for photo in result.scalars().all()]
+    return [photo_variant_url(s3, photo.s3_key, photo.variants, "thumb") for photo in result.scalars().all()]
@@ -1,12 +1,14 @@
 """Services (pricing) endpoints."""
 from decimal import ROUND_HALF_UP, Decimal
 
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, Request, UploadFile, status
 from fastapi.responses import Response
-from sqlalchemy import or_, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.v1.deps import get_current_user, require_roles
+from app.api.v1.responses import etag_response
+from app.core.config import settings
 from app.core.logging import logger
 from app.db.models.service import Service
 from app.db.models.service_history import ServicePriceHistory
@@ -22,60 +24,52 @@ from app.schemas.service import (
     ServiceReorderRequest,
     ServiceUpdate,
 )
-from app.services.excel import export_services, parse_services_excel
-from app.services.pdf import generate_price_list_pdf
-from app.services.telegram import send_document
+from app.services.catalog import catalog_cache
+from app.services.excel import parse_services_excel
+from app.services.price_list import PRICE_LIST_PDF, SERVICES_XLSX, prebuild_price_lists, price_list_artifacts
+from app.services.telegram import send_cached_document
+from app.services.uploads import UploadTooLarge, read_upload_bytes
 
 router = APIRouter()
 
 
+def _catalog_changed(background_tasks: BackgroundTasks) -> None:
+    """After an admin write: drop the catalog cache and rebuild price-list artifacts in the background."""
+    catalog_cache.invalidate()
+    background_tasks.add_task(prebuild_price_lists)
+
+
 @router.get("", response_model=list[ServiceOut])
 async def list_services(
+    request: Request,
     category: str | None = Query(None, description="Filter by category"),
     include_inactive: bool = Query(False, description="Include inactive (admin only)"),
     q: str | None = Query(None, description="Search in name, category, comment"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
-) -> list[ServiceOut]:
-    """List services, optionally filtered by category and search. Admins can pass include_inactive=True."""
-    query = select(Service).order_by(
-        Service.category.asc(), Service.sort_order.asc(), Service.name.asc()
+) -> Response:
+    """List services, optionally filtered by category and search. Admins can pass include_inactive=True.
+
+    Из кеша справочника (catalog_cache), с ETag: повторный запрос с If-None-Match получает 304.
+    """
+    catalog = await catalog_cache.get(db)
+    body = catalog.services_body(
+        (category or "").strip() or None,
+        include_inactive and current_user.role == "admin",
+        (q or "").strip(),
     )
-    if not include_inactive or current_user.role != "admin":
-        query = query.where(Service.is_active.is_(True))
-    if category and category.strip():
-        query = query.where(Service.category == category.strip())
-    term = (q or "").strip()
-    if term:
-        # Escape ILIKE wildcards so user input is literal (\% and \_ not treated as wildcards)
-        escape_char = "\\"
-        term_escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
-        pattern = f"%{term_escaped}%"
-        query = query.where(
-            or_(
-                Service.name.ilike(pattern, escape=escape_char),
-                Service.category.ilike(pattern, escape=escape_char),
-                Service.comment.ilike(pattern, escape=escape_char),
-            )
-        )
-    result = await db.execute(query)
-    return list(result.scalars().all())
+    return etag_response(request, body)
 
 
 @router.get("/categories", response_model=list[str])
 async def list_categories(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     _: User = Depends(get_current_user),
-) -> list[str]:
+) -> Response:
     """List distinct service categories."""
-    query = (
-        select(Service.category)
-        .where(Service.is_active.is_(True))
-        .distinct()
-        .order_by(Service.category.asc())
-    )
-    result = await db.execute(query)
-    return [row[0] for row in result.all()]
+    catalog = await catalog_cache.get(db)
+    return etag_response(request, catalog.categories_body())
 
 
 @router.post("/calculate", response_model=CalculateResponse)
@@ -84,10 +78,8 @@ async def calculate_services(
     db: AsyncSession = Depends(get_db),
     _: User = Depends(get_current_user),
 ) -> CalculateResponse:
-    """Calculate total cost for a list of services and quantities."""
-    ids = [item.service_id for item in payload.items]
-    result = await db.execute(select(Service).where(Service.id.in_(ids), Service.is_active.is_(True)))
-    services_by_id = {s.id: s for s in result.scalars().all()}
+    """Calculate total cost for a list of services and quantities (prices from the catalog cache)."""
+    services_by_id = (await catalog_cache.get(db)).active_services_by_id
     items_out: list[CalculateItemOut] = []
     total = Decimal("0")
     for item in payload.items:
@@ -119,6 +111,7 @@ async def calculate_services(
 @router.post("", response_model=ServiceOut)
 async def create_service(
     payload: ServiceCreate,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     _: User = Depends(require_roles("admin")),
 ) -> ServiceOut:
@@ -134,6 +127,7 @@ async def create_service(
     )
     db.add(service)
     await db.commit()
+    _catalog_changed(background_tasks)
     await db.refresh(service)
     logger.info("service_created", service_id=service.id, name=service.name, category=service.category)
     return service
@@ -142,6 +136,7 @@ async def create_service(
 @router.patch("/reorder", response_model=list[ServiceOut])
 async def reorder_services(
     payload: ServiceReorderRequest,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     _: User = Depends(require_roles("admin")),
 ) -> list[ServiceOut]:
@@ -154,6 +149,7 @@ async def reorder_services(
     for item in payload.items:
         services_by_id[item.id].sort_order = item.sort_order
     await db.commit()
+    _catalog_changed(background_tasks)
     ordered = [services_by_id[item.id] for item in payload.items]
     for s in ordered:
         await db.refresh(s)
@@ -163,6 +159,7 @@ async def reorder_services(
 @router.patch("/{service_id}", response_model=ServiceOut)
 async def update_service(
     service_id: int,
+    background_tasks: BackgroundTasks,
     payload: ServiceUpdate,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_roles("admin")),
@@ -189,6 +186,7 @@ async def update_service(
                 continue
         setattr(service, key, value)
     await db.commit()
+    _catalog_changed(background_tasks)
     await db.refresh(service)
     logger.info("service_updated", service_id=service.id, fields=list(dump.keys()))
     return service
@@ -212,6 +210,7 @@ async def get_service_price_history(
 @router.delete("/{service_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_service(
     service_id: int,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     _: User = Depends(require_roles("admin")),
 ) -> None:
@@ -222,17 +221,22 @@ async def delete_service(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Услуга не найдена")
     service.is_active = False
     await db.commit()
+    _catalog_changed(background_tasks)
     logger.info("service_deactivated", service_id=service_id)
 
 
 @router.post("/import", response_model=dict)
 async def import_services(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     db: AsyncSession = Depends(get_db),
     _: User = Depends(require_roles("admin")),
 ) -> dict:
     """Import services from Excel file (admin). Columns: Категория, Название, Цена, Ед., Комментарий."""
-    file_bytes = await file.read()
+    try:
+        file_bytes = await read_upload_bytes(file, settings.MAX_UPLOAD_SIZE_BYTES)
+    except UploadTooLarge:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Файл слишком большой")
     try:
         rows = parse_services_excel(file_bytes)
     except ValueError as e:
@@ -267,6 +271,7 @@ async def import_services(
             )
             created += 1
     await db.commit()
+    _catalog_changed(background_tasks)
     logger.info("services_imported", created=created, updated=updated)
     return {"created": created, "updated": updated}
 
@@ -277,14 +282,10 @@ async def export_services_excel(
     _: User = Depends(require_roles("admin")),
 ) -> Response:
     """Export all (including inactive) services to Excel (admin)."""
-    result = await db.execute(
-        select(Service).order_by(Service.category.asc(), Service.sort_order.asc(), Service.name.asc())
-    )
-    services = list(result.scalars().all())
-    buffer = export_services(services)
+    data = await price_list_artifacts.get(db, SERVICES_XLSX)
     return Response(
-        content=buffer.getvalue(),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        content=data,
+        media_type=SERVICES_XLSX.media_type,
         headers={"Content-Disposition": "attachment; filename=services.xlsx"},
     )
 
@@ -295,13 +296,8 @@ async def send_export_services_to_telegram(
     current_user: User = Depends(require_roles("admin")),
 ) -> dict:
     """Export services to Excel and send to current user in Telegram."""
-    result = await db.execute(
-        select(Service).order_by(Service.category.asc(), Service.sort_order.asc(), Service.name.asc())
-    )
-    services = list(result.scalars().all())
-    buffer = export_services(services)
-    file_bytes = buffer.getvalue()
-    sent = await send_document(current_user.telegram_id, file_bytes, "services.xlsx", caption="Экспорт услуг")
+    file_bytes = await price_list_artifacts.get(db, SERVICES_XLSX)
+    sent = await send_cached_document(current_user.telegram_id, file_bytes, "services.xlsx", caption="Экспорт услуг")
     if not sent:
         raise HTTPException(status_code=502, detail="Не удалось отправить файл в Telegram. Попробуйте позже.")
     return {"sent": True}
@@ -313,16 +309,10 @@ async def export_services_pdf(
     _: User = Depends(get_current_user),
 ) -> Response:
     """Export active services as PDF price list."""
-    result = await db.execute(
-        select(Service)
-        .where(Service.is_active.is_(True))
-        .order_by(Service.category.asc(), Service.sort_order.asc(), Service.name.asc())
-    )
-    services = list(result.scalars().all())
-    pdf_bytes = generate_price_list_pdf(services)
+    pdf_bytes = await price_list_artifacts.get(db, PRICE_LIST_PDF)
     return Response(
         content=pdf_bytes,
-        media_type="application/pdf",
+        media_type=PRICE_LIST_PDF.media_type,
         headers={"Content-Disposition": "attachment; filename=prajs-birka.pdf"},
     )
 
@@ -333,14 +323,8 @@ async def send_services_pdf_to_telegram(
     current_user: User = Depends(get_current_user),
 ) -> dict:
     """Export active services as PDF and send to current user in Telegram."""
-    result = await db.execute(
-        select(Service)
-        .where(Service.is_active.is_(True))
-        .order_by(Service.category.asc(), Service.sort_order.asc(), Service.name.asc())
-    )
-    services = list(result.scalars().all())
-    pdf_bytes = generate_price_list_pdf(services)
-    sent = await send_document(current_user.telegram_id, pdf_bytes, "prajs-birka.pdf", caption="Прайс-лист Бирка")
+    pdf_bytes = await price_list_artifacts.get(db, PRICE_LIST_PDF)
+    sent = await send_cached_document(current_user.telegram_id, pdf_bytes, "prajs-birka.pdf", caption="Прайс-лист Бирка")
     if not sent:
         raise HTTPException(status_code=502, detail="Не удалось отправить файл в Telegram. Попробуйте позже.")
     return {"sent": True}
@@ -6,22 +6,24 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
 from app.api.v1.deps import get_current_user
+from app.api.v1.pagination import keyset_query, split_page
 from app.core.config import settings
-from app.core.crypto import decrypt_value
 from app.core.logging import logger
 from app.db.models.company import Company
-from app.db.models.company_api_keys import CompanyAPIKeys
 from app.db.models.fbo_supply import FBOSupply
 from app.db.models.order import Order
 from app.db.models.shipment_request import ShipmentRequest
 from app.db.models.user import User
 from app.db.session import get_db
 from app.schemas.order import OrderOut
+from app.schemas.pagination import CursorPage
 from app.schemas.shipping import ShipmentRequestCreate, ShipmentRequestList, ShipmentRequestOut
 from app.schemas.shipping import ShipmentRequestStatusUpdate
-from app.services.ozon_api import OzonAPI
+from app.services.credential_health import check_credentials
+from app.services.marketplace_credentials import get_marketplace_clients
+from app.services.marketplace_limiter import MarketplaceBusy
 from app.services.s3 import S3Service
-from app.services.wb_api import WildberriesAPI
+from app.services.uploads import UploadTooLarge, read_upload
 
 router = APIRouter()
 
@@ -63,40 +65,36 @@ def _shipment_request_to_out(request: ShipmentRequest, s3: S3Service) -> Shipmen
 async def _validate_marketplace_keys(
     db: AsyncSession, company_id: int, destination_type: str
 ) -> None:
-    """If destination is WB or Ozon, ensure company has API keys and they work. Raises HTTPException on failure."""
+    """If destination is WB or Ozon, ensure company has API keys and they work. Raises HTTPException on failure.
+
+    Работоспособность ключей берётся из кеша проверок (credential_health); живой запрос — только если кеш устарел.
+    Результат живой проверки записывается в транзакцию запроса и фиксируется вместе с заявкой.
+    """
     dest = (destination_type or "").strip().upper()
     if dest not in ("WB", "OZON"):
         return
-    result = await db.execute(
-        select(CompanyAPIKeys).where(CompanyAPIKeys.company_id == company_id)
-    )
-    keys = result.scalar_one_or_none()
-    secret = settings.ENCRYPTION_KEY or ""
+    marketplace = dest.lower()
+    api = (await get_marketplace_clients(db, company_id, interactive=True)).get(marketplace)
     if dest == "WB":
-        if not keys or not keys.wb_api_key:
+        if api is None:
             raise HTTPException(
                 status_code=400,
                 detail="Укажите API-ключ Wildberries в настройках компании (API-ключи WB / Ozon).",
             )
-        wb_key = decrypt_value(keys.wb_api_key, secret) or keys.wb_api_key
-        api = WildberriesAPI(api_key=wb_key)
-        supplies = await api.get_supplies(limit=1)
-        if supplies is None:
+        valid = await check_credentials(db, company_id, marketplace, api)
+        if not valid:
             raise HTTPException(
                 status_code=400,
                 detail="Не удалось подключиться к API Wildberries. Проверьте ключ в настройках компании.",
             )
     else:  # OZON
-        if not keys or not keys.ozon_client_id or not keys.ozon_api_key:
+        if api is None:
             raise HTTPException(
                 status_code=400,
                 detail="Укажите Client ID и API Key Ozon в настройках компании (API-ключи WB / Ozon).",
             )
-        ozon_cid = decrypt_value(keys.ozon_client_id, secret) or keys.ozon_client_id
-        ozon_key = decrypt_value(keys.ozon_api_key, secret) or keys.ozon_api_key
-        api = OzonAPI(client_id=ozon_cid, api_key=ozon_key)
-        orders = await api.list_supply_orders()
-        if orders is None:
+        valid = await check_credentials(db, company_id, marketplace, api)
+        if not valid:
             raise HTTPException(
                 status_code=400,
                 detail="Не удалось подключиться к API Ozon. Проверьте Client ID и API Key в настройках компании.",
@@ -182,28 +180,17 @@ async def create_shipment_request(
         await db.flush()
         dest = (payload.destination_type or "").strip().upper()
         if dest in ("WB", "OZON"):
-            keys_r = await db.execute(
-                select(CompanyAPIKeys).where(CompanyAPIKeys.company_id == payload.company_id)
-            )
-            keys = keys_r.scalar_one_or_none()
-            secret = settings.ENCRYPTION_KEY or ""
             external_id: str | None = None
             marketplace = dest.lower()
+            api = (await get_marketplace_clients(db, payload.company_id, interactive=True)).get(marketplace)
             box_count = getattr(payload, "box_count", None) or 0
-            if dest == "WB" and keys and box_count > 0:
-                wb_key = decrypt_value(keys.wb_api_key, secret)
-                if wb_key:
-                    api = WildberriesAPI(api_key=wb_key)
-                    external_id = await api.create_supply(name="Поставка")
-                    if external_id:
-                        await api.create_supply_boxes(external_id, box_count)
-            elif dest == "OZON" and keys:
-                ozon_cid = decrypt_value(keys.ozon_client_id, secret)
-                ozon_key = decrypt_value(keys.ozon_api_key, secret)
-                if ozon_cid and ozon_key:
-                    api = OzonAPI(client_id=ozon_cid, api_key=ozon_key)
-                    sid = await api.create_supply_draft()
-                    external_id = str(sid) if sid is not None else None
+            if dest == "WB" and api and box_count > 0:
+                external_id = await api.create_supply(name="Поставка")
+                if external_id:
+                    await api.create_supply_boxes(external_id, box_count)
+            elif dest == "OZON" and api:
+                sid = await api.create_supply_draft()
+                external_id = str(sid) if sid is not None else None
             fbo = FBOSupply(
                 company_id=payload.company_id,
                 order_id=payload.order_id,
@@ -224,21 +211,25 @@ async def create_shipment_request(
         return _shipment_request_to_out(request, s3)
     except HTTPException:
         raise
+    except MarketplaceBusy:
+        await db.rollback()
+        raise
     except Exception as exc:
         await db.rollback()
         logger.exception("shipment_request_failed", company_id=payload.company_id, error=str(exc))
         raise HTTPException(status_code=500, detail="Не удалось создать заявку на отгрузку")
 
 
-@router.get("", response_model=ShipmentRequestList)
+@router.get("", response_model=ShipmentRequestList | CursorPage[ShipmentRequestOut])
 async def list_shipment_requests(
     company_id: int,
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None, description="Курсор следующей страницы (next_cursor); page игнорируется"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
-) -> ShipmentRequestList:
-    """List shipment requests by company."""
+) -> ShipmentRequestList | CursorPage[ShipmentRequestOut]:
+    """List shipment requests by company: page/limit with total or keyset cursor without total (CursorPage)."""
     if current_user.role in {"warehouse", "admin"}:
         company_result = await db.execute(select(Company).where(Company.id == company_id))
     else:
@@ -248,16 +239,24 @@ async def list_shipment_requests(
     if not company_result.scalar_one_or_none():
         raise HTTPException(status_code=404, detail="Компания не найдена")
     base_query = select(ShipmentRequest).where(ShipmentRequest.company_id == company_id)
-    total_result = await db.execute(select(func.count()).select_from(base_query.subquery()))
-    total = int(total_result.scalar_one())
-    offset = (page - 1) * limit
     result = await db.execute(
-        base_query.options(joinedload(ShipmentRequest.order)).offset(offset).limit(limit)
+        keyset_query(
+            base_query.options(joinedload(ShipmentRequest.order)),
+            ShipmentRequest.created_at,
+            ShipmentRequest.id,
+            limit,
+            cursor=cursor,
+            page=page,
+        )
     )
-    requests = list(result.unique().scalars().all())
+    requests, next_cursor = split_page(result.unique().scalars().all(), limit)
     s3 = S3Service()
     items = [_shipment_request_to_out(r, s3) for r in requests]
-    return ShipmentRequestList(items=items, total=total, page=page, limit=limit)
+    if cursor:
+        return CursorPage[ShipmentRequestOut](items=items, limit=limit, next_cursor=next_cursor)
+    total_result = await db.execute(select(func.count()).select_from(base_query.subquery()))
+    total = int(total_result.scalar_one())
+    return ShipmentRequestList(items=items, total=total, page=page, limit=limit, next_cursor=next_cursor)
 
 
 @router.patch("/{request_id}/status", response_model=ShipmentRequestOut)
@@ -322,12 +321,16 @@ async def upload_supply_barcode(
             status_code=400,
             detail="Разрешены только PDF или изображения (JPEG, PNG, GIF, WebP)",
         )
-    data = await file.read()
-    if len(data) > settings.MAX_UPLOAD_SIZE_BYTES:
+    try:
+        upload = await read_upload(file, settings.MAX_UPLOAD_SIZE_BYTES)
+    except UploadTooLarge:
         raise HTTPException(status_code=400, detail="Файл слишком большой")
     s3 = S3Service()
     key = f"shipping/{request_id}/supply_barcode_{datetime.utcnow().timestamp():.0f}_{file.filename or 'file'}"
-    s3.upload_bytes(key, data, content_type)
+    try:
+        await s3.upload_file_async(key, upload.file, content_type)
+    finally:
+        upload.close()
     url = s3.build_public_url(key)
     if not await s3.head_check(url):
         raise HTTPException(status_code=400, detail="Проверка загрузки не прошла")
@@ -362,12 +365,16 @@ async def upload_box_barcodes(
             status_code=400,
             detail="Разрешены PDF, изображения (JPEG, PNG, GIF, WebP) или Excel",
         )
-    data = await file.read()
-    if len(data) > settings.MAX_UPLOAD_SIZE_BYTES:
+    try:
+        upload = await read_upload(file, settings.MAX_UPLOAD_SIZE_BYTES)
+    except UploadTooLarge:
         raise HTTPException(status_code=400, detail="Файл слишком большой")
     s3 = S3Service()
     key = f"shipping/{request_id}/box_barcodes_{datetime.utcnow().timestamp():.0f}_{file.filename or 'file'}"
-    s3.upload_bytes(key, data, content_type)
+    try:
+        await s3.upload_file_async(key, upload.file, content_type)
+    finally:
+        upload.close()
     url = s3.build_public_url(key)
     if not await s3.head_check(url):
         raise HTTPException(status_code=400, detail="Проверка загрузки не прошла")
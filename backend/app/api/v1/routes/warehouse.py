@@ -3,7 +3,7 @@ from datetime import datetime as dt
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
-from sqlalchemy import func, select
+from sqlalchemy import func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
@@ -14,19 +14,35 @@ from app.db.models.order import Order, OrderItem
 from app.db.models.order_photo import OrderPhoto
 from app.db.models.packing_record import PackingRecord
 from app.db.models.product import Product
-from app.db.models.warehouse_employee import WarehouseEmployee
 from app.db.session import get_db
 from app.schemas.warehouse import (
+    BarcodeBatchScanItem,
+    BarcodeBatchScanRequest,
+    BarcodeBatchScanResponse,
     BarcodeValidateInOrderRequest,
     BarcodeValidateInOrderResponse,
     BarcodeValidateRequest,
     BarcodeValidateResponse,
+    PackedOrderOut,
+    PackingBatchResult,
+    PackingRecordBatchCreate,
     PackingRecordCreate,
     ReceivingComplete,
 )
+from app.services.aggregates import bump_company_stats, open_orders_delta
+from app.services.barcode_index import (
+    KIND_PRODUCT,
+    BarcodeEntry,
+    barcode_index,
+    box_entry,
+    product_entry,
+    refresh_entry,
+)
 from app.services.excel import export_fbo_shipping
 from app.services.files import content_disposition
-from app.services.telegram import send_document, send_notification
+from app.services.notifications import enqueue_notification, order_coalesce_key
+from app.services.packing import PackingError, apply_packing
+from app.services.telegram import send_document
 from app.core.logging import logger
 from app.db.models.user import User
 
@@ -51,6 +67,8 @@ async def complete_receiving(
 
         total_received = 0
         total_defect = 0
+        stock_delta = 0
+        new_defective_products = 0
         for item in payload.items:
             if item.received_qty < 0 or item.defect_qty < 0 or item.adjustment_qty < 0:
                 raise HTTPException(status_code=400, detail="Некорректные количества")
@@ -75,34 +93,68 @@ async def complete_receiving(
                         status_code=400,
                         detail=f"Требуется фото брака для товара (product_id={order_item.product_id})",
                     )
-            order_item.received_qty = item.received_qty
-            order_item.defect_qty = item.defect_qty
-            order_item.adjustment_qty = item.adjustment_qty
-            order_item.adjustment_note = item.adjustment_note
+            # Приёмка может идти частями (форма отправляет позицию за позицией): количества прибавляются.
+            item_values = {
+                "received_qty": OrderItem.received_qty + item.received_qty,
+                "defect_qty": OrderItem.defect_qty + item.defect_qty,
+                "adjustment_qty": OrderItem.adjustment_qty + item.adjustment_qty,
+            }
+            if item.adjustment_note is not None:
+                item_values["adjustment_note"] = item.adjustment_note
+            await db.execute(update(OrderItem).where(OrderItem.id == order_item.id).values(**item_values))
             total_received += item.received_qty
             total_defect += item.defect_qty
 
-            product_result = await db.execute(select(Product).where(Product.id == order_item.product_id))
-            product = product_result.scalar_one_or_none()
-            if product:
-                net_received = item.received_qty - item.defect_qty - item.adjustment_qty
-                product.stock_quantity += max(net_received, 0)
-                product.defect_quantity += item.defect_qty
+            net_received = max(item.received_qty - item.defect_qty - item.adjustment_qty, 0)
+            product_result = await db.execute(
+                update(Product)
+                .where(Product.id == order_item.product_id)
+                .values(
+                    stock_quantity=Product.stock_quantity + net_received,
+                    defect_quantity=Product.defect_quantity + item.defect_qty,
+                )
+                .returning(Product.defect_quantity)
+                .execution_options(synchronize_session=False)
+            )
+            defect_after = product_result.scalar_one_or_none()
+            if defect_after is not None:
+                stock_delta += net_received
+                if item.defect_qty > 0 and defect_after == item.defect_qty:
+                    new_defective_products += 1
 
-        order.received_qty = total_received
-        order.status = "Принято"
+        old_status = order.status
+        new_status = "Принято"
+        await db.execute(
+            update(Order)
+            .where(Order.id == order.id)
+            .values(
+                received_qty=Order.received_qty + total_received,
+                defect_qty=Order.defect_qty + total_defect,
+                status=new_status,
+            )
+        )
+        await bump_company_stats(
+            db,
+            order.company_id,
+            stock_quantity=stock_delta,
+            defect_quantity=total_defect,
+            products_with_defects=new_defective_products,
+            orders_received_qty=total_received,
+            orders_open=open_orders_delta(old_status, new_status),
+        )
         company_result = await db.execute(
             select(Company).where(Company.id == order.company_id).options(joinedload(Company.user))
         )
         company = company_result.scalar_one_or_none()
         telegram_id = company.user.telegram_id if company and company.user else None
-        order_number = order.order_number
-        await db.commit()
         if telegram_id:
-            await send_notification(
+            enqueue_notification(
+                db,
                 telegram_id,
-                f"Заявка {order_number} принята на склад.",
+                f"Заявка {order.order_number} принята на склад.",
+                coalesce_key=order_coalesce_key(order.id),
             )
+        await db.commit()
         return {"received": total_received, "defects": total_defect}
     except HTTPException:
         raise
@@ -118,163 +170,126 @@ async def create_packing_record(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_roles("warehouse", "admin")),
 ) -> dict:
-    """Create packing record."""
+    """Create packing record (atomic counter increments)."""
     try:
-        employee_code = payload.employee_code.strip()
-        if not employee_code:
-            raise HTTPException(status_code=400, detail="Укажите код сотрудника")
-        employee_result = await db.execute(
-            select(WarehouseEmployee).where(WarehouseEmployee.employee_code == employee_code)
-        )
-        employee = employee_result.scalar_one_or_none()
-        if not employee:
-            user_employee_result = await db.execute(
-                select(WarehouseEmployee).where(WarehouseEmployee.user_id == current_user.id)
-            )
-            user_employee = user_employee_result.scalar_one_or_none()
-            if user_employee:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Неверный ID сотрудника. Ваш ID: {user_employee.employee_code}",
-                )
-            employee = WarehouseEmployee(user_id=current_user.id, employee_code=employee_code)
-            db.add(employee)
-            await db.flush()
-            logger.info(
-                "warehouse_employee_auto_created",
-                user_id=current_user.id,
-                employee_code=employee_code,
-            )
-
-        order_result = await db.execute(select(Order).where(Order.id == payload.order_id))
-        order = order_result.scalar_one_or_none()
-        if not order:
-            raise HTTPException(status_code=404, detail="Заявка не найдена")
-        if order.status != "Принято" and order.received_qty <= 0:
-            raise HTTPException(
-                status_code=400,
-                detail="Упаковка возможна только после завершения приёмки заявки.",
-            )
-        company_result = await db.execute(select(Company).where(Company.id == order.company_id))
-        if not company_result.scalar_one_or_none():
-            raise HTTPException(status_code=404, detail="Компания не найдена")
-
-        order_item_result = await db.execute(
-            select(OrderItem).where(
-                OrderItem.id == payload.order_item_id,
-                OrderItem.order_id == payload.order_id,
-                OrderItem.product_id == payload.product_id,
-            )
-        )
-        order_item = order_item_result.scalar_one_or_none()
-        if not order_item:
-            raise HTTPException(
-                status_code=400,
-                detail="Позиция заявки не найдена или не совпадает с заказом и товаром.",
-            )
-        remainder = order_item.received_qty - order_item.defect_qty - order_item.packed_qty
-        if payload.quantity > remainder:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Перепаковка: по позиции доступно к упаковке {remainder} шт., указано {payload.quantity}.",
-            )
-
-        record = PackingRecord(
-            order_id=payload.order_id,
-            order_item_id=payload.order_item_id,
-            product_id=payload.product_id,
-            employee_id=employee.id,
-            pallet_number=payload.pallet_number,
-            box_number=payload.box_number,
-            quantity=payload.quantity,
-            warehouse=payload.warehouse,
-            box_barcode=payload.box_barcode,
-            materials_used=payload.materials_used,
-            time_spent_minutes=payload.time_spent_minutes,
-        )
-        db.add(record)
-
-        order.packed_qty += payload.quantity
-        order_item.packed_qty += payload.quantity
-
-        items_result = await db.execute(select(OrderItem).where(OrderItem.order_id == payload.order_id))
-        order_items = items_result.scalars().all()
-        total_defect = sum(i.defect_qty for i in order_items)
-        effective_plan = order.received_qty - total_defect
-        if order.packed_qty >= effective_plan:
-            order.status = "Готово к отгрузке"
-        else:
-            order.status = "Упаковка"
-
-        product_result = await db.execute(select(Product).where(Product.id == payload.product_id))
-        product = product_result.scalar_one_or_none()
-        if product:
-            product.stock_quantity = max(product.stock_quantity - payload.quantity, 0)
-
+        await apply_packing(db, [payload], current_user)
         await db.commit()
         return {"status": "ok"}
-    except HTTPException:
-        raise
+    except PackingError as exc:
+        await db.rollback()
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
     except Exception as exc:
         await db.rollback()
         logger.exception("packing_record_failed", order_id=payload.order_id, error=str(exc))
         raise HTTPException(status_code=500, detail="Не удалось сохранить запись упаковки")
 
 
+@router.post("/packing/records/batch", response_model=PackingBatchResult)
+async def create_packing_records_batch(
+    payload: PackingRecordBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_roles("warehouse", "admin")),
+) -> PackingBatchResult:
+    """Create several packing records in one transaction (all or nothing)."""
+    try:
+        packed = await apply_packing(db, payload.records, current_user)
+        await db.commit()
+        logger.info("packing_batch_ok", records=len(payload.records), orders=len(packed))
+        return PackingBatchResult(
+            created=len(payload.records),
+            orders=[
+                PackedOrderOut(order_id=item.order_id, packed_qty=item.packed_qty, status=item.status)
+                for item in packed
+            ],
+        )
+    except PackingError as exc:
+        await db.rollback()
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+    except Exception as exc:
+        await db.rollback()
+        logger.exception("packing_batch_failed", records=len(payload.records), error=str(exc))
+        raise HTTPException(status_code=500, detail="Не удалось сохранить записи упаковки")
+
+
+async def _lookup_barcode_in_db(db: AsyncSession, barcode: str) -> BarcodeEntry | None:
+    """Resolve barcode from DB (index miss): product first, then FBO box."""
+    result = await db.execute(
+        select(Product).join(Company, Company.id == Product.company_id).where(Product.barcode == barcode)
+    )
+    product = result.scalar_one_or_none()
+    if product:
+        return product_entry(product)
+    box_result = await db.execute(
+        select(FBOSupplyBox).where(FBOSupplyBox.external_barcode == barcode).order_by(FBOSupplyBox.id.desc()).limit(1)
+    )
+    box = box_result.scalars().first()
+    if box:
+        return box_entry(box)
+    return None
+
+
 @router.post("/barcode/validate", response_model=BarcodeValidateResponse)
 async def validate_barcode(
     payload: BarcodeValidateRequest,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_roles("warehouse", "admin")),
 ) -> BarcodeValidateResponse:
-    """Validate barcode against products or FBO box barcodes."""
+    """Validate barcode against products or FBO box barcodes (in-memory index, DB on miss or expired hit)."""
     try:
         barcode = (payload.barcode or "").strip()
-        result = await db.execute(select(Product).where(Product.barcode == barcode))
-        product = result.scalar_one_or_none()
-        if product:
-            company_result = await db.execute(select(Company).where(Company.id == product.company_id))
-            if not company_result.scalar_one_or_none():
-                return BarcodeValidateResponse(valid=False, message="ШК не найден")
-            logger.info("barcode_validate_ok", product_id=product.id, barcode_len=len(barcode))
+        if not barcode:
+            return BarcodeValidateResponse(valid=False, message="ШК не найден")
+        entry = barcode_index.resolve(barcode)
+        if entry is None or not barcode_index.is_fresh(barcode):
+            # Промах или попадание старше TTL: перечитываем из БД и обновляем отметку времени.
+            if entry is not None:
+                cached = entry
+                entry = await refresh_entry(db, cached)
+                if entry is None:
+                    barcode_index.discard(cached.barcode, cached.kind, cached.entity_id)
+            if entry is None:
+                entry = await _lookup_barcode_in_db(db, barcode)
+            barcode_index.put(entry)
+        if entry is None:
+            return BarcodeValidateResponse(valid=False, message="ШК не найден")
+        if entry.kind == KIND_PRODUCT:
+            logger.info("barcode_validate_ok", product_id=entry.entity_id, barcode_len=len(barcode))
             return BarcodeValidateResponse(
                 valid=True,
-                message=f"ШК найден: {product.name}",
+                message=f"ШК найден: {entry.summary['name']}",
                 type="product",
-                product={
-                    "id": product.id,
-                    "name": product.name,
-                    "brand": product.brand,
-                    "size": product.size,
-                    "color": product.color,
-                    "wb_article": product.wb_article,
-                    "barcode": product.barcode,
-                },
+                product=entry.summary,
             )
-        box_result = await db.execute(
-            select(FBOSupplyBox).where(FBOSupplyBox.external_barcode == barcode)
+        logger.info("barcode_validate_box_ok", box_id=entry.entity_id, supply_id=entry.summary["supply_id"])
+        return BarcodeValidateResponse(
+            valid=True,
+            message=f"Короб №{entry.summary['box_number']}",
+            type="box",
+            box=entry.summary,
         )
-        box = box_result.scalar_one_or_none()
-        if box:
-            logger.info("barcode_validate_box_ok", box_id=box.id, supply_id=box.supply_id)
-            return BarcodeValidateResponse(
-                valid=True,
-                message=f"Короб №{box.box_number}",
-                type="box",
-                box={
-                    "id": box.id,
-                    "box_number": box.box_number,
-                    "supply_id": box.supply_id,
-                    "external_box_id": box.external_box_id,
-                    "external_barcode": box.external_barcode,
-                },
-            )
-        return BarcodeValidateResponse(valid=False, message="ШК не найден")
     except Exception as exc:
         logger.exception("barcode_validate_failed", error=str(exc))
         raise HTTPException(status_code=500, detail="Ошибка проверки штрихкода")
 
 
+def _order_item_summary(item: OrderItem, product: Product) -> dict:
+    """Order item fields for validate-in-order responses."""
+    return {
+        "id": item.id,
+        "product_id": item.product_id,
+        "product_name": product.name,
+        "planned_qty": item.planned_qty,
+        "received_qty": item.received_qty,
+        "packed_qty": item.packed_qty,
+        "defect_qty": item.defect_qty,
+    }
+
+
+def _order_item_found_message(item: OrderItem, product: Product) -> str:
+    """Scanner message for barcode found in order."""
+    return f"Позиция в заявке: {product.name}, план {item.planned_qty}, принято {item.received_qty}"
+
+
 @router.post("/barcode/validate-in-order", response_model=BarcodeValidateInOrderResponse)
 async def validate_barcode_in_order(
     payload: BarcodeValidateInOrderRequest,
@@ -303,8 +318,6 @@ async def validate_barcode_in_order(
                 message="ШК не относится к выбранной заявке",
             )
         item, product = row
-        remaining_to_receive = max(0, item.planned_qty - item.received_qty)
-        remaining_to_pack = max(0, item.received_qty - item.defect_qty - item.packed_qty)
         logger.info(
             "barcode_validate_in_order_ok",
             order_id=payload.order_id,
@@ -312,24 +325,93 @@ async def validate_barcode_in_order(
         )
         return BarcodeValidateInOrderResponse(
             found=True,
-            message=f"Позиция в заявке: {product.name}, план {item.planned_qty}, принято {item.received_qty}",
-            order_item={
-                "id": item.id,
-                "product_id": item.product_id,
-                "product_name": product.name,
-                "planned_qty": item.planned_qty,
-                "received_qty": item.received_qty,
-                "packed_qty": item.packed_qty,
-                "defect_qty": item.defect_qty,
-            },
-            remaining_to_receive=remaining_to_receive,
-            remaining_to_pack=remaining_to_pack,
+            message=_order_item_found_message(item, product),
+            order_item=_order_item_summary(item, product),
+            remaining_to_receive=max(0, item.planned_qty - item.received_qty),
+            remaining_to_pack=max(0, item.received_qty - item.defect_qty - item.packed_qty),
         )
     except Exception as exc:
         logger.exception("barcode_validate_in_order_failed", error=str(exc))
         raise HTTPException(status_code=500, detail="Ошибка проверки штрихкода в заявке")
 
 
+@router.post("/barcode/validate-in-order/batch", response_model=BarcodeBatchScanResponse)
+async def validate_barcodes_in_order_batch(
+    payload: BarcodeBatchScanRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_roles("warehouse", "admin")),
+) -> BarcodeBatchScanResponse:
+    """Resolve a buffered batch of scans for one order in a single query (offline scanner flush)."""
+    try:
+        counts: dict[str, int] = {}
+        for scan in payload.scans:
+            barcode = (scan.barcode or "").strip()
+            if barcode:
+                counts[barcode] = counts.get(barcode, 0) + scan.count
+        if not counts:
+            return BarcodeBatchScanResponse(order_found=True, message="Нет штрихкодов", items=[])
+        result = await db.execute(
+            select(OrderItem, Product)
+            .join(Order, Order.id == OrderItem.order_id)
+            .join(Company, Company.id == Order.company_id)
+            .join(Product, Product.id == OrderItem.product_id)
+            .where(OrderItem.order_id == payload.order_id, Product.barcode.in_(list(counts)))
+            .order_by(OrderItem.id.asc())
+        )
+        rows_by_barcode: dict[str, tuple[OrderItem, Product]] = {}
+        for item, product in result.all():
+            rows_by_barcode.setdefault(product.barcode, (item, product))
+        if not rows_by_barcode:
+            order_result = await db.execute(
+                select(Order.id).join(Company, Company.id == Order.company_id).where(Order.id == payload.order_id)
+            )
+            if order_result.scalar_one_or_none() is None:
+                return BarcodeBatchScanResponse(order_found=False, message="Заявка не найдена", items=[])
+        items: list[BarcodeBatchScanItem] = []
+        for barcode, count in counts.items():
+            row = rows_by_barcode.get(barcode)
+            if not row:
+                items.append(
+                    BarcodeBatchScanItem(
+                        barcode=barcode,
+                        count=count,
+                        found=False,
+                        message="ШК не относится к выбранной заявке",
+                    )
+                )
+                continue
+            item, product = row
+            remaining_to_receive = max(0, item.planned_qty - item.received_qty)
+            remaining_to_pack = max(0, item.received_qty - item.defect_qty - item.packed_qty)
+            excess_to_receive = max(0, count - remaining_to_receive)
+            message = _order_item_found_message(item, product)
+            if excess_to_receive:
+                message += f", отсканировано {count} — сверх плана {excess_to_receive}"
+            items.append(
+                BarcodeBatchScanItem(
+                    barcode=barcode,
+                    count=count,
+                    found=True,
+                    message=message,
+                    order_item=_order_item_summary(item, product),
+                    remaining_to_receive=remaining_to_receive,
+                    remaining_to_pack=remaining_to_pack,
+                    excess_to_receive=excess_to_receive,
+                    excess_to_pack=max(0, count - remaining_to_pack),
+                )
+            )
+        found = len(rows_by_barcode)
+        logger.info("barcode_batch_scan_ok", order_id=payload.order_id, barcodes=len(counts), found=found)
+        return BarcodeBatchScanResponse(
+            order_found=True,
+            message=f"Найдено в заявке: {found} из {len(counts)}",
+            items=items,
+        )
+    except Exception as exc:
+        logger.exception("barcode_batch_scan_failed", order_id=payload.order_id, error=str(exc))
+        raise HTTPException(status_code=500, detail="Ошибка проверки штрихкодов в заявке")
+
+
 @router.post("/order/{order_id}/complete")
 async def complete_order(
     order_id: int,
@@ -349,12 +431,15 @@ async def complete_order(
         raise HTTPException(status_code=404, detail="Компания не найдена")
     telegram_id = company.user.telegram_id if company.user else None
     order_number = order.order_number
+    old_status = order.status
     order.status = "Завершено"
     order.completed_at = dt.utcnow()
-    await db.commit()
+    await db.flush()
+    await bump_company_stats(db, order.company_id, orders_open=open_orders_delta(old_status, order.status))
     if telegram_id:
         msg = f"Заявка {order_number}: Завершено. Упаковано всего {order.packed_qty} шт."
-        await send_notification(telegram_id, msg)
+        enqueue_notification(db, telegram_id, msg, coalesce_key=order_coalesce_key(order.id))
+    await db.commit()
     return {"status": "ok"}
 
 
@@ -1,21 +1,47 @@
-"""Encryption helpers for sensitive values (e.g. API keys). Uses Fernet (AES)."""
+"""Encryption helpers for sensitive values (e.g. API keys). Uses Fernet (AES).
+
+ENCRYPTION_KEY может содержать несколько ключей через запятую (MultiFernet): шифрование — первым,
+расшифровка — любым. Экземпляр строится один раз на значение секрета. Ротация: новый ключ первым,
+старый — следом; значения под старым ключом перешифровываются (reencrypt_value, app.services.key_rotation).
+"""
+import hashlib
+from functools import lru_cache
 from typing import Optional
 
-from cryptography.fernet import Fernet, InvalidToken
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 
 from app.core.logging import logger
 
 
-def _get_fernet(secret: str) -> Optional[Fernet]:
-    """Build Fernet from ENCRYPTION_KEY (base64 url-safe, 44 chars)."""
-    if not secret or not secret.strip():
-        return None
-    key = secret.strip()
+# Все Fernet-токены начинаются с версии 0x80 в base64: так шифротекст отличается от незашифрованного значения.
+FERNET_TOKEN_PREFIX = "gAAAAA"
+
+
+def _split_keys(secret: str) -> list[str]:
+    return [key.strip() for key in (secret or "").split(",") if key.strip()]
+
+
+@lru_cache(maxsize=8)
+def _get_fernets(secret: str) -> tuple[Fernet, ...]:
+    """Fernet per key of ENCRYPTION_KEY, primary first. Empty on missing/invalid key. Cached."""
     try:
-        return Fernet(key.encode())
+        return tuple(Fernet(key.encode()) for key in _split_keys(secret))
     except Exception as e:
         logger.warning("crypto_fernet_init_failed", error=str(e))
-        return None
+        return ()
+
+
+@lru_cache(maxsize=8)
+def _get_fernet(secret: str) -> Optional[MultiFernet]:
+    """Build (Multi)Fernet from ENCRYPTION_KEY (base64 url-safe, 44 chars; several — comma-separated). Cached."""
+    fernets = _get_fernets(secret)
+    return MultiFernet(list(fernets)) if fernets else None
+
+
+def key_fingerprint(secret: str) -> str:
+    """Short hash of the primary key (to tell rotations apart without storing the key)."""
+    keys = _split_keys(secret)
+    return hashlib.blake2b(keys[0].encode(), digest_size=8).hexdigest() if keys else ""
 
 
 def encrypt_value(plain: Optional[str], secret: str) -> Optional[str]:
@@ -50,3 +76,28 @@ def decrypt_value(cipher: Optional[str], secret: str) -> Optional[str]:
     except Exception as e:
         logger.warning("crypto_decrypt_failed", error=str(e))
         return cipher
+
+
+def reencrypt_value(cipher: Optional[str], secret: str) -> Optional[str]:
+    """
+    Value re-encrypted with the primary key, or None if nothing to do (empty, already primary, no key).
+    Legacy plaintext is encrypted; a token no configured key can decrypt is left as is.
+    """
+    if cipher is None or not cipher.strip():
+        return None
+    fernets = _get_fernets(secret)
+    if not fernets:
+        return None
+    token = cipher.encode()
+    try:
+        fernets[0].decrypt(token)
+        return None
+    except InvalidToken:
+        pass
+    if not cipher.startswith(FERNET_TOKEN_PREFIX):
+        return fernets[0].encrypt(token).decode()
+    try:
+        return MultiFernet(list(fernets)).rotate(token).decode()
+    except InvalidToken:
+        logger.warning("crypto_rotate_unknown_key")
+        return None
@@ -1,11 +1,14 @@
 """ORM models."""
 from app.db.models.ai_settings import AISettings
 from app.db.models.company import Company
-from app.db.models.company_api_keys import CompanyAPIKeys
+from app.db.models.company_api_keys import CompanyAPIKeys, MarketplaceCredentialHealth
+from app.db.models.company_stats import CompanyStats
 from app.db.models.contract_template import ContractTemplate
-from app.db.models.fbo_supply import FBOSupply, FBOSupplyBox, FBOSupplyItem
+from app.db.models.fbo_supply import FBOSupply, FBOSupplyBox, FBOSupplyItem, MarketplaceSyncState
 from app.db.models.destination import Destination
 from app.db.models.document_chunk import DocumentChunk
+from app.db.models.maintenance_checkpoint import MaintenanceCheckpoint
+from app.db.models.notification_outbox import NotificationOutbox
 from app.db.models.order import Order, OrderItem
 from app.db.models.order_service import OrderService
 from app.db.models.order_counter import OrderCounter
@@ -23,12 +26,17 @@ __all__ = [
     "ChatMessage",
     "Company",
     "CompanyAPIKeys",
+    "CompanyStats",
     "FBOSupply",
     "FBOSupplyBox",
     "FBOSupplyItem",
     "ContractTemplate",
     "Destination",
     "DocumentChunk",
+    "MaintenanceCheckpoint",
+    "MarketplaceCredentialHealth",
+    "MarketplaceSyncState",
+    "NotificationOutbox",
     "Order",
     "OrderItem",
     "OrderCounter",
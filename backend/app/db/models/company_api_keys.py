@@ -1,7 +1,7 @@
 """Company API keys for WB/Ozon marketplace integration."""
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, String
+from sqlalchemy import DateTime, ForeignKey, String, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -25,3 +25,19 @@ class CompanyAPIKeys(Base):
     )
 
     company = relationship("Company", back_populates="api_keys")
+
+
+class MarketplaceCredentialHealth(Base):
+    """Last validation result of company marketplace credentials (see app.services.credential_health)."""
+
+    __tablename__ = "marketplace_credential_health"
+    __table_args__ = (UniqueConstraint("company_id", "marketplace", name="uq_marketplace_credential_health_company"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    company_id: Mapped[int] = mapped_column(ForeignKey("companies.id", ondelete="CASCADE"), index=True)
+    marketplace: Mapped[str] = mapped_column(String(32))  # wb | ozon
+    keys_updated_at: Mapped[datetime | None] = mapped_column(DateTime)  # company_api_keys.updated_at проверенных ключей
+    checked_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_ok_at: Mapped[datetime | None] = mapped_column(DateTime)
+    last_failed_at: Mapped[datetime | None] = mapped_column(DateTime)
+    last_error: Mapped[str | None] = mapped_column(String(512))
@@ -0,0 +1,25 @@
+"""Company stats model (materialized aggregates)."""
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class CompanyStats(Base):
+    """Per-company counters maintained on receiving/packing/order events (see app.services.aggregates)."""
+
+    __tablename__ = "company_stats"
+
+    company_id: Mapped[int] = mapped_column(ForeignKey("companies.id", ondelete="CASCADE"), primary_key=True)
+    products_total: Mapped[int] = mapped_column(Integer, default=0)
+    stock_quantity: Mapped[int] = mapped_column(Integer, default=0)
+    defect_quantity: Mapped[int] = mapped_column(Integer, default=0)
+    products_with_defects: Mapped[int] = mapped_column(Integer, default=0)
+    orders_total: Mapped[int] = mapped_column(Integer, default=0)
+    orders_open: Mapped[int] = mapped_column(Integer, default=0)
+    orders_planned_qty: Mapped[int] = mapped_column(Integer, default=0)
+    orders_received_qty: Mapped[int] = mapped_column(Integer, default=0)
+    orders_packed_qty: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -1,7 +1,7 @@
 """FBO supply models for marketplace integration (WB/Ozon)."""
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -11,6 +11,10 @@ class FBOSupply(Base):
     """FBO supply (shipment to marketplace warehouse)."""
 
     __tablename__ = "fbo_supplies"
+    __table_args__ = (
+        Index("ix_fbo_supplies_company_created_id", "company_id", "created_at", "id"),
+        Index("ix_fbo_supplies_company_marketplace_external", "company_id", "marketplace", "external_supply_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     order_id: Mapped[int | None] = mapped_column(ForeignKey("orders.id"), index=True)
@@ -20,6 +24,7 @@ class FBOSupply(Base):
     status: Mapped[str] = mapped_column(String(32), default="draft")  # draft | created | in_progress | completed
     warehouse_name: Mapped[str | None] = mapped_column(String(128))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    synced_at: Mapped[datetime | None] = mapped_column(DateTime)  # последняя сверка с маркетплейсом
 
     order = relationship("Order", back_populates="fbo_supplies")
     shipment_requests = relationship("ShipmentRequest", back_populates="fbo_supply")
@@ -35,7 +40,7 @@ class FBOSupplyBox(Base):
     supply_id: Mapped[int] = mapped_column(ForeignKey("fbo_supplies.id"), index=True)
     box_number: Mapped[int] = mapped_column(Integer)
     external_box_id: Mapped[str | None] = mapped_column(String(128))  # WB-TRBX-xxx etc
-    external_barcode: Mapped[str | None] = mapped_column(String(128))  # сканируемый ШК/QR
+    external_barcode: Mapped[str | None] = mapped_column(String(128), index=True)  # сканируемый ШК/QR
 
     supply = relationship("FBOSupply", back_populates="boxes")
     items = relationship("FBOSupplyItem", back_populates="box", cascade="all, delete-orphan")
@@ -53,4 +58,18 @@ class FBOSupplyItem(Base):
     quantity: Mapped[int] = mapped_column(Integer)
     barcode: Mapped[str] = mapped_column(String(64))
 
-    box = relationship("FBOSupplyBox", back_populates="items")
\ No newline at end of file
+    box = relationship("FBOSupplyBox", back_populates="items")
+
+
+class MarketplaceSyncState(Base):
+    """Supply sync watermark per company and marketplace (see app.services.supply_sync)."""
+
+    __tablename__ = "marketplace_sync_state"
+    __table_args__ = (UniqueConstraint("company_id", "marketplace", name="uq_marketplace_sync_state_company"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    company_id: Mapped[int] = mapped_column(ForeignKey("companies.id", ondelete="CASCADE"), index=True)
+    marketplace: Mapped[str] = mapped_column(String(32))  # wb | ozon
+    cursor: Mapped[str | None] = mapped_column(String(64))  # WB: next, Ozon: last_supply_order_id
+    synced_at: Mapped[datetime | None] = mapped_column(DateTime)
+    last_error: Mapped[str | None] = mapped_column(String(512))
@@ -0,0 +1,17 @@
+"""Progress checkpoints of long-running background jobs."""
+from datetime import datetime
+
+from sqlalchemy import DateTime, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class MaintenanceCheckpoint(Base):
+    """Resume position of a batched background job (e.g. key rotation: fingerprint and last id)."""
+
+    __tablename__ = "maintenance_checkpoints"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[str] = mapped_column(String(256))
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
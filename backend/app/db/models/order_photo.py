@@ -1,7 +1,8 @@
 """Order photos."""
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, String
+from sqlalchemy import DateTime, ForeignKey, JSON, String
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -17,6 +18,7 @@ class OrderPhoto(Base):
     product_id: Mapped[int | None] = mapped_column(ForeignKey("products.id"), index=True)
     s3_key: Mapped[str] = mapped_column(String(512))
     photo_type: Mapped[str | None] = mapped_column(String(64))
+    variants: Mapped[dict | None] = mapped_column(JSONB().with_variant(JSON, "sqlite"))  # вариант → ключ S3
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     order = relationship("Order", back_populates="photos")
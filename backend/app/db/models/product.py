@@ -1,16 +1,27 @@
 """Product models."""
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, JSON, String, Text, event
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
+from app.db.search_text import normalize_search_text
 
 
 class Product(Base):
     """Product details."""
 
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_company_created_id", "company_id", "created_at", "id"),
+        Index(
+            "ix_products_search_text_trgm",
+            "search_text",
+            postgresql_using="gin",
+            postgresql_ops={"search_text": "gin_trgm_ops"},
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     company_id: Mapped[int] = mapped_column(ForeignKey("companies.id"), index=True)
@@ -25,6 +36,7 @@ class Product(Base):
     supplier_name: Mapped[str | None] = mapped_column(String(256))
     stock_quantity: Mapped[int] = mapped_column(Integer, default=0)
     defect_quantity: Mapped[int] = mapped_column(Integer, default=0)
+    search_text: Mapped[str | None] = mapped_column(Text)  # нормализованные name/brand/barcode/wb_article
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     company = relationship("Company", back_populates="products")
@@ -32,6 +44,13 @@ class Product(Base):
     order_items = relationship("OrderItem", back_populates="product")
 
 
+@event.listens_for(Product, "before_insert")
+@event.listens_for(Product, "before_update")
+def _product_search_text(mapper, connection, target: Product) -> None:
+    """Keep search_text in sync with searchable fields on every ORM write."""
+    target.search_text = normalize_search_text(target.name, target.brand, target.barcode, target.wb_article)
+
+
 class ProductPhoto(Base):
     """Product photo stored in S3."""
 
@@ -40,6 +59,7 @@ class ProductPhoto(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), index=True)
     s3_key: Mapped[str] = mapped_column(String(512))
+    variants: Mapped[dict | None] = mapped_column(JSONB().with_variant(JSON, "sqlite"))  # вариант → ключ S3
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     product = relationship("Product", back_populates="photos")
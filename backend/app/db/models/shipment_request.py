@@ -1,7 +1,7 @@
 """Shipment request model."""
 from datetime import date, datetime
 
-from sqlalchemy import Date, DateTime, ForeignKey, String, Text
+from sqlalchemy import Date, DateTime, ForeignKey, Index, String, Text, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -11,6 +11,15 @@ class ShipmentRequest(Base):
     """Shipment request from client."""
 
     __tablename__ = "shipment_requests"
+    __table_args__ = (
+        Index("ix_shipment_requests_company_created_id", "company_id", "created_at", "id"),
+        # Автозакрытие по дате: индекс только по неотгруженным заявкам.
+        Index(
+            "ix_shipment_requests_open_delivery_date",
+            "delivery_date",
+            postgresql_where=text("status <> 'Отгружено'"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     company_id: Mapped[int] = mapped_column(ForeignKey("companies.id"), index=True)
@@ -1,16 +1,25 @@
 """User model."""
 from datetime import datetime
 
-from sqlalchemy import BigInteger, DateTime, String
+from sqlalchemy import BigInteger, DateTime, Index, String, Text, event
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
+from app.db.search_text import normalize_search_text
 
 
 class User(Base):
     """Telegram user."""
 
     __tablename__ = "users"
+    __table_args__ = (
+        Index(
+            "ix_users_search_text_trgm",
+            "search_text",
+            postgresql_using="gin",
+            postgresql_ops={"search_text": "gin_trgm_ops"},
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, index=True)
@@ -18,8 +27,16 @@ class User(Base):
     first_name: Mapped[str | None] = mapped_column(String(128))
     last_name: Mapped[str | None] = mapped_column(String(128))
     role: Mapped[str] = mapped_column(String(32), default="client")
+    search_text: Mapped[str | None] = mapped_column(Text)  # нормализованные имя/фамилия/username
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     companies = relationship("Company", back_populates="user")
     warehouse_profile = relationship("WarehouseEmployee", back_populates="user", uselist=False)
-    chat_messages = relationship("ChatMessage", back_populates="user")
\ No newline at end of file
+    chat_messages = relationship("ChatMessage", back_populates="user")
+
+
+@event.listens_for(User, "before_insert")
+@event.listens_for(User, "before_update")
+def _user_search_text(mapper, connection, target: User) -> None:
+    """Keep search_text in sync with name fields on every ORM write."""
+    target.search_text = normalize_search_text(target.first_name, target.last_name, target.telegram_username)
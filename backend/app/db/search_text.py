@@ -0,0 +1,10 @@
+"""Normalization of the search_text columns (filled by model events, queried by app.services.search)."""
+import re
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_search_text(*parts: str | None) -> str:
+    """Join non-empty parts and normalize for search: lowercase, ё → е, collapsed whitespace."""
+    text = " ".join(part for part in parts if part)
+    return _WHITESPACE.sub(" ", text.lower().replace("ё", "е")).strip()
@@ -13,6 +13,22 @@ AsyncSessionLocal = sessionmaker(
     class_=AsyncSession,
 )
 
+# Отдельный маленький пул для коротких транзакций счётчика номеров заявок: резерв не берёт
+# второе соединение из основного пула, пока сессия запроса держит своё.
+counter_engine = create_async_engine(
+    settings.POSTGRES_DSN,
+    echo=False,
+    future=True,
+    pool_size=settings.ORDER_COUNTER_POOL_SIZE,
+    max_overflow=0,
+)
+CounterSessionLocal = sessionmaker(
+    bind=counter_engine,
+    autocommit=False,
+    autoflush=False,
+    class_=AsyncSession,
+)
+
 
 async def get_db() -> AsyncSession:
     """Provide a database session."""
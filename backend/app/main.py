@@ -1,5 +1,6 @@
 """FastAPI application entrypoint. See project docs in /docs."""
 import asyncio
+import math
 from contextlib import asynccontextmanager
 
 from fastapi import Depends, FastAPI, HTTPException, Request
@@ -10,12 +11,18 @@ from slowapi.errors import RateLimitExceeded
 from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.api.v1.responses import FastJSONResponse
 from app.api.v1.router import api_router
 from app.core.config import settings
 from app.core.limiter import limiter
 from app.core.logging import configure_logging, logger
 from app.db.models.user import User
 from app.db.session import get_db, AsyncSessionLocal
+from app.services.maintenance import maintenance_runner
+from app.services.marketplace_limiter import MarketplaceBusy
+from app.services.notifications import run_notification_dispatcher
+from app.services.photos import shutdown_image_executor
+from app.services.s3 import shutdown_s3_executor
 from app.services.shipment_scheduler import run_shipment_scheduler
 
 
@@ -45,21 +52,31 @@ async def lifespan(app: FastAPI):
     else:
         await sync_roles_on_startup()
     logger.info("app_initialized")
-    scheduler_task = asyncio.create_task(
-        run_shipment_scheduler(interval_seconds=settings.SHIPMENT_SCHEDULER_INTERVAL_SECONDS)
-    )
+    background_tasks = [
+        asyncio.create_task(
+            run_shipment_scheduler(interval_seconds=settings.SHIPMENT_SCHEDULER_INTERVAL_SECONDS)
+        ),
+        asyncio.create_task(
+            run_notification_dispatcher(interval_seconds=settings.NOTIFICATION_DISPATCH_INTERVAL_SECONDS)
+        ),
+        *maintenance_runner.start(),
+    ]
     yield
-    scheduler_task.cancel()
-    try:
-        await scheduler_task
-    except asyncio.CancelledError:
-        pass
+    for task in background_tasks:
+        task.cancel()
+    for task in background_tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    shutdown_image_executor()
+    shutdown_s3_executor()
 
 
 def create_app() -> FastAPI:
     """Create and configure the FastAPI app."""
     configure_logging()
-    app = FastAPI(title="Birka API", version="0.1.0", lifespan=lifespan)
+    app = FastAPI(title="Birka API", version="0.1.0", lifespan=lifespan, default_response_class=FastJSONResponse)
     app.state.limiter = limiter
     app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
@@ -85,6 +102,16 @@ def create_app() -> FastAPI:
         logger.exception("unhandled_exception", path=request.url.path, error=str(exc))
         return JSONResponse(status_code=500, content={"detail": "Internal server error"})
 
+    @app.exception_handler(MarketplaceBusy)
+    async def marketplace_busy_handler(request: Request, exc: MarketplaceBusy) -> JSONResponse:
+        """Marketplace rate limit would make the request wait too long: ask the client to retry."""
+        logger.warning("marketplace_busy", path=request.url.path, retry_after=exc.retry_after)
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Маркетплейс ограничивает частоту запросов, повторите позже"},
+            headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+        )
+
     @app.exception_handler(HTTPException)
     async def http_exception_handler(request: Request, exc: HTTPException) -> JSONResponse:
         """Log handled HTTP errors."""
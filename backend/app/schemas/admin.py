@@ -40,3 +40,27 @@ class AISettingsUpdate(BaseModel):
     provider: str | None = Field(None, min_length=1, max_length=32)
     model: str | None = Field(None, min_length=1, max_length=128)
     temperature: float | None = None
+
+
+class NotificationQueueStats(BaseModel):
+    """Notification outbox depth."""
+
+    pending: int
+    failed: int
+    oldest_pending_seconds: int
+
+
+class MaintenanceTaskOut(BaseModel):
+    """Periodic maintenance task with metrics (current worker)."""
+
+    name: str
+    interval_seconds: float
+    leader_only: bool
+    runs: int
+    failures: int
+    skipped_not_leader: int
+    last_started_at: datetime | None
+    last_duration_ms: int | None
+    last_result: int | None
+    last_error: str | None
+    total_processed: int
@@ -93,3 +93,18 @@ class CompanyAPIKeysUpdate(BaseModel):
     wb_api_key: str | None = Field(None, max_length=512)
     ozon_client_id: str | None = Field(None, max_length=512)
     ozon_api_key: str | None = Field(None, max_length=512)
+
+
+class CompanyStatsOut(BaseModel):
+    """Company counters for dashboards (materialized aggregates)."""
+
+    company_id: int
+    products_total: int
+    stock_quantity: int
+    defect_quantity: int
+    products_with_defects: int
+    orders_total: int
+    orders_open: int
+    orders_planned_qty: int
+    orders_received_qty: int
+    orders_packed_qty: int
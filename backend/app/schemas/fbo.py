@@ -26,6 +26,7 @@ class FBOSupplyOut(BaseModel):
     status: str
     warehouse_name: str | None
     created_at: datetime
+    synced_at: datetime | None = None
     boxes: list[FBOSupplyBoxOut] = []
 
     class Config:
@@ -59,6 +60,7 @@ class FBOSupplyList(BaseModel):
     total: int
     page: int
     limit: int
+    next_cursor: str | None = None
 
 
 class BoxStickerOut(BaseModel):
@@ -1,8 +1,14 @@
 """Order schemas."""
 from datetime import datetime
+from typing import Literal
 
 from pydantic import BaseModel, Field
 
+from app.schemas.photo import PhotoConfirm
+
+# Типы фото заявки, которые присылает Mini App (заявка, приёмка, брак, упаковка).
+OrderPhotoType = Literal["order", "receiving", "defect", "packing"]
+
 
 class OrderItemCreate(BaseModel):
     """Create order item."""
@@ -28,6 +34,12 @@ class OrderCreate(BaseModel):
     services: list[OrderServiceCreate] | None = None
 
 
+class OrderBatchCreate(BaseModel):
+    """Create several orders at once (each may belong to any of the user's companies)."""
+
+    orders: list[OrderCreate] = Field(..., min_length=1, max_length=100)
+
+
 class OrderStatusUpdate(BaseModel):
     """Update order status."""
 
@@ -51,6 +63,21 @@ class OrderOut(BaseModel):
         from_attributes = True
 
 
+class OrderBatchResultItem(BaseModel):
+    """Result for one order of the batch, in request order: created order or the reason it was skipped."""
+
+    index: int
+    order: OrderOut | None = None
+    error: str | None = None
+
+
+class OrderBatchResult(BaseModel):
+    """Batch order creation result."""
+
+    created: int
+    results: list[OrderBatchResultItem]
+
+
 class OrderList(BaseModel):
     """Paginated order list."""
 
@@ -58,6 +85,7 @@ class OrderList(BaseModel):
     total: int
     page: int
     limit: int
+    next_cursor: str | None = None
 
 
 class OrderItemOut(BaseModel):
@@ -91,4 +119,13 @@ class OrderPhotoOut(BaseModel):
     url: str
     photo_type: str | None
     product_id: int | None
-    created_at: datetime
\ No newline at end of file
+    created_at: datetime
+    thumb_url: str | None = None
+    medium_url: str | None = None
+
+
+class OrderPhotoConfirm(PhotoConfirm):
+    """Register an order photo uploaded via presigned POST."""
+
+    photo_type: OrderPhotoType | None = None
+    product_id: int | None = None
@@ -0,0 +1,14 @@
+"""Cursor-mode list page schema."""
+from typing import Generic, TypeVar
+
+from pydantic import BaseModel
+
+ItemT = TypeVar("ItemT")
+
+
+class CursorPage(BaseModel, Generic[ItemT]):
+    """List page in cursor mode: no total and no page number (see *List schemas for page mode)."""
+
+    items: list[ItemT]
+    limit: int
+    next_cursor: str | None = None
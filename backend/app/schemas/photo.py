@@ -0,0 +1,24 @@
+"""Direct photo upload schemas."""
+from pydantic import BaseModel
+
+
+class PhotoUploadRequest(BaseModel):
+    """Request a presigned upload for one photo."""
+
+    content_type: str
+
+
+class PhotoUploadTicket(BaseModel):
+    """Presigned POST: the client sends multipart form (fields + file) to url."""
+
+    key: str
+    url: str
+    fields: dict[str, str]
+    expires_in: int
+    max_size: int
+
+
+class PhotoConfirm(BaseModel):
+    """Register a photo uploaded via presigned POST."""
+
+    key: str
@@ -59,6 +59,7 @@ class ProductList(BaseModel):
     total: int
     page: int
     limit: int
+    next_cursor: str | None = None
 
 
 class ImportSkipped(BaseModel):
@@ -50,3 +50,4 @@ class ShipmentRequestList(BaseModel):
     total: int
     page: int
     limit: int
+    next_cursor: str | None = None
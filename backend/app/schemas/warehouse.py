@@ -38,6 +38,28 @@ class PackingRecordCreate(BaseModel):
     time_spent_minutes: int | None = None
 
 
+class PackingRecordBatchCreate(BaseModel):
+    """Create several packing records at once (one transaction)."""
+
+    records: list[PackingRecordCreate] = Field(..., min_length=1, max_length=200)
+
+
+class PackedOrderOut(BaseModel):
+    """Order counters after packing."""
+
+    order_id: int
+    packed_qty: int
+    status: str
+
+
+class PackingBatchResult(BaseModel):
+    """Batch packing result."""
+
+    status: str = "ok"
+    created: int
+    orders: list[PackedOrderOut]
+
+
 class PackingRecordOut(BaseModel):
     """Packing record for client (order detail)."""
 
@@ -122,3 +144,39 @@ class BarcodeValidateInOrderResponse(BaseModel):
     order_item: BarcodeValidateInOrderOrderItem | None = None
     remaining_to_receive: int = 0
     remaining_to_pack: int = 0
+
+
+class BarcodeScan(BaseModel):
+    """Single buffered scan: barcode and how many times it was scanned."""
+
+    barcode: str = Field(..., max_length=128)
+    count: int = Field(1, ge=1, le=100000)
+
+
+class BarcodeBatchScanRequest(BaseModel):
+    """Batch of buffered scans for one order (offline scanner session flush)."""
+
+    order_id: int
+    scans: list[BarcodeScan] = Field(..., min_length=1, max_length=500)
+
+
+class BarcodeBatchScanItem(BaseModel):
+    """Batch scan result for one barcode: remainders before the scans, excess = scans beyond them."""
+
+    barcode: str
+    count: int
+    found: bool
+    message: str
+    order_item: BarcodeValidateInOrderOrderItem | None = None
+    remaining_to_receive: int = 0
+    remaining_to_pack: int = 0
+    excess_to_receive: int = 0
+    excess_to_pack: int = 0
+
+
+class BarcodeBatchScanResponse(BaseModel):
+    """Batch scan response: per-barcode results in request order (duplicates merged)."""
+
+    order_found: bool
+    message: str
+    items: list[BarcodeBatchScanItem] = []
@@ -0,0 +1,257 @@
+"""Materialized aggregates: per-company counters (company_stats) and per-order totals.
+
+Счётчики обновляются инкрементами в той же транзакции, что и исходные строки (приёмка, упаковка,
+создание заявки/товара, смена статуса). Чтение — одна строка по первичному ключу.
+Сверка (reconcile_aggregates) пересчитывает агрегаты по исходным строкам и исправляет расхождения.
+"""
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logging import logger
+from app.db.models.company import Company
+from app.db.models.company_stats import CompanyStats
+from app.db.models.order import Order, OrderItem
+from app.db.models.product import Product
+
+ORDER_CLOSED_STATUS = "Завершено"
+
+
+@dataclass(frozen=True)
+class CompanyCounters:
+    """Company counters snapshot."""
+
+    products_total: int = 0
+    stock_quantity: int = 0
+    defect_quantity: int = 0
+    products_with_defects: int = 0
+    orders_total: int = 0
+    orders_open: int = 0
+    orders_planned_qty: int = 0
+    orders_received_qty: int = 0
+    orders_packed_qty: int = 0
+
+
+COUNTER_FIELDS = tuple(CompanyCounters.__dataclass_fields__)
+
+
+def open_orders_delta(old_status: str | None, new_status: str) -> int:
+    """Change of orders_open when order status moves from old_status to new_status."""
+    was_open = old_status != ORDER_CLOSED_STATUS
+    is_open = new_status != ORDER_CLOSED_STATUS
+    return int(is_open) - int(was_open)
+
+
+def _counters_from_row(row: CompanyStats) -> CompanyCounters:
+    return CompanyCounters(**{field: getattr(row, field) for field in COUNTER_FIELDS})
+
+
+async def compute_company_counters(db: AsyncSession, company_id: int) -> CompanyCounters:
+    """Recompute counters for one company from products and orders."""
+    products_row = (
+        await db.execute(
+            select(
+                func.count(Product.id),
+                func.coalesce(func.sum(Product.stock_quantity), 0),
+                func.coalesce(func.sum(Product.defect_quantity), 0),
+                func.coalesce(func.sum(case((Product.defect_quantity > 0, 1), else_=0)), 0),
+            ).where(Product.company_id == company_id)
+        )
+    ).one()
+    orders_row = (
+        await db.execute(
+            select(
+                func.count(Order.id),
+                func.coalesce(func.sum(case((Order.status != ORDER_CLOSED_STATUS, 1), else_=0)), 0),
+                func.coalesce(func.sum(Order.planned_qty), 0),
+                func.coalesce(func.sum(Order.received_qty), 0),
+                func.coalesce(func.sum(Order.packed_qty), 0),
+            ).where(Order.company_id == company_id)
+        )
+    ).one()
+    return CompanyCounters(*(int(value) for value in (*products_row, *orders_row)))
+
+
+def _insert(db: AsyncSession):
+    return postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+
+
+async def _write_counters(db: AsyncSession, company_id: int, counters: CompanyCounters) -> None:
+    """Insert or overwrite company_stats row (reconciliation: the recomputed values win)."""
+    values = {**asdict(counters), "updated_at": datetime.utcnow()}
+    stmt = _insert(db)(CompanyStats).values(company_id=company_id, **values)
+    await db.execute(stmt.on_conflict_do_update(index_elements=[CompanyStats.company_id], set_=values))
+
+
+async def bump_company_stats(db: AsyncSession, company_id: int, **deltas: int) -> None:
+    """Apply counter increments (e.g. stock_quantity=-3) in the caller's transaction.
+
+    Вызывать после изменения исходных строк: если строки company_stats ещё нет, она
+    создаётся пересчётом, который уже учитывает текущие изменения. Если строку в это время
+    вставила параллельная транзакция (её пересчёт не видел наших незакоммиченных строк),
+    ON CONFLICT прибавляет к ней наши приращения, а не перезаписывает.
+    """
+    unknown = set(deltas) - set(COUNTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown company counters: {sorted(unknown)}")
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+    result = await db.execute(
+        update(CompanyStats)
+        .where(CompanyStats.company_id == company_id)
+        .values(
+            updated_at=datetime.utcnow(),
+            **{field: getattr(CompanyStats, field) + value for field, value in deltas.items()},
+        )
+        .returning(CompanyStats.company_id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.first() is None:
+        await db.flush()
+        now = datetime.utcnow()
+        counters = await compute_company_counters(db, company_id)
+        stmt = _insert(db)(CompanyStats).values(company_id=company_id, updated_at=now, **asdict(counters))
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[CompanyStats.company_id],
+                set_={"updated_at": now, **{field: getattr(CompanyStats, field) + value for field, value in deltas.items()}},
+            )
+        )
+
+
+async def get_company_counters(db: AsyncSession, company_id: int) -> CompanyCounters:
+    """Read counters by primary key; falls back to live computation if the row is not created yet."""
+    row = await db.get(CompanyStats, company_id, populate_existing=True)
+    if row is not None:
+        return _counters_from_row(row)
+    return await compute_company_counters(db, company_id)
+
+
+async def _reconcile_orders(db: AsyncSession) -> int:
+    """Fix orders whose planned/received/packed/defect totals differ from the sum of their items (caller commits)."""
+    sums = (
+        select(
+            OrderItem.order_id.label("order_id"),
+            func.sum(OrderItem.planned_qty).label("planned"),
+            func.sum(OrderItem.received_qty).label("received"),
+            func.sum(OrderItem.packed_qty).label("packed"),
+            func.sum(OrderItem.defect_qty).label("defect"),
+        )
+        .group_by(OrderItem.order_id)
+        .subquery()
+    )
+    result = await db.execute(
+        select(Order.id)
+        .join(sums, sums.c.order_id == Order.id)
+        .where(
+            (Order.planned_qty != sums.c.planned)
+            | (Order.received_qty != sums.c.received)
+            | (Order.packed_qty != sums.c.packed)
+            | (Order.defect_qty != sums.c.defect)
+        )
+    )
+    drifted = [row[0] for row in result.all()]
+    for order_id in drifted:
+        # Блокировка заявки, затем пересчёт: параллельная упаковка дождётся и применит свой инкремент сверху.
+        await db.execute(select(Order.id).where(Order.id == order_id).with_for_update())
+        totals = (
+            await db.execute(
+                select(
+                    func.coalesce(func.sum(OrderItem.planned_qty), 0),
+                    func.coalesce(func.sum(OrderItem.received_qty), 0),
+                    func.coalesce(func.sum(OrderItem.packed_qty), 0),
+                    func.coalesce(func.sum(OrderItem.defect_qty), 0),
+                ).where(OrderItem.order_id == order_id)
+            )
+        ).one()
+        await db.execute(
+            update(Order)
+            .where(Order.id == order_id)
+            .values(planned_qty=totals[0], received_qty=totals[1], packed_qty=totals[2], defect_qty=totals[3])
+            .execution_options(synchronize_session=False)
+        )
+        logger.warning("order_aggregates_drift", order_id=order_id)
+    return len(drifted)
+
+
+async def _reconcile_company(db: AsyncSession, company_id: int) -> bool:
+    """Recompute one company under row lock (concurrent increments wait). True if the row was fixed."""
+    locked = await db.execute(
+        select(CompanyStats)
+        .where(CompanyStats.company_id == company_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    row = locked.scalar_one_or_none()
+    actual = await compute_company_counters(db, company_id)
+    stored = _counters_from_row(row) if row is not None else None
+    if stored == actual:
+        return False
+    if stored is not None:
+        fields = [field for field in COUNTER_FIELDS if getattr(stored, field) != getattr(actual, field)]
+        logger.warning("company_stats_drift", company_id=company_id, fields=fields)
+    await _write_counters(db, company_id, actual)
+    return True
+
+
+async def reconcile_aggregates(db: AsyncSession) -> dict[str, int]:
+    """Verify order totals and company_stats against source rows, fix drift. Commits."""
+    orders_fixed = await _reconcile_orders(db)
+    await db.commit()
+
+    # Кандидаты — одним набором запросов; каждая расходящаяся компания перепроверяется под блокировкой.
+    stored = {
+        row.company_id: _counters_from_row(row)
+        for row in (
+            await db.execute(select(CompanyStats).execution_options(populate_existing=True))
+        ).scalars().all()
+    }
+    products = {
+        row[0]: row[1:]
+        for row in (
+            await db.execute(
+                select(
+                    Product.company_id,
+                    func.count(Product.id),
+                    func.coalesce(func.sum(Product.stock_quantity), 0),
+                    func.coalesce(func.sum(Product.defect_quantity), 0),
+                    func.coalesce(func.sum(case((Product.defect_quantity > 0, 1), else_=0)), 0),
+                ).group_by(Product.company_id)
+            )
+        ).all()
+    }
+    orders = {
+        row[0]: row[1:]
+        for row in (
+            await db.execute(
+                select(
+                    Order.company_id,
+                    func.count(Order.id),
+                    func.coalesce(func.sum(case((Order.status != ORDER_CLOSED_STATUS, 1), else_=0)), 0),
+                    func.coalesce(func.sum(Order.planned_qty), 0),
+                    func.coalesce(func.sum(Order.received_qty), 0),
+                    func.coalesce(func.sum(Order.packed_qty), 0),
+                ).group_by(Order.company_id)
+            )
+        ).all()
+    }
+    company_ids = (await db.execute(select(Company.id))).scalars().all()
+    candidates = []
+    for company_id in company_ids:
+        values = (*products.get(company_id, (0, 0, 0, 0)), *orders.get(company_id, (0, 0, 0, 0, 0)))
+        actual = CompanyCounters(*(int(value) for value in values))
+        if stored.get(company_id) != actual:
+            candidates.append(company_id)
+    await db.rollback()
+
+    companies_fixed = 0
+    for company_id in candidates:
+        if await _reconcile_company(db, company_id):
+            companies_fixed += 1
+        await db.commit()
+    return {"orders_fixed": orders_fixed, "companies_fixed": companies_fixed}
+
@@ -13,6 +13,8 @@ from app.db.models.product import Product
 from app.db.models.service import Service
 from app.db.models.shipment_request import ShipmentRequest
 from app.db.models.user import User
+from app.services.aggregates import get_company_counters
+from app.services.search import build_search
 
 # Limits for tool responses to avoid token overflow and slow replies
 MAX_ORDERS = 50
@@ -107,7 +109,8 @@ TOOLS = [
             "description": (
                 "Общая сводка по остаткам на складе, браку и заявкам. Возвращает: total_stock_quantity (остаток на складе), "
                 "total_defect_quantity (брак), total_products, total_defect_items, products_with_defects; "
-                "orders_total_planned, orders_total_received, orders_total_packed (по заявкам: плановое, принято, упаковано). "
+                "orders_total_planned, orders_total_received, orders_total_packed (по заявкам: плановое, принято, упаковано), "
+                "orders_open (незавершённые заявки). "
                 "Всегда вызывай при вопросах «сколько у меня», «мой остаток», «что на складе», «остатки»."
             ),
             "parameters": {"type": "object", "properties": {}},
@@ -360,9 +363,11 @@ async def _execute_tool_impl(
                 select(Product).where(Product.company_id == company.id, Product.barcode == barcode)
             )
         elif name_part:
+            clause = build_search(Product.search_text, name_part, db.get_bind().dialect.name)
             result = await db.execute(
                 select(Product)
-                .where(Product.company_id == company.id, Product.name.ilike(f"%{name_part}%"))
+                .where(Product.company_id == company.id, clause.condition)
+                .order_by(*clause.order_by, Product.id.desc())
                 .limit(10)
             )
         else:
@@ -387,46 +392,25 @@ async def _execute_tool_impl(
     if name == "get_stock_summary":
         if not company:
             return json.dumps({"error": "Не указана компания. Выберите компанию в приложении."})
-        result = await db.execute(
-            select(
-                func.coalesce(func.sum(Product.stock_quantity), 0),
-                func.coalesce(func.sum(Product.defect_quantity), 0),
-                func.count(Product.id),
-            ).where(Product.company_id == company.id)
-        )
-        row = result.one()
-        total_stock = int(row[0])
-        total_defect = int(row[1])
-        count = int(row[2])
-        orders_result = await db.execute(
-            select(
-                func.coalesce(func.sum(Order.planned_qty), 0),
-                func.coalesce(func.sum(Order.received_qty), 0),
-                func.coalesce(func.sum(Order.packed_qty), 0),
-            ).where(Order.company_id == company.id)
-        )
-        orders_row = orders_result.one()
-        defect_count_result = await db.execute(
-            select(func.count()).select_from(Product).where(
-                Product.company_id == company.id, Product.defect_quantity > 0
+        counters = await get_company_counters(db, company.id)
+        defect_list = []
+        if counters.products_with_defects:
+            defect_result = await db.execute(
+                select(Product.name, Product.defect_quantity)
+                .where(Product.company_id == company.id, Product.defect_quantity > 0)
+                .order_by(Product.defect_quantity.desc())
+                .limit(MAX_DEFECT_ITEMS)
             )
-        )
-        total_defect_items = int(defect_count_result.scalar_one())
-        defect_result = await db.execute(
-            select(Product.name, Product.defect_quantity)
-            .where(Product.company_id == company.id, Product.defect_quantity > 0)
-            .order_by(Product.defect_quantity.desc())
-            .limit(MAX_DEFECT_ITEMS)
-        )
-        defect_list = [{"name": n, "defect_quantity": q} for n, q in defect_result.all()]
+            defect_list = [{"name": n, "defect_quantity": q} for n, q in defect_result.all()]
         out = {
-            "total_products": count,
-            "total_stock_quantity": total_stock,
-            "total_defect_quantity": total_defect,
-            "total_defect_items": total_defect_items,
-            "orders_total_planned": int(orders_row[0]),
-            "orders_total_received": int(orders_row[1]),
-            "orders_total_packed": int(orders_row[2]),
+            "total_products": counters.products_total,
+            "total_stock_quantity": counters.stock_quantity,
+            "total_defect_quantity": counters.defect_quantity,
+            "total_defect_items": counters.products_with_defects,
+            "orders_total_planned": counters.orders_planned_qty,
+            "orders_total_received": counters.orders_received_qty,
+            "orders_total_packed": counters.orders_packed_qty,
+            "orders_open": counters.orders_open,
             "products_with_defects": defect_list,
         }
         return json.dumps(out, ensure_ascii=False)
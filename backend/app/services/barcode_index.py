@@ -0,0 +1,141 @@
+"""In-memory barcode index for scanner validation (products and FBO boxes).
+
+Один процесс — один индекс: ШК → (тип, краткие данные сущности). Заполняется найденными при
+сканировании ШК и обновляется при создании/изменении/импорте товаров и синхронизации/импорте коробов FBO.
+Попадание, прочитанное из БД не раньше BARCODE_INDEX_TTL_SECONDS назад, отдаётся без запроса к БД —
+повторные сканы одного товара бесплатны. Более старое попадание перепроверяется по первичному ключу
+(refresh_entry, товар — вместе с компанией), поэтому ШК, сменённый или удалённый в другом воркере,
+находится не дольше TTL. Промах идёт в БД (индексированные запросы) и дозаполняет индекс.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models.company import Company
+from app.db.models.fbo_supply import FBOSupplyBox
+from app.db.models.product import Product
+
+KIND_PRODUCT = "product"
+KIND_BOX = "box"
+
+
+@dataclass(frozen=True)
+class BarcodeEntry:
+    """Resolved barcode: kind (product | box), entity id and response summary."""
+
+    barcode: str
+    kind: str
+    entity_id: int
+    summary: dict
+
+
+def product_entry(product: Product) -> BarcodeEntry | None:
+    """Build index entry from Product ORM object. None if product has no barcode."""
+    barcode = (product.barcode or "").strip()
+    if not barcode:
+        return None
+    return BarcodeEntry(
+        barcode=barcode,
+        kind=KIND_PRODUCT,
+        entity_id=product.id,
+        summary={
+            "id": product.id,
+            "name": product.name,
+            "brand": product.brand,
+            "size": product.size,
+            "color": product.color,
+            "wb_article": product.wb_article,
+            "barcode": product.barcode,
+        },
+    )
+
+
+def box_entry(box: FBOSupplyBox) -> BarcodeEntry | None:
+    """Build index entry from FBOSupplyBox ORM object. None if box has no external barcode."""
+    barcode = (box.external_barcode or "").strip()
+    if not barcode:
+        return None
+    return BarcodeEntry(
+        barcode=barcode,
+        kind=KIND_BOX,
+        entity_id=box.id,
+        summary={
+            "id": box.id,
+            "box_number": box.box_number,
+            "supply_id": box.supply_id,
+            "external_box_id": box.external_box_id,
+            "external_barcode": box.external_barcode,
+        },
+    )
+
+
+class BarcodeIndex:
+    """Unified barcode → BarcodeEntry map. Product barcodes take priority over box barcodes.
+
+    Каждая запись помнит, когда была прочитана из БД; LRU-ограничение по числу записей.
+    """
+
+    def __init__(self, max_size: int | None = None) -> None:
+        self._entries: OrderedDict[str, tuple[float, BarcodeEntry]] = OrderedDict()
+        self._max_size = max_size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def resolve(self, barcode: str) -> BarcodeEntry | None:
+        """Return entry for barcode or None (miss — caller should check DB)."""
+        item = self._entries.get((barcode or "").strip())
+        return item[1] if item is not None else None
+
+    def is_fresh(self, barcode: str) -> bool:
+        """True if the entry was read from DB less than BARCODE_INDEX_TTL_SECONDS ago (hit is trusted)."""
+        item = self._entries.get((barcode or "").strip())
+        return item is not None and time.monotonic() - item[0] < settings.BARCODE_INDEX_TTL_SECONDS
+
+    def put(self, entry: BarcodeEntry | None) -> None:
+        """Add or replace entry read from DB just now. A box never displaces a product with the same barcode."""
+        if entry is None:
+            return
+        current = self._entries.get(entry.barcode)
+        if entry.kind == KIND_BOX and current is not None and current[1].kind == KIND_PRODUCT:
+            return
+        self._entries[entry.barcode] = (time.monotonic(), entry)
+        self._entries.move_to_end(entry.barcode)
+        max_size = self._max_size or settings.BARCODE_INDEX_MAX_ENTRIES
+        while len(self._entries) > max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, barcode: str | None, kind: str, entity_id: int) -> None:
+        """Remove barcode only if it still points to the given entity."""
+        key = (barcode or "").strip()
+        current = self._entries.get(key)
+        if current is not None and current[1].kind == kind and current[1].entity_id == entity_id:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        self._entries.clear()
+
+
+barcode_index = BarcodeIndex()
+
+
+async def refresh_entry(db: AsyncSession, entry: BarcodeEntry) -> BarcodeEntry | None:
+    """Re-read an index hit by primary key; None if the barcode no longer points to it (or company is gone)."""
+    if entry.kind == KIND_PRODUCT:
+        result = await db.execute(
+            select(Product)
+            .join(Company, Company.id == Product.company_id)
+            .where(Product.id == entry.entity_id, Product.barcode == entry.barcode)
+        )
+        product = result.scalar_one_or_none()
+        return product_entry(product) if product else None
+    result = await db.execute(
+        select(FBOSupplyBox).where(FBOSupplyBox.id == entry.entity_id, FBOSupplyBox.external_barcode == entry.barcode)
+    )
+    box = result.scalar_one_or_none()
+    return box_entry(box) if box else None
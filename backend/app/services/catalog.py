@@ -0,0 +1,126 @@
+"""In-process cache of the service catalog (prices) and destinations.
+
+Справочники меняются редко (только админом), а читаются при каждом открытии Mini App.
+Снимок услуг и адресов загружается одним запросом на таблицу и живёт CATALOG_CACHE_TTL_SECONDS;
+записи админа (создание/изменение/сортировка/импорт/удаление) сбрасывают его сразу, в других
+воркерах изменения видны не позже TTL. Готовые JSON-ответы кешируются в снимке, ETag — хеш тела.
+"""
+import asyncio
+import hashlib
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from functools import cached_property
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models.destination import Destination
+from app.db.models.service import Service
+from app.schemas.destination import DestinationOut
+from app.schemas.service import ServiceOut
+
+MAX_RENDERED_BODIES = 256
+
+
+@dataclass
+class CatalogSnapshot:
+    """Services (category, sort_order, name order) and destinations (name order), all incl. inactive."""
+
+    services: list[ServiceOut]
+    destinations: list[DestinationOut]
+    expires_at: float
+    _bodies: dict[tuple, bytes] = field(default_factory=dict)
+
+    @cached_property
+    def services_version(self) -> str:
+        """Hash of all services: changes with any price list edit (versions built artifacts)."""
+        payload = orjson.dumps([s.model_dump(mode="json") for s in self.services])
+        return hashlib.blake2b(payload, digest_size=8).hexdigest()
+
+    @cached_property
+    def active_services_by_id(self) -> dict[int, ServiceOut]:
+        return {s.id: s for s in self.services if s.is_active}
+
+    def _render(self, key: tuple, build: Callable[[], list]) -> bytes:
+        """JSON body for key (endpoint and filters), rendered once per snapshot."""
+        body = self._bodies.get(key)
+        if body is None:
+            body = orjson.dumps(build())
+            if len(self._bodies) < MAX_RENDERED_BODIES:
+                self._bodies[key] = body
+        return body
+
+    def services_body(self, category: str | None, include_inactive: bool, term: str) -> bytes:
+        """GET /services: filter by activity, category and search term (name, category, comment)."""
+
+        def build() -> list:
+            needle = term.casefold()
+            return [
+                s.model_dump(mode="json")
+                for s in self.services
+                if (include_inactive or s.is_active)
+                and (not category or s.category == category)
+                and (not needle or any(needle in (v or "").casefold() for v in (s.name, s.category, s.comment)))
+            ]
+
+        return self._render(("services", category, include_inactive, term), build)
+
+    def categories_body(self) -> bytes:
+        """GET /services/categories: distinct categories of active services (snapshot is sorted by category)."""
+        return self._render(
+            ("categories",),
+            lambda: list(dict.fromkeys(s.category for s in self.services if s.is_active)),
+        )
+
+    def destinations_body(self, active_only: bool) -> bytes:
+        """GET /destinations."""
+        return self._render(
+            ("destinations", active_only),
+            lambda: [d.model_dump(mode="json") for d in self.destinations if d.is_active or not active_only],
+        )
+
+
+class CatalogCache:
+    """Process-wide snapshot with single-flight reload.
+
+    _generation растёт при каждом invalidate(): снимок, загрузка которого началась до сброса,
+    не сохраняется — иначе он вернул бы в кеш данные до изменения на весь TTL.
+    """
+
+    def __init__(self) -> None:
+        self._snapshot: CatalogSnapshot | None = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    async def get(self, db: AsyncSession) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.expires_at > time.monotonic():
+            return snapshot
+        async with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.expires_at > time.monotonic():
+                return snapshot
+            generation = self._generation
+            services = await db.execute(
+                select(Service).order_by(Service.category.asc(), Service.sort_order.asc(), Service.name.asc())
+            )
+            destinations = await db.execute(select(Destination).order_by(Destination.name.asc()))
+            snapshot = CatalogSnapshot(
+                services=[ServiceOut.model_validate(s) for s in services.scalars().all()],
+                destinations=[DestinationOut.model_validate(d) for d in destinations.scalars().all()],
+                expires_at=time.monotonic() + settings.CATALOG_CACHE_TTL_SECONDS,
+            )
+            if generation == self._generation:
+                self._snapshot = snapshot
+            return snapshot
+
+    def invalidate(self) -> None:
+        """Drop the snapshot (catalog changed); the next read reloads it."""
+        self._generation += 1
+        self._snapshot = None
+
+
+catalog_cache = CatalogCache()
@@ -299,18 +299,11 @@ def contract_data_to_context(contract: ContractData) -> dict[str, str]:
     }
 
 
-def render_contract_pdf_from_docx_template(
-    s3: S3Service,
-    file_key: str,
-    file_type: str,
-    docx_key: str | None,
-    contract: ContractData,
-) -> bytes:
+def render_contract_pdf_from_docx_template(docx_bytes: bytes, contract: ContractData) -> bytes:
     """
-    Load DOCX template from S3, apply contract context, convert to PDF.
+    Apply contract context to DOCX template bytes (see get_docx_bytes_for_template), convert to PDF.
     Returns PDF bytes.
     """
-    docx_bytes = get_docx_bytes_for_template(s3, file_key, file_type or "", docx_key)
     context = contract_data_to_context(contract)
     rendered_docx = render_docx_with_context(docx_bytes, context)
     return docx_to_pdf_bytes(rendered_docx)
@@ -0,0 +1,178 @@
+"""Cached validation of company WB/Ozon credentials.
+
+Результат последней проверки ключей хранится в marketplace_credential_health (общий для воркеров).
+Создание отгрузки не ходит в API маркетплейса, если успешная проверка свежее
+CREDENTIAL_HEALTH_TTL_SECONDS (неуспешная — CREDENTIAL_HEALTH_FAILURE_TTL_SECONDS) и сделана для
+текущих ключей (keys_updated_at = company_api_keys.updated_at): поздний результат проверки старых
+ключей не выдаётся за проверку новых. Фоновая задача перепроверяет ключи до истечения срока,
+смена ключей сбрасывает кеш.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.db.models.company_api_keys import CompanyAPIKeys, MarketplaceCredentialHealth
+from app.services.marketplace_credentials import marketplace_client_cache, marketplace_clients
+from app.services.marketplace_limiter import MarketplaceBusy
+from app.services.ozon_api import OzonAPI
+from app.services.wb_api import WildberriesAPI
+
+PROBE_FAILED = "Нет доступа к API маркетплейса"
+
+
+async def probe_credentials(api: WildberriesAPI | OzonAPI) -> str | None:
+    """Live check with the cheapest list call. None if the credentials work, else the error."""
+    if isinstance(api, WildberriesAPI):
+        ok = await api.get_supplies(limit=1) is not None
+    else:
+        ok = await api.list_supply_order_ids(limit=1) is not None
+    return None if ok else PROBE_FAILED
+
+
+async def record_health(
+    db: AsyncSession,
+    company_id: int,
+    marketplace: str,
+    keys_updated_at: datetime | None,
+    error: str | None,
+) -> None:
+    """Upsert the check result of keys version keys_updated_at in the caller's transaction.
+
+    Результат проверки более старых ключей не затирает результат по более новым.
+    """
+    now = datetime.utcnow()
+    values = {"checked_at": now, "last_error": error, "keys_updated_at": keys_updated_at}
+    values["last_failed_at" if error else "last_ok_at"] = now
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(MarketplaceCredentialHealth).values(company_id=company_id, marketplace=marketplace, **values)
+    current = MarketplaceCredentialHealth.keys_updated_at
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[MarketplaceCredentialHealth.company_id, MarketplaceCredentialHealth.marketplace],
+            set_=values,
+            where=or_(current.is_(None), current <= stmt.excluded.keys_updated_at),
+        )
+    )
+
+
+def _is_fresh(health: MarketplaceCredentialHealth, keys_updated_at: datetime | None, now: datetime) -> bool:
+    """Result is for the current keys and within its TTL."""
+    if health.keys_updated_at != keys_updated_at:
+        return False
+    ttl = settings.CREDENTIAL_HEALTH_FAILURE_TTL_SECONDS if health.last_error else settings.CREDENTIAL_HEALTH_TTL_SECONDS
+    return now - health.checked_at < timedelta(seconds=ttl)
+
+
+def _same_credentials(a: WildberriesAPI | OzonAPI, b: WildberriesAPI | OzonAPI) -> bool:
+    return a.api_key == b.api_key and getattr(a, "client_id", None) == getattr(b, "client_id", None)
+
+
+async def check_credentials(
+    db: AsyncSession,
+    company_id: int,
+    marketplace: str,
+    api: WildberriesAPI | OzonAPI,
+) -> bool:
+    """True if credentials work: fresh cached result, otherwise a live probe (recorded, caller commits)."""
+    keys_version = select(CompanyAPIKeys.updated_at).where(CompanyAPIKeys.company_id == company_id)
+    row = (
+        await db.execute(
+            select(MarketplaceCredentialHealth, keys_version.scalar_subquery())
+            .where(
+                MarketplaceCredentialHealth.company_id == company_id,
+                MarketplaceCredentialHealth.marketplace == marketplace,
+            )
+            .execution_options(populate_existing=True)
+        )
+    ).first()
+    if row is not None:
+        health, keys_updated_at = row
+        if _is_fresh(health, keys_updated_at, datetime.utcnow()):
+            return health.last_error is None
+    else:
+        keys_updated_at = await db.scalar(keys_version)
+    error = await probe_credentials(api)
+    if error:
+        # Клиент из кеша мог быть собран до смены ключей в другом воркере: перечитываем ключи
+        # и, если они другие, проверяем ещё раз.
+        marketplace_client_cache.invalidate(company_id)
+        fresh = (await marketplace_client_cache.get(db, company_id)).get(marketplace)
+        if fresh is not None and not _same_credentials(fresh, api):
+            error = await probe_credentials(fresh if api.budget is None else fresh.interactive())
+    await record_health(db, company_id, marketplace, keys_updated_at, error)
+    return error is None
+
+
+async def invalidate_credential_health(db: AsyncSession, company_id: int) -> None:
+    """Forget cached results (keys changed). Caller commits."""
+    await db.execute(delete(MarketplaceCredentialHealth).where(MarketplaceCredentialHealth.company_id == company_id))
+
+
+def _needs_check(health, has_keys, stale_before: datetime):
+    """SQL condition: credentials are set and their result is missing, stale or for other keys."""
+    return and_(
+        has_keys,
+        or_(
+            health.id.is_(None),
+            health.checked_at < stale_before,
+            health.keys_updated_at.is_distinct_from(CompanyAPIKeys.updated_at),
+        ),
+    )
+
+
+async def refresh_credential_health(db: AsyncSession) -> int:
+    """Re-check credentials whose result is missing, past half of its TTL or for older keys (bounded batch).
+
+    Выбираются и расшифровываются только строки, которым нужна проверка, а не вся таблица ключей.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.CREDENTIAL_HEALTH_TTL_SECONDS / 2)
+    wb_health = aliased(MarketplaceCredentialHealth)
+    ozon_health = aliased(MarketplaceCredentialHealth)
+    has_wb = CompanyAPIKeys.wb_api_key.is_not(None)
+    has_ozon = and_(CompanyAPIKeys.ozon_client_id.is_not(None), CompanyAPIKeys.ozon_api_key.is_not(None))
+    rows = (
+        await db.execute(
+            select(CompanyAPIKeys, wb_health, ozon_health)
+            .outerjoin(
+                wb_health, and_(wb_health.company_id == CompanyAPIKeys.company_id, wb_health.marketplace == "wb")
+            )
+            .outerjoin(
+                ozon_health,
+                and_(ozon_health.company_id == CompanyAPIKeys.company_id, ozon_health.marketplace == "ozon"),
+            )
+            .where(
+                or_(
+                    _needs_check(wb_health, has_wb, stale_before),
+                    _needs_check(ozon_health, has_ozon, stale_before),
+                )
+            )
+            .order_by(wb_health.checked_at.asc().nulls_first(), ozon_health.checked_at.asc().nulls_first())
+            .limit(settings.CREDENTIAL_HEALTH_REFRESH_BATCH)
+        )
+    ).all()
+    due = []
+    for keys, *healths in rows:
+        health_by_marketplace = {"wb": healths[0], "ozon": healths[1]}
+        for marketplace, api in marketplace_clients(keys).items():
+            health = health_by_marketplace[marketplace]
+            if health is None or health.checked_at < stale_before or health.keys_updated_at != keys.updated_at:
+                due.append((keys.company_id, marketplace, keys.updated_at, api))
+    refreshed = 0
+    for company_id, marketplace, keys_updated_at, api in due[: settings.CREDENTIAL_HEALTH_REFRESH_BATCH]:
+        try:
+            error = await probe_credentials(api)
+        except MarketplaceBusy:
+            logger.info("marketplace_credentials_check_deferred", company_id=company_id, marketplace=marketplace)
+            continue
+        await record_health(db, company_id, marketplace, keys_updated_at, error)
+        await db.commit()
+        if error:
+            logger.warning("marketplace_credentials_invalid", company_id=company_id, marketplace=marketplace)
+        refreshed += 1
+    return refreshed
@@ -1,7 +1,9 @@
-"""Excel import/export helpers."""
-from io import BytesIO
+"""Excel import/export helpers.
 
-import pandas as pd
+pandas импортируется при первом вызове, а не при загрузке модуля: быстрый старт воркера.
+"""
+from functools import lru_cache
+from io import BytesIO
 
 from app.core.logging import logger
 from app.db.models.order import OrderItem
@@ -48,17 +50,26 @@ FBO_COLUMNS = [
 ]
 
 
-def export_products_template() -> BytesIO:
-    """Export empty Excel template with required columns."""
+@lru_cache(maxsize=1)
+def products_template_bytes() -> bytes:
+    """Empty import template, built once: identical bytes let Telegram reuse the uploaded file_id."""
+    import pandas as pd
+
     buffer = BytesIO()
     pd.DataFrame(columns=EXPORT_COLUMNS).to_excel(buffer, index=False)
-    buffer.seek(0)
-    return buffer
+    return buffer.getvalue()
+
+
+def export_products_template() -> BytesIO:
+    """Export empty Excel template with required columns."""
+    return BytesIO(products_template_bytes())
 
 
 def export_products(products: list[Product]) -> BytesIO:
     """Export products to Excel in-memory file."""
     try:
+        import pandas as pd
+
         rows = []
         for product in products:
             company_name = ""
@@ -91,6 +102,8 @@ def export_products(products: list[Product]) -> BytesIO:
 def export_receiving(order_items: list[OrderItem]) -> BytesIO:
     """Export receiving data (order items) to Excel."""
     try:
+        import pandas as pd
+
         rows = []
         for item in order_items:
             product = item.product
@@ -120,6 +133,8 @@ def export_receiving(order_items: list[OrderItem]) -> BytesIO:
 def export_fbo_shipping(packing_records: list[PackingRecord]) -> BytesIO:
     """Export FBO shipping (packing records) to Excel."""
     try:
+        import pandas as pd
+
         sorted_records = sorted(
             packing_records,
             key=lambda r: (
@@ -156,6 +171,8 @@ def export_fbo_shipping(packing_records: list[PackingRecord]) -> BytesIO:
 def parse_products_excel(file_bytes: bytes) -> list[dict]:
     """Parse products from Excel bytes."""
     try:
+        import pandas as pd
+
         df = pd.read_excel(BytesIO(file_bytes))
         missing = REQUIRED_COLUMNS.difference(set(df.columns))
         if missing:
@@ -185,6 +202,8 @@ def parse_products_excel(file_bytes: bytes) -> list[dict]:
 def export_services(services: list[Service]) -> BytesIO:
     """Export services (pricing) to Excel in-memory file."""
     try:
+        import pandas as pd
+
         rows = []
         for s in services:
             rows.append(
@@ -210,6 +229,8 @@ def export_services(services: list[Service]) -> BytesIO:
 def parse_services_excel(file_bytes: bytes) -> list[dict]:
     """Parse services from Excel bytes. Columns: Категория, Название, Цена, Ед., Комментарий."""
     try:
+        import pandas as pd
+
         df = pd.read_excel(BytesIO(file_bytes))
         required = {"Категория", "Название", "Цена"}
         missing = required.difference(set(df.columns))
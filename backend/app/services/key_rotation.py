@@ -0,0 +1,124 @@
+"""Online re-encryption of company API keys after ENCRYPTION_KEY rotation.
+
+Порядок ротации: ENCRYPTION_KEY="<новый>,<старый>" и перезапуск — приложение сразу читает оба ключа
+и шифрует новым. Строки под старым ключом перешифровывает фоновая задача rotate_encryption_keys —
+пачками по id (keyset), позиция сохраняется в maintenance_checkpoints после каждой пачки, смена
+основного ключа начинает проход заново. Чтение ключей (кеш клиентов) строки не перешифровывает:
+MultiFernet и так читает старый ключ, а отдельное соединение и повторная расшифровка на каждом
+промахе кеша не нужны.
+Обновление строки — UPDATE ... WHERE поле = прежнее значение: параллельная запись новых ключей
+не затирается, блокировки — только на строки пачки и на время одной транзакции; updated_at не
+меняется (ключи те же, кеш клиентов и результаты проверок остаются действительными).
+Проход, не нашедший строк под старым ключом, отмечается в чекпоинте как завершённый: дальше задача
+для этого основного ключа таблицу не читает, а старый ключ можно убрать из ENCRYPTION_KEY.
+"""
+from sqlalchemy import and_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.crypto import key_fingerprint, reencrypt_value
+from app.core.logging import logger
+from app.db.models.company_api_keys import CompanyAPIKeys
+from app.db.models.maintenance_checkpoint import MaintenanceCheckpoint
+
+ENCRYPTED_FIELDS = ("wb_api_key", "ozon_client_id", "ozon_api_key")
+CHECKPOINT_NAME = "encryption_key_rotation"
+PASS_DONE = "done"
+
+
+def rotated_values(row: CompanyAPIKeys, secret: str) -> dict[str, str]:
+    """Fields of row that need re-encryption with the primary key → new cipher."""
+    updates = {}
+    for field in ENCRYPTED_FIELDS:
+        new_cipher = reencrypt_value(getattr(row, field), secret)
+        if new_cipher is not None:
+            updates[field] = new_cipher
+    return updates
+
+
+async def _apply(db: AsyncSession, row: CompanyAPIKeys, updates: dict[str, str]) -> bool:
+    """Compare-and-set UPDATE: only if the fields still hold the values that were re-encrypted."""
+    unchanged = [getattr(CompanyAPIKeys, field) == getattr(row, field) for field in updates]
+    result = await db.execute(
+        update(CompanyAPIKeys)
+        .where(CompanyAPIKeys.id == row.id, and_(*unchanged))
+        .values(**updates, updated_at=CompanyAPIKeys.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+async def _read_checkpoint(db: AsyncSession, fingerprint: str) -> tuple[int, bool] | None:
+    """(last id, rows rotated in this pass) for the primary key; None if a clean pass already finished."""
+    checkpoint = await db.get(MaintenanceCheckpoint, CHECKPOINT_NAME, populate_existing=True)
+    if checkpoint is None:
+        return 0, False
+    saved_fingerprint, _, state = checkpoint.value.partition(":")
+    if saved_fingerprint != fingerprint:
+        return 0, False
+    if state == PASS_DONE:
+        return None
+    last_id, _, pass_rotated = state.partition(":")
+    return int(last_id or 0), pass_rotated == "1"
+
+
+async def _write_checkpoint(db: AsyncSession, fingerprint: str, last_id: int | str, pass_rotated: bool = False) -> None:
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    value = f"{fingerprint}:{last_id}:1" if pass_rotated else f"{fingerprint}:{last_id}"
+    stmt = insert(MaintenanceCheckpoint).values(name=CHECKPOINT_NAME, value=value)
+    await db.execute(stmt.on_conflict_do_update(index_elements=[MaintenanceCheckpoint.name], set_={"value": value}))
+
+
+async def rotate_encryption_keys(
+    db: AsyncSession,
+    secret: str | None = None,
+    batch_size: int | None = None,
+    max_batches: int | None = None,
+) -> int:
+    """Re-encrypt rows under old keys in id order from the checkpoint. Returns rows re-encrypted.
+
+    Одна пачка — одна транзакция (вместе с чекпоинтом). Дойдя до конца таблицы: если за проход
+    что-то перешифровано, чекпоинт сбрасывается в 0 и следующий запуск начинает новый проход; если
+    нет — проход отмечается завершённым, и до смены основного ключа задача таблицу не читает.
+    """
+    secret = settings.ENCRYPTION_KEY if secret is None else secret
+    fingerprint = key_fingerprint(secret)
+    if not fingerprint:
+        return 0
+    position = await _read_checkpoint(db, fingerprint)
+    if position is None:
+        return 0
+    last_id, pass_rotated = position
+    batch_size = batch_size or settings.ENCRYPTION_ROTATION_BATCH_SIZE
+    max_batches = max_batches or settings.MAINTENANCE_MAX_BATCHES_PER_RUN
+    rotated = 0
+    for _ in range(max_batches):
+        result = await db.execute(
+            select(CompanyAPIKeys)
+            .where(CompanyAPIKeys.id > last_id)
+            .order_by(CompanyAPIKeys.id)
+            .limit(batch_size)
+            .execution_options(populate_existing=True)
+        )
+        rows = result.scalars().all()
+        for row in rows:
+            updates = rotated_values(row, secret)
+            if updates and await _apply(db, row, updates):
+                rotated += 1
+                pass_rotated = True
+        if len(rows) == batch_size:
+            last_id = rows[-1].id
+            await _write_checkpoint(db, fingerprint, last_id, pass_rotated)
+            await db.commit()
+            continue
+        await _write_checkpoint(db, fingerprint, 0 if pass_rotated else PASS_DONE)
+        await db.commit()
+        if not pass_rotated:
+            logger.info("encryption_rotation_pass_clean", fingerprint=fingerprint)
+        last_id = 0
+        break
+    if rotated:
+        logger.info("encryption_keys_rotated", rows=rotated, next_id=last_id)
+    return rotated
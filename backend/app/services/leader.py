@@ -0,0 +1,113 @@
+"""Leader election for background jobs across uvicorn workers.
+
+PostgreSQL: сессионные advisory-блокировки. Все блокировки процесса держит одно соединение
+(LeaderConnection), а не по соединению на задачу: лидерство по любому числу задач стоит одного
+соединения из пула, и только пока процесс лидирует хотя бы в одной. Лидер — воркер, который
+держит блокировку задачи; при падении воркера соединение закрывается и блокировки берут другие.
+Остальные СУБД (SQLite в тестах, один процесс) — текущий процесс всегда лидер.
+"""
+import asyncio
+import hashlib
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.core.logging import logger
+from app.db.session import engine as default_engine
+
+
+def advisory_lock_key(name: str) -> int:
+    """Stable signed 64-bit key for pg_advisory_lock from a job name."""
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+class LeaderConnection:
+    """One connection per process holding the session-level advisory locks of all jobs it leads."""
+
+    def __init__(self, engine: AsyncEngine | None = None) -> None:
+        self._engine = engine or default_engine
+        self._conn: AsyncConnection | None = None
+        self._held: set[int] = set()
+        # Соединение общее для задач-циклов: операции на нём по одной.
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_postgres(self) -> bool:
+        return self._engine.dialect.name == "postgresql"
+
+    async def try_lock(self, name: str, key: int) -> bool:
+        """True if this process holds (or just took) the lock. Cheap to call before every run."""
+        if not self.is_postgres:
+            return True
+        async with self._lock:
+            if self._conn is not None:
+                try:
+                    await self._conn.execute(text("SELECT 1"))
+                    await self._conn.commit()
+                except Exception as exc:
+                    logger.warning("leader_connection_lost", jobs=len(self._held), error=str(exc))
+                    await self._close()
+            if key in self._held:
+                return True
+            if self._conn is None:
+                self._conn = await self._engine.connect()
+            try:
+                acquired = (await self._conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key})).scalar()
+                # Блокировку держит соединение (сессия), транзакцию открытой не оставляем.
+                await self._conn.commit()
+            except Exception:
+                await self._close()
+                raise
+            if acquired:
+                self._held.add(key)
+                logger.info("leader_acquired", job=name)
+            elif not self._held:
+                # Не лидер ни в одной задаче — соединение из пула не держим.
+                await self._close()
+            return bool(acquired)
+
+    async def unlock(self, name: str, key: int) -> None:
+        """Release one job's lock; the connection is closed when no locks are left."""
+        async with self._lock:
+            if key not in self._held or self._conn is None:
+                return
+            try:
+                await self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+                await self._conn.commit()
+            except Exception as exc:
+                logger.warning("leader_release_failed", job=name, error=str(exc))
+                await self._close()
+                return
+            self._held.discard(key)
+            logger.info("leader_released", job=name)
+            if not self._held:
+                await self._close()
+
+    async def _close(self) -> None:
+        conn, self._conn = self._conn, None
+        self._held.clear()
+        if conn is not None:
+            try:
+                await conn.close()
+            except Exception:
+                pass
+
+
+leader_connection = LeaderConnection()
+
+
+class LeaderLock:
+    """Leadership for one job: its advisory lock on the process-wide LeaderConnection."""
+
+    def __init__(self, name: str, connection: LeaderConnection | None = None) -> None:
+        self.name = name
+        self.key = advisory_lock_key(name)
+        self._connection = connection or leader_connection
+
+    async def acquire(self) -> bool:
+        """True if this process is (still) the leader. Cheap to call before every run."""
+        return await self._connection.try_lock(self.name, self.key)
+
+    async def release(self) -> None:
+        """Give up leadership (shutdown)."""
+        await self._connection.unlock(self.name, self.key)
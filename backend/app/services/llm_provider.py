@@ -1,18 +1,23 @@
 """LLM provider abstraction: OpenAI and OpenRouter (OpenAI-compatible API)."""
-from openai import AsyncOpenAI
+from typing import TYPE_CHECKING
 
 from app.core.config import settings
 
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
 
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 
 
-def get_llm_client(provider: str, api_key: str | None) -> AsyncOpenAI:
+def get_llm_client(provider: str, api_key: str | None) -> "AsyncOpenAI":
     """
     Return AsyncOpenAI client for the given provider.
     For openrouter, uses OPENROUTER_BASE_URL and api_key (OPENROUTER_API_KEY).
     For openai, uses default base URL and api_key (OPENAI_API_KEY).
     """
+    from openai import AsyncOpenAI
+
     if provider == "openrouter":
         key = api_key or settings.OPENROUTER_API_KEY
         return AsyncOpenAI(api_key=key or "dummy", base_url=OPENROUTER_BASE_URL)
@@ -0,0 +1,159 @@
+"""Periodic background tasks: housekeeping sweeps (off the request path), aggregate reconciliation, supply sync.
+
+Каждая чистка удаляет строки пачками по MAINTENANCE_BATCH_SIZE (DELETE ... WHERE id IN (SELECT ... LIMIT)),
+не больше MAINTENANCE_MAX_BATCHES_PER_RUN пачек за запуск: остаток — в следующий запуск.
+"""
+import re
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.db.models.chat_message import ChatMessage
+from app.db.models.notification_outbox import NotificationOutbox
+from app.db.models.order_photo import OrderPhoto
+from app.db.models.product import ProductPhoto
+from app.db.models.session import Session
+from app.db.session import AsyncSessionLocal
+from app.services.aggregates import reconcile_aggregates
+from app.services.credential_health import refresh_credential_health
+from app.services.key_rotation import rotate_encryption_keys
+from app.services.periodic import PeriodicTask, TaskRunner
+from app.services.s3 import S3Service
+from app.services.supply_sync import sync_all_supplies
+
+PHOTO_UPLOAD_PREFIXES = ("orders/", "products/")
+# Ключи, выданные для прямой загрузки (app.services.photos.create_upload_ticket).
+_PRESIGNED_PHOTO_KEY = re.compile(r"^(orders|products)/\d+/[0-9a-f]{32}\.(?:jpg|png|webp)$")
+_sweep_tokens: dict[str, str | None] = {}
+
+
+async def _delete_in_batches(
+    db: AsyncSession,
+    model,
+    condition: ColumnElement[bool],
+    batch_size: int | None = None,
+) -> int:
+    """Delete rows matching condition in bounded batches, one transaction per batch."""
+    batch_size = batch_size or settings.MAINTENANCE_BATCH_SIZE
+    deleted = 0
+    for _ in range(settings.MAINTENANCE_MAX_BATCHES_PER_RUN):
+        ids = select(model.id).where(condition).limit(batch_size).scalar_subquery()
+        result = await db.execute(delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False))
+        await db.commit()
+        deleted += result.rowcount or 0
+        if (result.rowcount or 0) < batch_size:
+            break
+    return deleted
+
+
+async def purge_expired_sessions(db: AsyncSession, batch_size: int | None = None) -> int:
+    """Remove expired login sessions (previously done on every login)."""
+    return await _delete_in_batches(db, Session, Session.expires_at <= datetime.utcnow(), batch_size)
+
+
+async def purge_old_chat_messages(db: AsyncSession, batch_size: int | None = None) -> int:
+    """Remove AI chat history older than CHAT_HISTORY_RETENTION_DAYS."""
+    cutoff = datetime.utcnow() - timedelta(days=settings.CHAT_HISTORY_RETENTION_DAYS)
+    return await _delete_in_batches(db, ChatMessage, ChatMessage.created_at < cutoff, batch_size)
+
+
+async def purge_notification_outbox(db: AsyncSession, batch_size: int | None = None) -> int:
+    """Remove sent/failed outbox rows older than NOTIFICATION_RETENTION_DAYS."""
+    cutoff = datetime.utcnow() - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+    return await _delete_in_batches(
+        db,
+        NotificationOutbox,
+        NotificationOutbox.status.in_(("sent", "failed")) & (NotificationOutbox.created_at < cutoff),
+        batch_size,
+    )
+
+
+async def sweep_stale_photo_uploads(db: AsyncSession, s3: S3Service | None = None) -> int:
+    """Delete presigned photo uploads that were never confirmed (no OrderPhoto/ProductPhoto row).
+
+    За запуск — одна страница листинга на префикс, продолжение — со следующего запуска.
+    """
+    s3 = s3 or S3Service()
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.STALE_UPLOAD_MIN_AGE_HOURS)
+    removed = 0
+    for prefix in PHOTO_UPLOAD_PREFIXES:
+        objects, next_token = await s3.run(
+            s3.list_objects_page, prefix, _sweep_tokens.get(prefix), settings.MAINTENANCE_BATCH_SIZE
+        )
+        _sweep_tokens[prefix] = next_token
+        candidates = [
+            obj["Key"]
+            for obj in objects
+            if _PRESIGNED_PHOTO_KEY.match(obj["Key"]) and obj["LastModified"] < cutoff
+        ]
+        if not candidates:
+            continue
+        model = OrderPhoto if prefix == "orders/" else ProductPhoto
+        known = set((await db.execute(select(model.s3_key).where(model.s3_key.in_(candidates)))).scalars().all())
+        orphans = [key for key in candidates if key not in known]
+        if orphans:
+            await s3.run(s3.delete_objects, orphans)
+            logger.info("stale_uploads_deleted", prefix=prefix, count=len(orphans))
+            removed += len(orphans)
+    return removed
+
+
+async def reconcile_aggregates_task(db: AsyncSession) -> int:
+    """reconcile_aggregates as a maintenance sweep; returns the number of fixed orders and companies."""
+    fixed = await reconcile_aggregates(db)
+    if any(fixed.values()):
+        logger.info("aggregates_reconciled", **fixed)
+    return sum(fixed.values())
+
+
+def _in_session(func: Callable[[AsyncSession], Awaitable[int]]) -> Callable[[], Awaitable[int]]:
+    """Adapt a sweep taking db to a PeriodicTask function (own session per run)."""
+
+    async def run() -> int:
+        async with AsyncSessionLocal() as db:
+            return await func(db)
+
+    return run
+
+
+maintenance_runner = TaskRunner(
+    tasks=[
+        PeriodicTask(
+            "purge_expired_sessions", settings.SESSION_CLEANUP_INTERVAL_SECONDS, _in_session(purge_expired_sessions)
+        ),
+        PeriodicTask(
+            "purge_old_chat_messages", settings.MAINTENANCE_DAILY_INTERVAL_SECONDS, _in_session(purge_old_chat_messages)
+        ),
+        PeriodicTask(
+            "purge_notification_outbox",
+            settings.MAINTENANCE_DAILY_INTERVAL_SECONDS,
+            _in_session(purge_notification_outbox),
+        ),
+        PeriodicTask(
+            "sweep_stale_photo_uploads",
+            settings.STALE_UPLOAD_SWEEP_INTERVAL_SECONDS,
+            _in_session(sweep_stale_photo_uploads),
+        ),
+        PeriodicTask(
+            "reconcile_aggregates",
+            settings.AGGREGATES_RECONCILE_INTERVAL_SECONDS,
+            _in_session(reconcile_aggregates_task),
+        ),
+        PeriodicTask("sync_marketplace_supplies", settings.SUPPLY_SYNC_INTERVAL_SECONDS, sync_all_supplies),
+        PeriodicTask(
+            "refresh_credential_health",
+            settings.CREDENTIAL_HEALTH_REFRESH_INTERVAL_SECONDS,
+            _in_session(refresh_credential_health),
+        ),
+        PeriodicTask(
+            "rotate_encryption_keys",
+            settings.ENCRYPTION_ROTATION_INTERVAL_SECONDS,
+            _in_session(rotate_encryption_keys),
+        ),
+    ]
+)
@@ -0,0 +1,88 @@
+"""Decrypted marketplace clients per company with a bounded in-memory cache.
+
+Маршруты и фоновые задачи получают готовые WildberriesAPI/OzonAPI компании без запроса к БД и
+расшифровки ключей на каждый вызов. Запись живёт MARKETPLACE_CLIENT_CACHE_TTL_SECONDS: это и граница,
+через которую смена ключей в другом воркере становится видна (в своём воркере invalidate сбрасывает
+запись сразу), и срок хранения расшифрованных ключей в памяти. Если маркетплейс отклонил ключи,
+проверка (app.services.credential_health) перечитывает их, не дожидаясь TTL. Размер кеша ограничен (LRU).
+Ключи под старым ENCRYPTION_KEY читаются как есть (MultiFernet), перешифровывает их фоновая задача
+(app.services.key_rotation).
+"""
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.crypto import decrypt_value
+from app.db.models.company_api_keys import CompanyAPIKeys
+from app.services.ozon_api import OzonAPI
+from app.services.wb_api import WildberriesAPI
+
+MarketplaceClients = dict[str, WildberriesAPI | OzonAPI]
+MAX_CACHED_COMPANIES = 2048
+
+
+def marketplace_clients(keys: CompanyAPIKeys | None) -> MarketplaceClients:
+    """API clients for marketplaces the company has credentials for ("wb", "ozon")."""
+    if keys is None:
+        return {}
+    secret = settings.ENCRYPTION_KEY or ""
+    clients: MarketplaceClients = {}
+    wb_key = decrypt_value(keys.wb_api_key, secret)
+    if wb_key:
+        clients["wb"] = WildberriesAPI(api_key=wb_key)
+    ozon_cid = decrypt_value(keys.ozon_client_id, secret)
+    ozon_key = decrypt_value(keys.ozon_api_key, secret)
+    if ozon_cid and ozon_key:
+        clients["ozon"] = OzonAPI(client_id=ozon_cid, api_key=ozon_key)
+    return clients
+
+
+class MarketplaceClientCache:
+    """company_id → (expires_at, clients)."""
+
+    def __init__(self, max_size: int = MAX_CACHED_COMPANIES) -> None:
+        self._entries: OrderedDict[int, tuple[float, MarketplaceClients]] = OrderedDict()
+        self._max_size = max_size
+
+    async def get(self, db: AsyncSession, company_id: int) -> MarketplaceClients:
+        """Cached clients of the company within the TTL; loads and decrypts keys otherwise."""
+        entry = self._entries.get(company_id)
+        now = time.monotonic()
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end(company_id)
+            return entry[1]
+        result = await db.execute(
+            select(CompanyAPIKeys)
+            .where(CompanyAPIKeys.company_id == company_id)
+            .execution_options(populate_existing=True)
+        )
+        clients = marketplace_clients(result.scalar_one_or_none())
+        self._entries[company_id] = (now + settings.MARKETPLACE_CLIENT_CACHE_TTL_SECONDS, clients)
+        self._entries.move_to_end(company_id)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+        return clients
+
+    def invalidate(self, company_id: int) -> None:
+        """Drop cached clients (keys changed in this process or rejected by the marketplace)."""
+        self._entries.pop(company_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+marketplace_client_cache = MarketplaceClientCache()
+
+
+async def get_marketplace_clients(db: AsyncSession, company_id: int, interactive: bool = False) -> MarketplaceClients:
+    """Clients of the company from the process cache.
+
+    interactive=True — для обработчиков запросов: долгое ожидание лимита не спит, а даёт MarketplaceBusy.
+    """
+    clients = await marketplace_client_cache.get(db, company_id)
+    if interactive:
+        return {marketplace: api.interactive() for marketplace, api in clients.items()}
+    return clients
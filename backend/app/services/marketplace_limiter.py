@@ -0,0 +1,217 @@
+"""Outbound rate limiting for marketplace APIs (WB/Ozon): token bucket per API key and endpoint group.
+
+Каждый ключ API (кабинет продавца) и группа эндпоинтов — своё ведро: всплеск одной компании
+не расходует лимит других, запросы к одному ведру обслуживаются по очереди (FIFO).
+Ответ 429 блокирует ведро на Retry-After / X-Ratelimit-Retry (или экспоненциальную задержку
+с разбросом) и запрос повторяется: маркетплейс его не обработал. 5xx и сетевые ошибки повторяются
+только для идемпотентных запросов. Заголовки X-Ratelimit-Remaining/Reset (WB) учитываются заранее,
+до получения 429.
+
+Каждый вызов ограничен общим бюджетом времени (ожидание токена, блокировка после 429, паузы
+между повторами): MARKETPLACE_CALL_BUDGET_SECONDS для фоновых задач, для обработчиков запросов —
+короткий MARKETPLACE_INTERACTIVE_BUDGET_SECONDS. Если ожидание не укладывается в бюджет, вызов
+сразу завершается MarketplaceBusy (в API — 503 с Retry-After), а не спит.
+
+Вёдра живут в памяти процесса: при N воркерах фактический темп к маркетплейсу — до N × лимит
+из RATE_LIMITS, поэтому лимиты взяты с запасом.
+"""
+import asyncio
+import hashlib
+import random
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from app.core.config import settings
+from app.core.logging import logger
+
+# (маркетплейс, группа) → (запросов в секунду, ёмкость ведра), с запасом ниже лимитов WB/Ozon.
+RATE_LIMITS: dict[tuple[str, str], tuple[float, int]] = {
+    ("wb", "supplies"): (5.0, 20),
+    ("wb", "supplies_write"): (1.0, 5),
+    ("wb", "stickers"): (1.0, 5),
+    ("ozon", "supply_orders"): (10.0, 10),
+}
+DEFAULT_RATE_LIMIT = (1.0, 5)
+MAX_BUCKETS = 4096
+
+
+class MarketplaceBusy(Exception):
+    """The marketplace call cannot be made within its time budget (rate limit wait is too long)."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"Marketplace rate limit, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket with FIFO waiters and an explicit block (after 429)."""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._waiters = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_estimate(self, now: float) -> float:
+        """Seconds until a token for a new caller (queued waiters included)."""
+        tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+        needed = self._waiters + 1 - tokens
+        return max(0.0, self.blocked_until - now) + (needed / self.rate if needed > 0 else 0.0)
+
+    async def acquire(self, deadline: float | None = None) -> None:
+        """Wait for a token; waiters are served in arrival order.
+
+        deadline (time.monotonic()) — MarketplaceBusy, если токен не достанется до этого момента.
+        """
+        if deadline is not None:
+            wait = self.wait_estimate(time.monotonic())
+            if time.monotonic() + wait > deadline:
+                raise MarketplaceBusy(wait)
+        self._waiters += 1
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    if now < self.blocked_until:
+                        wait = self.blocked_until - now
+                    else:
+                        self._refill(now)
+                        if self.tokens >= 1:
+                            self.tokens -= 1
+                            return
+                        wait = (1 - self.tokens) / self.rate
+                    if deadline is not None and now + wait > deadline:
+                        raise MarketplaceBusy(wait)
+                    await asyncio.sleep(wait)
+        finally:
+            self._waiters -= 1
+
+    def block_for(self, seconds: float) -> None:
+        """No requests for seconds; the bucket restarts empty."""
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0.0
+        self.updated = max(self.updated, self.blocked_until)
+
+
+def retry_after_seconds(response: httpx.Response) -> float | None:
+    """Delay requested by the server: Retry-After (seconds or HTTP date) or WB X-Ratelimit-Retry."""
+    for header in ("X-Ratelimit-Retry", "Retry-After"):
+        value = response.headers.get(header)
+        if not value:
+            continue
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            moment = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            continue
+        return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+    return None
+
+
+def backoff_seconds(attempt: int) -> float:
+    """Exponential backoff with full jitter, capped by MARKETPLACE_RETRY_MAX_SECONDS."""
+    ceiling = min(settings.MARKETPLACE_RETRY_MAX_SECONDS, settings.MARKETPLACE_RETRY_BASE_SECONDS * 2**attempt)
+    return random.uniform(ceiling / 2, ceiling)
+
+
+class MarketplaceLimiter:
+    """Registry of buckets (LRU-bounded) and the send-with-retry loop."""
+
+    def __init__(self, max_buckets: int = MAX_BUCKETS) -> None:
+        self._buckets: OrderedDict[tuple[str, str, str], TokenBucket] = OrderedDict()
+        self._max_buckets = max_buckets
+
+    def bucket(self, marketplace: str, credential: str, group: str) -> TokenBucket:
+        """Bucket for API key and endpoint group (the key itself is not stored, only its hash)."""
+        key = (marketplace, hashlib.blake2b(credential.encode(), digest_size=16).hexdigest(), group)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate, capacity = RATE_LIMITS.get((marketplace, group), DEFAULT_RATE_LIMIT)
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+            while len(self._buckets) > self._max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    @staticmethod
+    def _apply_headers(bucket: TokenBucket, response: httpx.Response) -> None:
+        """Exhausted quota reported by the server (X-Ratelimit-Remaining: 0) blocks until reset."""
+        if response.headers.get("X-Ratelimit-Remaining") != "0":
+            return
+        try:
+            reset = float(response.headers.get("X-Ratelimit-Reset") or 0)
+        except ValueError:
+            return
+        if reset > 0:
+            bucket.block_for(reset)
+
+    async def send(
+        self,
+        marketplace: str,
+        credential: str,
+        group: str,
+        call: Callable[[], Awaitable[httpx.Response]],
+        idempotent: bool = True,
+        budget: float | None = None,
+    ) -> httpx.Response:
+        """Run call under the bucket limit with 429/5xx retries. Returns the last response.
+
+        budget — общий бюджет времени вызова в секундах (по умолчанию MARKETPLACE_CALL_BUDGET_SECONDS):
+        ожидание, не укладывающееся в него, — MarketplaceBusy; повтор 5xx, не укладывающийся в него,
+        не делается (возвращается последний ответ). Сетевые ошибки после последней попытки
+        (или сразу для неидемпотентных) пробрасываются.
+        """
+        bucket = self.bucket(marketplace, credential, group)
+        deadline = time.monotonic() + (settings.MARKETPLACE_CALL_BUDGET_SECONDS if budget is None else budget)
+        attempt = 0
+        while True:
+            last = attempt >= settings.MARKETPLACE_MAX_RETRIES
+            await bucket.acquire(deadline)
+            try:
+                response = await call()
+            except httpx.TransportError as exc:
+                delay = backoff_seconds(attempt)
+                if not idempotent or last or time.monotonic() + delay > deadline:
+                    raise
+                logger.warning(
+                    "marketplace_request_retry", marketplace=marketplace, group=group, error=str(exc), delay=delay
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._apply_headers(bucket, response)
+            status = response.status_code
+            if last or (status != 429 and not (status >= 500 and idempotent)):
+                return response
+            delay = retry_after_seconds(response)
+            delay = backoff_seconds(attempt) if delay is None else delay + random.uniform(0, 0.25)
+            if status == 429:
+                bucket.block_for(delay)
+                if time.monotonic() + delay > deadline:
+                    raise MarketplaceBusy(delay)
+            elif time.monotonic() + delay > deadline:
+                return response
+            logger.warning("marketplace_request_retry", marketplace=marketplace, group=group, status=status, delay=delay)
+            if status != 429:
+                await asyncio.sleep(delay)
+            attempt += 1
+
+
+marketplace_limiter = MarketplaceLimiter()
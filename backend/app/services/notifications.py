@@ -0,0 +1,282 @@
+"""Notification outbox: Telegram messages are enqueued by handlers and sent by a background dispatcher.
+
+Обработчик добавляет строку notification_outbox в своей транзакции (enqueue_notification) и не ждёт
+Telegram: уведомление не теряется при сбое отправки и появляется, только если изменение закоммичено.
+Диспетчер захватывает пачку готовых строк (PostgreSQL: FOR UPDATE SKIP LOCKED): ставит status=sending
+и срок захвата в next_attempt_at и коммитит — отправка в Telegram идёт вне транзакции и без блокировок,
+а строки упавшего воркера снова становятся доступны после NOTIFICATION_CLAIM_TIMEOUT_SECONDS. Строки
+одного чата с одним coalesce_key (например, события одной заявки) склеиваются в сообщения по границам
+событий, соблюдается общий лимит Telegram (TELEGRAM_MESSAGES_PER_SECOND) и интервал на чат, повтор —
+с экспоненциальной задержкой (429 — по retry_after), после NOTIFICATION_MAX_ATTEMPTS или при постоянной
+ошибке (бот заблокирован) строка помечается failed. Без TELEGRAM_BOT_TOKEN строки остаются pending.
+Диспетчер работает только в воркере-лидере (LeaderLock), поэтому лимиты в памяти процесса — общие.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.db.models.notification_outbox import NotificationOutbox
+from app.db.session import AsyncSessionLocal
+from app.services.leader import LeaderLock
+from app.services.telegram import TelegramSendResult, post_message
+
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+TELEGRAM_TEXT_LIMIT = 4096
+MAX_RETRY_DELAY_SECONDS = 3600
+
+
+def order_coalesce_key(order_id: int) -> str:
+    """Coalesce key for notifications about one order."""
+    return f"order:{order_id}"
+
+
+def enqueue_notification(
+    db: AsyncSession,
+    chat_id: int,
+    text: str,
+    coalesce_key: str | None = None,
+    parse_mode: str | None = None,
+) -> None:
+    """Queue a Telegram message in the caller's transaction (sent after commit by the dispatcher)."""
+    db.add(NotificationOutbox(chat_id=chat_id, text=text, coalesce_key=coalesce_key, parse_mode=parse_mode))
+
+
+class ChatRateLimiter:
+    """Global messages-per-second limit plus a minimal interval between messages to one chat."""
+
+    def __init__(self, per_second: float, chat_interval: float) -> None:
+        self._global_interval = 1 / per_second if per_second > 0 else 0.0
+        self._chat_interval = chat_interval
+        self._next_global = 0.0
+        self._next_chat: dict[int, float] = {}
+
+    def chat_delay(self, chat_id: int) -> float:
+        """Seconds until the chat may receive the next message (0 if ready)."""
+        return max(0.0, self._next_chat.get(chat_id, 0.0) - time.monotonic())
+
+    def defer_chat(self, chat_id: int, seconds: float) -> None:
+        """Block the chat for seconds (Telegram 429 retry_after)."""
+        self._next_chat[chat_id] = max(self._next_chat.get(chat_id, 0.0), time.monotonic() + seconds)
+
+    async def acquire(self, chat_id: int) -> None:
+        """Wait for a global slot and reserve the chat interval."""
+        now = time.monotonic()
+        if self._next_global > now:
+            await asyncio.sleep(self._next_global - now)
+            now = self._next_global
+        self._next_global = now + self._global_interval
+        self._next_chat[chat_id] = now + self._chat_interval
+        if len(self._next_chat) > 10_000:
+            self._next_chat = {chat: ready for chat, ready in self._next_chat.items() if ready > now}
+
+
+def _split_long(text: str) -> list[str]:
+    """Split one oversized text at line breaks (hard cut only for a single overlong line)."""
+    parts: list[str] = []
+    while len(text) > TELEGRAM_TEXT_LIMIT:
+        cut = text.rfind("\n", 0, TELEGRAM_TEXT_LIMIT)
+        if cut <= 0:
+            cut = TELEGRAM_TEXT_LIMIT
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    return [*parts, text] if text else parts
+
+
+def _merge_texts(rows: list[tuple[int, str]]) -> list[tuple[str, list[int]]]:
+    """Join (id, text) rows into messages up to the Telegram limit, splitting only between events.
+
+    Returns (message text, outbox ids covered by the message); repeated texts are sent once.
+    """
+    messages: list[tuple[str, list[int]]] = []
+    texts: list[str] = []
+    ids: list[int] = []
+    for row_id, text in rows:
+        if texts and texts[-1] == text:
+            ids.append(row_id)
+            continue
+        if texts and len("\n".join(texts)) + 1 + len(text) > TELEGRAM_TEXT_LIMIT:
+            messages.append(("\n".join(texts), ids))
+            texts, ids = [], []
+        if len(text) > TELEGRAM_TEXT_LIMIT:
+            *head, text = _split_long(text)
+            messages.extend((part, []) for part in head)
+        texts.append(text)
+        ids.append(row_id)
+    if texts:
+        messages.append(("\n".join(texts), ids))
+    return messages
+
+
+def _retry_delay(attempts: int) -> float:
+    return min(settings.NOTIFICATION_RETRY_BASE_SECONDS * 2 ** (attempts - 1), MAX_RETRY_DELAY_SECONDS)
+
+
+async def _claim_batch(db: AsyncSession, now: datetime) -> list[NotificationOutbox]:
+    """Mark due rows (and sending rows whose claim expired) as sending and commit."""
+    query = (
+        select(NotificationOutbox)
+        .where(
+            NotificationOutbox.status.in_((STATUS_PENDING, STATUS_SENDING)),
+            NotificationOutbox.next_attempt_at <= now,
+        )
+        .order_by(NotificationOutbox.id)
+        .limit(settings.NOTIFICATION_BATCH_SIZE)
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+    rows = list((await db.execute(query)).scalars().all())
+    claimed_until = now + timedelta(seconds=settings.NOTIFICATION_CLAIM_TIMEOUT_SECONDS)
+    for row in rows:
+        row.status = STATUS_SENDING
+        row.next_attempt_at = claimed_until
+    await db.commit()
+    return rows
+
+
+async def dispatch_notifications(
+    db: AsyncSession,
+    client: httpx.AsyncClient,
+    limiter: ChatRateLimiter,
+) -> dict[str, int]:
+    """Claim and send one batch of due notifications. Commits. Returns claimed/sent/failed row counts."""
+    if not settings.TELEGRAM_BOT_TOKEN:
+        # Без токена отправлять нечем: строки остаются pending до настройки бота.
+        return {"claimed": 0, "sent": 0, "failed": 0}
+    now = datetime.utcnow()
+    claimed = await _claim_batch(db, now)
+    if not claimed:
+        return {"claimed": 0, "sent": 0, "failed": 0}
+
+    # Снимок до отправки: после commit атрибуты строк истекли, а ждать Telegram в транзакции нельзя.
+    groups: dict[tuple, list[tuple[int, str]]] = {}
+    attempts: dict[int, int] = {}
+    for row in claimed:
+        key = (row.chat_id, row.coalesce_key or f"id:{row.id}", row.parse_mode)
+        groups.setdefault(key, []).append((row.id, row.text))
+        attempts[row.id] = row.attempts
+
+    sent_ids: set[int] = set()
+    deferred: dict[int, float] = {}
+    errors: dict[int, TelegramSendResult] = {}
+    for (chat_id, _, parse_mode), group in groups.items():
+        messages = _merge_texts(group)
+        for index, (text, ids) in enumerate(messages):
+            delay = limiter.chat_delay(chat_id)
+            if delay > 0:
+                # Интервал чата ещё не прошёл — оставшиеся события группы позже.
+                for _, rest in messages[index:]:
+                    deferred.update((row_id, delay) for row_id in rest)
+                break
+            await limiter.acquire(chat_id)
+            result = await post_message(client, chat_id, text, parse_mode)
+            if result.ok:
+                sent_ids.update(ids)
+                continue
+            if result.retry_after:
+                limiter.defer_chat(chat_id, result.retry_after)
+            for _, rest in messages[index:]:
+                errors.update((row_id, result) for row_id in rest)
+            logger.warning(
+                "notification_send_failed",
+                outbox_ids=[row_id for _, rest in messages[index:] for row_id in rest],
+                error=result.error,
+                permanent=result.permanent,
+            )
+            break
+
+    sent = failed = 0
+    rows = (
+        await db.execute(
+            select(NotificationOutbox).where(
+                NotificationOutbox.id.in_(list(attempts)), NotificationOutbox.status == STATUS_SENDING
+            )
+        )
+    ).scalars().all()
+    finished = datetime.utcnow()
+    for row in rows:
+        if row.id in sent_ids:
+            row.status = STATUS_SENT
+            row.sent_at = finished
+            sent += 1
+        elif row.id in deferred:
+            row.status = STATUS_PENDING
+            row.next_attempt_at = now + timedelta(seconds=deferred[row.id])
+        elif row.id in errors:
+            result = errors[row.id]
+            row.attempts = attempts[row.id] + 1
+            row.last_error = result.error
+            if result.permanent or row.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+                row.status = STATUS_FAILED
+                failed += 1
+            else:
+                row.status = STATUS_PENDING
+                row.next_attempt_at = now + timedelta(seconds=result.retry_after or _retry_delay(row.attempts))
+    await db.commit()
+    return {"claimed": len(attempts), "sent": sent, "failed": failed}
+
+
+async def outbox_stats(db: AsyncSession) -> dict:
+    """Queue depth: pending (including claimed) and failed rows, age of the oldest pending row in seconds."""
+    counts = dict(
+        (
+            await db.execute(
+                select(NotificationOutbox.status, func.count())
+                .where(NotificationOutbox.status.in_((STATUS_PENDING, STATUS_SENDING, STATUS_FAILED)))
+                .group_by(NotificationOutbox.status)
+            )
+        ).all()
+    )
+    oldest = (
+        await db.execute(
+            select(func.min(NotificationOutbox.created_at)).where(
+                NotificationOutbox.status.in_((STATUS_PENDING, STATUS_SENDING))
+            )
+        )
+    ).scalar_one()
+    return {
+        "pending": int(counts.get(STATUS_PENDING, 0)) + int(counts.get(STATUS_SENDING, 0)),
+        "failed": int(counts.get(STATUS_FAILED, 0)),
+        "oldest_pending_seconds": int((datetime.utcnow() - oldest).total_seconds()) if oldest else 0,
+    }
+
+
+async def run_notification_dispatcher(interval_seconds: float = 2) -> None:
+    """Фоновая отправка уведомлений из notification_outbox (только в воркере-лидере).
+
+    Лимиты Telegram (ChatRateLimiter) считаются в памяти процесса: отправляет один воркер,
+    иначе реальная частота была бы N × TELEGRAM_MESSAGES_PER_SECOND.
+    """
+    logger.info("notification_dispatcher_started", interval_seconds=interval_seconds)
+    limiter = ChatRateLimiter(settings.TELEGRAM_MESSAGES_PER_SECOND, settings.TELEGRAM_CHAT_MIN_INTERVAL_SECONDS)
+    leader = LeaderLock("notification_dispatcher")
+    try:
+        async with httpx.AsyncClient() as client:
+            while True:
+                try:
+                    if not await leader.acquire():
+                        await asyncio.sleep(interval_seconds)
+                        continue
+                    async with AsyncSessionLocal() as db:
+                        result = await dispatch_notifications(db, client, limiter)
+                    if result["sent"] or result["failed"]:
+                        logger.info("notifications_dispatched", **result)
+                    # Полная пачка — сразу следующая, иначе ждём.
+                    if result["claimed"] < settings.NOTIFICATION_BATCH_SIZE:
+                        await asyncio.sleep(interval_seconds)
+                except asyncio.CancelledError:
+                    logger.info("notification_dispatcher_stopped")
+                    raise
+                except Exception as exc:
+                    logger.exception("notification_dispatch_failed", error=str(exc))
+                    await asyncio.sleep(interval_seconds)
+    finally:
+        await leader.release()
@@ -0,0 +1,54 @@
+"""Daily order numbers "Заявка dd/mm/yy №N" without holding a counter lock for the whole order transaction.
+
+Номера выдаются атомарным upsert-ом строки order_counters за день
+(INSERT ... ON CONFLICT DO UPDATE SET value = value + n RETURNING value): блок из n номеров за один
+оператор. В PostgreSQL выделение идёт в отдельной короткой транзакции, как nextval у sequence:
+блокировка строки держится микросекунды, а не до commit заявки, поэтому одновременные заявки
+не выстраиваются в очередь. Эта транзакция идёт через отдельный маленький пул (CounterSessionLocal),
+а не через второе соединение основного пула. Номер неудавшейся заявки не переиспользуется (возможны пропуски).
+В SQLite (тесты, локальный запуск) блокировка строк не нужна — upsert выполняется в транзакции вызывающего.
+"""
+from datetime import date, datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models.order_counter import OrderCounter
+from app.db.session import CounterSessionLocal
+
+
+def format_order_number(moment: datetime, number: int) -> str:
+    """Order number text: date of moment as dd/mm/yy and the day's sequence number."""
+    return f"{moment.strftime('Заявка %d/%m/%y')} №{number}"
+
+
+async def _reserve(db: AsyncSession, day: date, count: int) -> int:
+    """Advance the day counter by count; returns the last reserved number."""
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(OrderCounter).values(counter_date=day, value=count)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[OrderCounter.counter_date],
+        set_={"value": OrderCounter.value + count},
+    ).returning(OrderCounter.value)
+    return (await db.execute(stmt)).scalar_one()
+
+
+async def allocate_order_numbers(
+    db: AsyncSession,
+    count: int = 1,
+    moment: datetime | None = None,
+    day: date | None = None,
+) -> list[str]:
+    """Reserve count consecutive order numbers.
+
+    The counter is kept per local server day (date.today()), the printed date is UTC, as before.
+    """
+    moment = moment or datetime.utcnow()
+    day = day or date.today()
+    if db.get_bind().dialect.name == "postgresql":
+        async with CounterSessionLocal() as counter_db:
+            last = await _reserve(counter_db, day, count)
+            await counter_db.commit()
+    else:
+        last = await _reserve(db, day, count)
+    return [format_order_number(moment, number) for number in range(last - count + 1, last + 1)]
@@ -3,11 +3,28 @@ Docs: https://docs.ozon.ru/api/seller/
 Authorization: Headers Client-Id, Api-Key
 """
 
+from copy import copy
+
 import httpx
 
+from app.core.config import settings
 from app.core.logging import logger
+from app.services.marketplace_limiter import MarketplaceBusy, marketplace_limiter
 
 SELLER_BASE_URL = "https://api-seller.ozon.ru"
+SUPPLY_ORDER_STATES = [
+    "ORDER_STATE_DATA_FILLING",
+    "ORDER_STATE_READY_TO_SUPPLY",
+    "ORDER_STATE_ACCEPTED_AT_SUPPLY_WAREHOUSE",
+    "ORDER_STATE_IN_TRANSIT",
+    "ORDER_STATE_ACCEPTANCE_AT_STORAGE_WAREHOUSE",
+    "ORDER_STATE_REPORTS_CONFIRMATION_AWAITING",
+    "ORDER_STATE_REPORT_REJECTED",
+    "ORDER_STATE_COMPLETED",
+    "ORDER_STATE_REJECTED_AT_SUPPLY_WAREHOUSE",
+    "ORDER_STATE_CANCELLED",
+    "ORDER_STATE_OVERDUE",
+]
 
 
 class OzonAPI:
@@ -17,14 +34,42 @@ class OzonAPI:
         self.client_id = client_id
         self.api_key = api_key
         self._headers = {"Client-Id": client_id, "Api-Key": api_key, "Content-Type": "application/json"}
+        self.budget: float | None = None  # бюджет времени вызова в лимитере; None — фоновый по умолчанию
+
+    def interactive(self) -> "OzonAPI":
+        """Copy for request handlers: rate-limit waits beyond MARKETPLACE_INTERACTIVE_BUDGET_SECONDS fail fast."""
+        api = copy(self)
+        api.budget = settings.MARKETPLACE_INTERACTIVE_BUDGET_SECONDS
+        return api
+
+    async def _request(
+        self,
+        client: httpx.AsyncClient,
+        group: str,
+        method: str,
+        url: str,
+        idempotent: bool = True,
+        **kwargs,
+    ) -> httpx.Response:
+        """Send through the per-key rate limiter (429/Retry-After aware, see marketplace_limiter)."""
+        return await marketplace_limiter.send(
+            "ozon",
+            self.client_id,
+            group,
+            lambda: getattr(client, method)(url, headers=self._headers, **kwargs),
+            idempotent=idempotent,
+            budget=self.budget,
+        )
 
     async def list_supply_orders(self) -> list[dict] | None:
         """List FBO supply orders. POST /v2/supply-order/list. Returns None on auth/connection error."""
         try:
             async with httpx.AsyncClient(timeout=30) as client:
-                r = await client.post(
+                r = await self._request(
+                    client,
+                    "supply_orders",
+                    "post",
                     f"{SELLER_BASE_URL}/v2/supply-order/list",
-                    headers=self._headers,
                     json={},
                 )
                 if r.status_code in (401, 403):
@@ -33,6 +78,42 @@ class OzonAPI:
                 r.raise_for_status()
                 data = r.json()
                 return data.get("result", {}).get("items", []) or []
+        except MarketplaceBusy:
+            raise
+        except Exception as e:
+            logger.warning("ozon_api_supply_list_failed", error=str(e))
+            return None
+
+    async def list_supply_order_ids(
+        self,
+        from_supply_order_id: int = 0,
+        limit: int = 100,
+    ) -> tuple[list[int], int] | None:
+        """Page of FBO supply order ids after from_supply_order_id and the last id of the page.
+
+        POST /v2/supply-order/list with paging. Returns None on auth/connection error.
+        """
+        try:
+            async with httpx.AsyncClient(timeout=30) as client:
+                r = await self._request(
+                    client,
+                    "supply_orders",
+                    "post",
+                    f"{SELLER_BASE_URL}/v2/supply-order/list",
+                    json={
+                        "filter": {"states": SUPPLY_ORDER_STATES},
+                        "paging": {"from_supply_order_id": from_supply_order_id, "limit": limit},
+                    },
+                )
+                if r.status_code in (401, 403):
+                    logger.warning("ozon_api_supply_list_unauthorized", status=r.status_code)
+                    return None
+                r.raise_for_status()
+                data = r.json() or {}
+                ids = [int(i) for i in data.get("supply_order_id") or []]
+                return ids, int(data.get("last_supply_order_id") or (ids[-1] if ids else from_supply_order_id))
+        except MarketplaceBusy:
+            raise
         except Exception as e:
             logger.warning("ozon_api_supply_list_failed", error=str(e))
             return None
@@ -41,9 +122,11 @@ class OzonAPI:
         """Get FBO supply order details. POST /v2/supply-order/get."""
         try:
             async with httpx.AsyncClient(timeout=30) as client:
-                r = await client.post(
+                r = await self._request(
+                    client,
+                    "supply_orders",
+                    "post",
                     f"{SELLER_BASE_URL}/v2/supply-order/get",
-                    headers=self._headers,
                     json={"id": supply_id},
                 )
                 if r.status_code in (401, 403):
@@ -51,6 +134,8 @@ class OzonAPI:
                     return None
                 r.raise_for_status()
                 return r.json().get("result")
+        except MarketplaceBusy:
+            raise
         except Exception as e:
             logger.warning("ozon_api_supply_get_failed", supply_id=supply_id, error=str(e))
             return None
@@ -71,10 +156,13 @@ class OzonAPI:
                     body["items"] = [{"sku": sku, "quantity": qty} for sku, qty in items.items()]
                 if cluster_id:
                     body["cluster_id"] = cluster_id
-                r = await client.post(
+                r = await self._request(
+                    client,
+                    "supply_orders",
+                    "post",
                     f"{SELLER_BASE_URL}/v2/supply-order/create",
-                    headers=self._headers,
                     json=body,
+                    idempotent=False,
                 )
                 if r.status_code in (401, 403):
                     logger.warning("ozon_api_create_supply_unauthorized", status=r.status_code)
@@ -88,6 +176,8 @@ class OzonAPI:
                     return data["operation_id"]
                 logger.warning("ozon_api_create_supply_unexpected_response", data=data)
                 return None
+        except MarketplaceBusy:
+            raise
         except Exception as e:
             logger.warning("ozon_api_create_supply_failed", error=str(e))
             return None
@@ -0,0 +1,220 @@
+"""Packing ingestion: atomic counter updates for packing records.
+
+Счётчики (order_items.packed_qty, orders.packed_qty, products.stock_quantity) меняются
+SQL-инкрементами (UPDATE ... SET x = x + :q), а не read-modify-write в Python: параллельные
+упаковщики не теряют обновления. Проверка остатка по позиции — в WHERE того же UPDATE,
+статус заявки считается в том же UPDATE по счётчикам заявки (orders.defect_qty) и возвращается
+через RETURNING; счётчики компании (company_stats) обновляются в той же транзакции.
+"""
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from sqlalchemy import case, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logging import logger
+from app.db.models.company import Company
+from app.db.models.order import Order, OrderItem
+from app.db.models.packing_record import PackingRecord
+from app.db.models.product import Product
+from app.db.models.user import User
+from app.db.models.warehouse_employee import WarehouseEmployee
+from app.schemas.warehouse import PackingRecordCreate
+from app.services.aggregates import bump_company_stats
+
+STATUS_PACKING = "Упаковка"
+STATUS_READY = "Готово к отгрузке"
+
+
+class PackingError(Exception):
+    """Packing rejected: HTTP status code and user-facing detail."""
+
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass(frozen=True)
+class PackedOrder:
+    """Order counters after packing (values returned by UPDATE ... RETURNING)."""
+
+    order_id: int
+    packed_qty: int
+    status: str
+
+
+async def resolve_employee(db: AsyncSession, employee_code: str, user: User) -> WarehouseEmployee:
+    """Find employee by code or auto-create one for the user (first packing)."""
+    employee_code = employee_code.strip()
+    if not employee_code:
+        raise PackingError(400, "Укажите код сотрудника")
+    employee_result = await db.execute(
+        select(WarehouseEmployee).where(WarehouseEmployee.employee_code == employee_code)
+    )
+    employee = employee_result.scalar_one_or_none()
+    if employee:
+        return employee
+    user_employee_result = await db.execute(select(WarehouseEmployee).where(WarehouseEmployee.user_id == user.id))
+    user_employee = user_employee_result.scalar_one_or_none()
+    if user_employee:
+        raise PackingError(400, f"Неверный ID сотрудника. Ваш ID: {user_employee.employee_code}")
+    employee = WarehouseEmployee(user_id=user.id, employee_code=employee_code)
+    db.add(employee)
+    await db.flush()
+    logger.info("warehouse_employee_auto_created", user_id=user.id, employee_code=employee_code)
+    return employee
+
+
+async def _check_orders(db: AsyncSession, order_ids: set[int]) -> dict[int, int]:
+    """All orders exist, belong to an existing company and passed receiving (one query). Returns order → company."""
+    result = await db.execute(
+        select(Order.id, Order.status, Order.received_qty, Company.id)
+        .outerjoin(Company, Company.id == Order.company_id)
+        .where(Order.id.in_(order_ids))
+    )
+    rows = {row[0]: row for row in result.all()}
+    for order_id in sorted(order_ids):
+        row = rows.get(order_id)
+        if row is None:
+            raise PackingError(404, "Заявка не найдена")
+        _, status, received_qty, company_id = row
+        if status != "Принято" and received_qty <= 0:
+            raise PackingError(400, "Упаковка возможна только после завершения приёмки заявки.")
+        if company_id is None:
+            raise PackingError(404, "Компания не найдена")
+    return {order_id: row[3] for order_id, row in rows.items()}
+
+
+async def _increment_item(db: AsyncSession, payload: PackingRecordCreate) -> None:
+    """packed_qty += quantity only if the item matches and has enough unpacked remainder."""
+    result = await db.execute(
+        update(OrderItem)
+        .where(
+            OrderItem.id == payload.order_item_id,
+            OrderItem.order_id == payload.order_id,
+            OrderItem.product_id == payload.product_id,
+            OrderItem.received_qty - OrderItem.defect_qty - OrderItem.packed_qty >= payload.quantity,
+        )
+        .values(packed_qty=OrderItem.packed_qty + payload.quantity)
+        .returning(OrderItem.id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.scalar_one_or_none() is not None:
+        return
+    # Отказ: отличаем несовпадение позиции от перепаковки (только на пути ошибки).
+    item_result = await db.execute(
+        select(OrderItem).where(
+            OrderItem.id == payload.order_item_id,
+            OrderItem.order_id == payload.order_id,
+            OrderItem.product_id == payload.product_id,
+        )
+    )
+    item = item_result.scalar_one_or_none()
+    if not item:
+        raise PackingError(400, "Позиция заявки не найдена или не совпадает с заказом и товаром.")
+    remainder = item.received_qty - item.defect_qty - item.packed_qty
+    raise PackingError(
+        400,
+        f"Перепаковка: по позиции доступно к упаковке {remainder} шт., указано {payload.quantity}.",
+    )
+
+
+async def _increment_order(db: AsyncSession, order_id: int, quantity: int) -> PackedOrder:
+    """orders.packed_qty += quantity and status from order counters in one UPDATE ... RETURNING."""
+    new_packed = Order.packed_qty + quantity
+    result = await db.execute(
+        update(Order)
+        .where(Order.id == order_id)
+        .values(
+            packed_qty=new_packed,
+            status=case((new_packed >= Order.received_qty - Order.defect_qty, STATUS_READY), else_=STATUS_PACKING),
+        )
+        .returning(Order.packed_qty, Order.status)
+        .execution_options(synchronize_session=False)
+    )
+    packed_qty, status = result.one()
+    return PackedOrder(order_id=order_id, packed_qty=packed_qty, status=status)
+
+
+async def apply_packing(
+    db: AsyncSession,
+    records: Sequence[PackingRecordCreate],
+    user: User,
+) -> list[PackedOrder]:
+    """Insert packing records and apply counters atomically. Caller commits (or rolls back on PackingError).
+
+    Весь батч — одна транзакция: при ошибке в любой записи не применяется ничего.
+    """
+    employees: dict[str, WarehouseEmployee] = {}
+    for payload in records:
+        code = payload.employee_code.strip()
+        if code not in employees:
+            employees[code] = await resolve_employee(db, payload.employee_code, user)
+    order_companies = await _check_orders(db, {payload.order_id for payload in records})
+
+    # Строки блокируются в порядке id (позиции → товары → заявки → company_stats): встречные батчи не дают дедлок.
+    for payload in sorted(records, key=lambda r: r.order_item_id):
+        await _increment_item(db, payload)
+    order_totals: dict[int, int] = {}
+    product_totals: dict[int, int] = {}
+    for payload in records:
+        order_totals[payload.order_id] = order_totals.get(payload.order_id, 0) + payload.quantity
+        product_totals[payload.product_id] = product_totals.get(payload.product_id, 0) + payload.quantity
+        db.add(
+            PackingRecord(
+                order_id=payload.order_id,
+                order_item_id=payload.order_item_id,
+                product_id=payload.product_id,
+                employee_id=employees[payload.employee_code.strip()].id,
+                pallet_number=payload.pallet_number,
+                box_number=payload.box_number,
+                quantity=payload.quantity,
+                warehouse=payload.warehouse,
+                box_barcode=payload.box_barcode,
+                materials_used=payload.materials_used,
+                time_spent_minutes=payload.time_spent_minutes,
+            )
+        )
+
+    # Остаток товара не уходит в минус: списание одним UPDATE stock = stock - q; если остатка не хватило,
+    # строка (уже заблокированная этим UPDATE) обнуляется в той же транзакции — списано q + (отрицательный остаток).
+    stock_deltas: dict[int, int] = {}
+    for product_id, quantity in sorted(product_totals.items()):
+        result = await db.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(stock_quantity=Product.stock_quantity - quantity)
+            .returning(Product.company_id, Product.stock_quantity)
+            .execution_options(synchronize_session=False)
+        )
+        row = result.one_or_none()
+        if row is None:
+            continue
+        company_id, stock_after = row
+        written_off = quantity
+        if stock_after < 0:
+            written_off = quantity + stock_after
+            await db.execute(
+                update(Product)
+                .where(Product.id == product_id)
+                .values(stock_quantity=0)
+                .execution_options(synchronize_session=False)
+            )
+        if written_off:
+            stock_deltas[company_id] = stock_deltas.get(company_id, 0) + written_off
+    packed = [await _increment_order(db, order_id, quantity) for order_id, quantity in sorted(order_totals.items())]
+
+    packed_deltas: dict[int, int] = {}
+    for order_id, quantity in order_totals.items():
+        company_id = order_companies[order_id]
+        packed_deltas[company_id] = packed_deltas.get(company_id, 0) + quantity
+    for company_id in sorted(set(stock_deltas) | set(packed_deltas)):
+        await bump_company_stats(
+            db,
+            company_id,
+            stock_quantity=-stock_deltas.get(company_id, 0),
+            orders_packed_qty=packed_deltas.get(company_id, 0),
+        )
+    await db.flush()
+    return packed
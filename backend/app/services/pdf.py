@@ -1,16 +1,21 @@
-"""PDF generation service."""
+"""PDF generation service.
+
+WeasyPrint и python-barcode импортируются при первой генерации, а не при загрузке модуля.
+"""
 import base64
 from dataclasses import dataclass
 from io import BytesIO
 import html
 
-import barcode
-from barcode.writer import ImageWriter
-from weasyprint import HTML
-
 from app.core.logging import logger
 
 
+def _write_pdf(html_content: str) -> bytes:
+    from weasyprint import HTML
+
+    return HTML(string=html_content).write_pdf()
+
+
 @dataclass
 class LabelData:
     """Label data for 58x40 mm."""
@@ -133,6 +138,9 @@ def _render_barcode_base64(barcode_value: str, module_width: float = 0.35, modul
         return ""
     code = barcode_value.strip()
     try:
+        import barcode
+        from barcode.writer import ImageWriter
+
         code128 = barcode.get("code128", code, writer=ImageWriter())
         buf = BytesIO()
         opts = {"module_width": module_width, "module_height": module_height}
@@ -190,7 +198,7 @@ def render_label_pdf(label: LabelData) -> bytes:
           </body>
         </html>
         """
-        return HTML(string=html_content).write_pdf()
+        return _write_pdf(html_content)
     except Exception as exc:
         logger.exception("label_pdf_generation_failed", error=str(exc))
         raise
@@ -233,7 +241,7 @@ def generate_price_list_pdf(services: list) -> bytes:
           </body>
         </html>
         """
-        return HTML(string=html_content).write_pdf()
+        return _write_pdf(html_content)
     except Exception as exc:
         logger.exception("price_list_pdf_failed", error=str(exc))
         raise
@@ -258,7 +266,7 @@ def render_contract_pdf(contract: ContractData, template_html: str | None = None
             "bank_corr_account": contract.bank_corr_account or "-",
         }
         html_content = _apply_contract_template(template_html or DEFAULT_CONTRACT_TEMPLATE, context)
-        return HTML(string=html_content).write_pdf()
+        return _write_pdf(html_content)
     except Exception as exc:
         logger.exception("contract_pdf_generation_failed", error=str(exc))
         raise
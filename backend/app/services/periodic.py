@@ -0,0 +1,114 @@
+"""Periodic background tasks: declarative interval, jitter, single-leader execution, per-task metrics.
+
+Задача — async-функция без аргументов, возвращающая число обработанных строк/объектов.
+TaskRunner запускает каждую задачу в своём цикле: первая пауза и каждый интервал — со случайным
+разбросом (jitter), чтобы воркеры и задачи не стартовали одновременно; задачи с leader_only=True
+выполняет только воркер, держащий advisory-блокировку задачи (app.services.leader).
+Метрики (число запусков, ошибок, длительность, результат) — в памяти процесса.
+"""
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+
+from app.core.logging import logger
+from app.services.leader import LeaderLock
+
+
+@dataclass(frozen=True)
+class PeriodicTask:
+    """Task definition."""
+
+    name: str
+    interval_seconds: float
+    func: Callable[[], Awaitable[int]]
+    jitter: float = 0.1  # доля интервала
+    leader_only: bool = True
+
+
+@dataclass
+class TaskMetrics:
+    """Per-task counters (this process)."""
+
+    runs: int = 0
+    failures: int = 0
+    skipped_not_leader: int = 0
+    last_started_at: datetime | None = None
+    last_duration_ms: int | None = None
+    last_result: int | None = None
+    last_error: str | None = None
+    total_processed: int = 0
+
+
+@dataclass
+class TaskRunner:
+    """Runs PeriodicTask loops and collects metrics."""
+
+    tasks: list[PeriodicTask]
+    metrics: dict[str, TaskMetrics] = field(default_factory=dict)
+
+    def _delay(self, task: PeriodicTask) -> float:
+        spread = task.interval_seconds * task.jitter
+        return max(0.0, task.interval_seconds + random.uniform(-spread, spread))
+
+    async def run_once(self, task: PeriodicTask) -> int | None:
+        """Run task once, recording metrics. Errors are logged, not raised."""
+        metrics = self.metrics.setdefault(task.name, TaskMetrics())
+        metrics.runs += 1
+        metrics.last_started_at = datetime.utcnow()
+        started = time.monotonic()
+        try:
+            result = await task.func()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            metrics.failures += 1
+            metrics.last_error = str(exc)[:512]
+            logger.exception("periodic_task_failed", task=task.name, error=str(exc))
+            return None
+        finally:
+            metrics.last_duration_ms = int((time.monotonic() - started) * 1000)
+        metrics.last_result = result
+        metrics.last_error = None
+        metrics.total_processed += result or 0
+        if result:
+            logger.info("periodic_task_done", task=task.name, processed=result, duration_ms=metrics.last_duration_ms)
+        return result
+
+    async def _loop(self, task: PeriodicTask) -> None:
+        leader = LeaderLock(f"periodic:{task.name}") if task.leader_only else None
+        try:
+            await asyncio.sleep(random.uniform(0, task.interval_seconds * task.jitter))
+            while True:
+                try:
+                    if leader is None or await leader.acquire():
+                        await self.run_once(task)
+                    else:
+                        self.metrics.setdefault(task.name, TaskMetrics()).skipped_not_leader += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    logger.exception("periodic_task_loop_error", task=task.name, error=str(exc))
+                await asyncio.sleep(self._delay(task))
+        finally:
+            if leader is not None:
+                await leader.release()
+
+    def start(self) -> list[asyncio.Task]:
+        """Create one asyncio task per PeriodicTask."""
+        logger.info("periodic_tasks_started", tasks=[task.name for task in self.tasks])
+        return [asyncio.create_task(self._loop(task), name=f"periodic:{task.name}") for task in self.tasks]
+
+    def snapshot(self) -> list[dict]:
+        """Task definitions with metrics."""
+        return [
+            {
+                "name": task.name,
+                "interval_seconds": task.interval_seconds,
+                "leader_only": task.leader_only,
+                **asdict(self.metrics.get(task.name, TaskMetrics())),
+            }
+            for task in self.tasks
+        ]
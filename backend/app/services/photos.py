@@ -0,0 +1,195 @@
+"""Order and product photos: image variants and direct-to-S3 uploads.
+
+Прямая загрузка: API выдаёт presigned POST (ключ, тип и размер зафиксированы политикой),
+клиент отправляет файл прямо в бакет, затем подтверждает загрузку — API проверяет объект
+(HEAD в S3) и создаёт запись фото. Варианты изображения строятся после ответа.
+
+Варианты (full/medium/thumb) строятся в отдельном пуле потоков (Pillow отпускает GIL при
+декодировании и масштабировании): JPEG декодируется в draft-режиме сразу в уменьшенном
+масштабе, каждый следующий вариант масштабируется из предыдущего. full — JPEG по ключу фото
+(как раньше), medium/thumb — IMAGE_VARIANT_FORMAT рядом с ним. Ключи вариантов — в photo.variants.
+"""
+import asyncio
+import re
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from io import BytesIO
+from typing import TYPE_CHECKING, Any, TypeVar
+from uuid import uuid4
+
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.db.session import AsyncSessionLocal
+from app.schemas.photo import PhotoUploadTicket
+from app.services.s3 import S3Service
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+T = TypeVar("T")
+
+# Тип файла прямой загрузки → расширение ключа в S3.
+PHOTO_EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp"}
+PHOTO_CONTENT_TYPES = frozenset(PHOTO_EXTENSIONS)
+# Вариант → наибольшая сторона, от большего к меньшему.
+PHOTO_VARIANTS = (("full", 1200), ("medium", 800), ("thumb", 320))
+PHOTO_MAX_SIDE = PHOTO_VARIANTS[0][1]
+_FORMATS = {"JPEG": ("image/jpeg", "jpg"), "WEBP": ("image/webp", "webp")}
+_KEY_NAME = re.compile(r"^[0-9a-f]{32}\.(?:jpg|png|webp)$")
+
+_executor_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+
+
+class PhotoUploadError(Exception):
+    """Upload rejected: user-facing detail (HTTP 400)."""
+
+    def __init__(self, detail: str) -> None:
+        super().__init__(detail)
+        self.detail = detail
+
+
+@dataclass(frozen=True)
+class ImageVariant:
+    """Encoded image variant."""
+
+    name: str
+    data: bytes
+    content_type: str
+    extension: str
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS, thread_name_prefix="image")
+    return _executor
+
+
+async def run_image_task(func: Callable[..., T], *args: Any) -> T:
+    """Run CPU-bound image work in the image pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), func, *args)
+
+
+def shutdown_image_executor() -> None:
+    """Stop the image pool (application shutdown)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def _encode(image: "Image.Image", name: str, image_format: str) -> ImageVariant:
+    content_type, extension = _FORMATS[image_format]
+    output = BytesIO()
+    image.save(output, format=image_format, quality=settings.IMAGE_VARIANT_QUALITY)
+    return ImageVariant(name=name, data=output.getvalue(), content_type=content_type, extension=extension)
+
+
+def build_variants(data: bytes) -> list[ImageVariant]:
+    """Decode once and encode all PHOTO_VARIANTS (CPU-bound: call via run_image_task)."""
+    from PIL import Image, ImageOps
+
+    image = Image.open(BytesIO(data))
+    # JPEG: декодирование сразу в масштабе 1/2–1/8, не больше, чем нужно для full; для других форматов no-op.
+    image.draft("RGB", (PHOTO_MAX_SIDE, PHOTO_MAX_SIDE))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    variants = []
+    for name, side in PHOTO_VARIANTS:
+        image.thumbnail((side, side), Image.Resampling.LANCZOS)
+        image_format = "JPEG" if name == "full" else settings.IMAGE_VARIANT_FORMAT.upper()
+        variants.append(_encode(image, name, image_format))
+    return variants
+
+
+def variant_key(key: str, variant: ImageVariant) -> str:
+    """S3 key of a variant: full replaces the photo key if the format matches, others are stored next to it."""
+    if variant.name == "full" and key.rsplit(".", 1)[-1] == variant.extension:
+        return key
+    stem = key.rsplit(".", 1)[0] if "." in key.rsplit("/", 1)[-1] else key
+    return f"{stem}_{variant.name}.{variant.extension}"
+
+
+def legacy_photo_key(prefix: str, filename: str | None) -> str:
+    """Key for a photo uploaded through the API: always .jpg, so the full variant is stored at the key itself."""
+    stem = (filename or "photo").rsplit(".", 1)[0] or "photo"
+    return f"{prefix}/{datetime.utcnow().timestamp()}_{stem}.jpg"
+
+
+async def store_photo_variants(s3: S3Service, key: str, data: bytes) -> dict[str, str]:
+    """Build variants in the image pool and upload them concurrently. Returns variant → key."""
+    variants = await run_image_task(build_variants, data)
+    keys = {variant.name: variant_key(key, variant) for variant in variants}
+    await asyncio.gather(
+        *(s3.upload_bytes_async(keys[variant.name], variant.data, variant.content_type) for variant in variants)
+    )
+    return keys
+
+
+def photo_variant_url(s3: S3Service, s3_key: str, variants: dict | None, name: str) -> str:
+    """Public URL of a variant; falls back to the photo itself while variants are not built."""
+    return s3.build_public_url((variants or {}).get(name) or s3_key)
+
+
+def is_photo_key(key: str, prefix: str) -> bool:
+    """True if key was issued by create_upload_ticket for this prefix (e.g. orders/15)."""
+    head, _, name = key.rpartition("/")
+    return head == prefix and bool(_KEY_NAME.match(name))
+
+
+def create_upload_ticket(s3: S3Service, prefix: str, content_type: str) -> PhotoUploadTicket:
+    """Issue presigned POST for a new photo key under prefix."""
+    if content_type not in PHOTO_CONTENT_TYPES:
+        raise PhotoUploadError("Неподдерживаемый тип файла")
+    key = f"{prefix}/{uuid4().hex}.{PHOTO_EXTENSIONS[content_type]}"
+    expires_in = settings.PHOTO_UPLOAD_URL_TTL_SECONDS
+    max_size = settings.MAX_UPLOAD_SIZE_BYTES
+    presigned = s3.presigned_post(key, content_type, max_size, expires_in)
+    return PhotoUploadTicket(
+        key=key,
+        url=presigned["url"],
+        fields=presigned["fields"],
+        expires_in=expires_in,
+        max_size=max_size,
+    )
+
+
+async def check_uploaded_photo(s3: S3Service, key: str, prefix: str) -> None:
+    """Key belongs to prefix and the object exists in S3 with an allowed type and size."""
+    if not is_photo_key(key, prefix):
+        raise PhotoUploadError("Некорректный ключ файла")
+    head = await s3.head_object_async(key)
+    if head is None:
+        raise PhotoUploadError("Файл не найден в хранилище")
+    if PHOTO_EXTENSIONS.get(head.get("ContentType")) != key.rsplit(".", 1)[-1]:
+        raise PhotoUploadError("Неподдерживаемый тип файла")
+    if int(head.get("ContentLength", 0)) > settings.MAX_UPLOAD_SIZE_BYTES:
+        raise PhotoUploadError("Файл слишком большой")
+
+
+async def process_uploaded_photo(s3: S3Service, model: type, photo_id: int, key: str) -> None:
+    """Build variants for a photo uploaded directly to S3 and record them (background task). Errors are logged."""
+    try:
+        variants = await store_photo_variants(s3, key, await s3.get_bytes_async(key))
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(model)
+                .where(model.id == photo_id)
+                .values(variants=variants)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        logger.info("photo_variants_stored", key=key, variants=sorted(variants))
+    except Exception as exc:
+        logger.exception("photo_variants_failed", key=key, error=str(exc))
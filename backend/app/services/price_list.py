@@ -0,0 +1,117 @@
+"""Versioned price-list artifacts (PDF via WeasyPrint, Excel via pandas).
+
+Прайс меняется только при правке услуг админом, поэтому файл строится один раз на версию
+каталога (CatalogSnapshot.services_version) и хранится в памяти процесса и в S3
+(price-lists/<вид>-<версия>.<расширение>, общий для воркеров). Скачивание и отправка в Telegram
+отдают готовые байты; после изменения услуг новая версия строится в фоне (prebuild_price_lists).
+"""
+import asyncio
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.db.session import AsyncSessionLocal
+from app.schemas.service import ServiceOut
+from app.services.catalog import CatalogSnapshot, catalog_cache
+from app.services.excel import export_services
+from app.services.pdf import generate_price_list_pdf
+from app.services.s3 import S3Service
+
+
+@dataclass(frozen=True)
+class PriceListKind:
+    name: str
+    extension: str
+    media_type: str
+    build: Callable[[list[ServiceOut]], bytes]
+
+
+PRICE_LIST_PDF = PriceListKind(
+    "price-list",
+    "pdf",
+    "application/pdf",
+    lambda services: generate_price_list_pdf([s for s in services if s.is_active]),
+)
+SERVICES_XLSX = PriceListKind(
+    "services",
+    "xlsx",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    lambda services: export_services(services).getvalue(),
+)
+
+
+class PriceListArtifacts:
+    """kind → (catalog version, bytes); one build per kind at a time."""
+
+    def __init__(self) -> None:
+        self._built: dict[str, tuple[str, bytes]] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def _s3_key(self, kind: PriceListKind, version: str) -> str:
+        return f"price-lists/{kind.name}-{version}.{kind.extension}"
+
+    async def _load(self, key: str) -> bytes | None:
+        if not settings.S3_BUCKET_NAME:
+            return None
+        try:
+            return await S3Service().get_bytes_async(key)
+        except Exception:
+            # Нет объекта (новая версия) или S3 недоступен — строим заново.
+            return None
+
+    async def _store(self, key: str, data: bytes, media_type: str) -> None:
+        if not settings.S3_BUCKET_NAME:
+            return
+        try:
+            await S3Service().upload_bytes_async(key, data, media_type)
+        except Exception as exc:
+            logger.warning("price_list_upload_failed", key=key, error=str(exc))
+
+    async def for_snapshot(self, kind: PriceListKind, snapshot: CatalogSnapshot) -> bytes:
+        """Artifact of the snapshot's catalog version: memory, then S3, then build (off the event loop)."""
+        version = snapshot.services_version
+        built = self._built.get(kind.name)
+        if built is not None and built[0] == version:
+            return built[1]
+        async with self._locks.setdefault(kind.name, asyncio.Lock()):
+            built = self._built.get(kind.name)
+            if built is not None and built[0] == version:
+                return built[1]
+            key = self._s3_key(kind, version)
+            data = await self._load(key)
+            if data is None:
+                data = await asyncio.to_thread(kind.build, snapshot.services)
+                await self._store(key, data, kind.media_type)
+                logger.info("price_list_built", kind=kind.name, version=version, size=len(data))
+            self._built[kind.name] = (version, data)
+            return data
+
+    async def get(self, db: AsyncSession, kind: PriceListKind) -> bytes:
+        """Artifact of the current catalog."""
+        return await self.for_snapshot(kind, await catalog_cache.get(db))
+
+    def has_built(self, kind: PriceListKind) -> bool:
+        return kind.name in self._built
+
+    def clear(self) -> None:
+        self._built.clear()
+
+
+price_list_artifacts = PriceListArtifacts()
+
+
+async def prebuild_price_lists() -> None:
+    """Rebuild artifacts already served by this process for the current catalog (after a service change)."""
+    kinds = [kind for kind in (PRICE_LIST_PDF, SERVICES_XLSX) if price_list_artifacts.has_built(kind)]
+    if not kinds:
+        return
+    try:
+        async with AsyncSessionLocal() as db:
+            snapshot = await catalog_cache.get(db)
+        for kind in kinds:
+            await price_list_artifacts.for_snapshot(kind, snapshot)
+    except Exception as exc:
+        logger.exception("price_list_prebuild_failed", error=str(exc))
@@ -1,47 +1,135 @@
-"""S3 storage service."""
+"""S3 storage service.
+
+Один boto3-клиент на процесс (потокобезопасен, общий пул соединений) и отдельный ограниченный
+пул потоков для блокирующих вызовов: async-методы (*_async) выполняют запросы к S3 в этом пуле,
+так что медленный PUT не останавливает event loop и остальные запросы воркера.
+Крупные файлы загружаются multipart (upload_fileobj с TransferConfig), скачивание — потоково.
+boto3 импортируется при создании клиента, а не при загрузке модуля (быстрый старт воркера).
+"""
+import asyncio
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from typing import BinaryIO
+from typing import TYPE_CHECKING, Any, BinaryIO, TypeVar
 
-import boto3
 import httpx
 
 from app.core.config import settings
 
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+
+T = TypeVar("T")
+
+_client_lock = threading.Lock()
+_client = None
+_executor_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+
+
+def get_s3_client():
+    """Process-wide S3 client (created once, safe to share between threads)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import boto3
+                from botocore.config import Config
+
+                _client = boto3.client(
+                    "s3",
+                    endpoint_url=settings.S3_ENDPOINT_URL,
+                    aws_access_key_id=settings.S3_ACCESS_KEY,
+                    aws_secret_access_key=settings.S3_SECRET_KEY,
+                    region_name=settings.S3_REGION,
+                    config=Config(
+                        max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                        connect_timeout=settings.S3_CONNECT_TIMEOUT_SECONDS,
+                        read_timeout=settings.S3_READ_TIMEOUT_SECONDS,
+                        retries={"max_attempts": 3, "mode": "standard"},
+                    ),
+                )
+    return _client
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Bounded thread pool for blocking S3 calls (separate from the default asyncio pool)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.S3_MAX_WORKERS,
+                    thread_name_prefix="s3",
+                )
+    return _executor
+
+
+def shutdown_s3_executor() -> None:
+    """Stop the S3 thread pool (application shutdown)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def _transfer_config() -> "TransferConfig":
+    from boto3.s3.transfer import TransferConfig
+
+    threshold = settings.S3_MULTIPART_THRESHOLD_MB * 1024 * 1024
+    return TransferConfig(
+        multipart_threshold=threshold,
+        multipart_chunksize=threshold,
+        max_concurrency=settings.S3_MULTIPART_CONCURRENCY,
+    )
+
 
 class S3Service:
     """S3 helper for uploads and URL building."""
 
-    def __init__(self) -> None:
-        self._client = None
-
     def _get_client(self):
-        """Create and cache an S3 client instance."""
-        if self._client is None:
-            self._client = boto3.client(
-                "s3",
-                endpoint_url=settings.S3_ENDPOINT_URL,
-                aws_access_key_id=settings.S3_ACCESS_KEY,
-                aws_secret_access_key=settings.S3_SECRET_KEY,
-                region_name=settings.S3_REGION,
-            )
-        return self._client
+        """Return the shared S3 client."""
+        return get_s3_client()
 
-    def upload_bytes(self, key: str, data: bytes, content_type: str) -> str:
-        """Upload bytes without multipart (non-chunked)."""
-        stream: BinaryIO = BytesIO(data)
-        self._get_client().put_object(
-            Bucket=settings.S3_BUCKET_NAME,
-            Key=key,
-            Body=stream,
-            ContentType=content_type,
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a blocking call in the S3 thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), func, *args)
+
+    def upload_file(self, key: str, fileobj: BinaryIO, content_type: str) -> str:
+        """Upload a file object from its current position; multipart above S3_MULTIPART_THRESHOLD_MB."""
+        self._get_client().upload_fileobj(
+            fileobj,
+            settings.S3_BUCKET_NAME,
+            key,
+            ExtraArgs={"ContentType": content_type},
+            Config=_transfer_config(),
         )
         return key
 
+    async def upload_file_async(self, key: str, fileobj: BinaryIO, content_type: str) -> str:
+        """Upload a file object without blocking the event loop."""
+        return await self.run(self.upload_file, key, fileobj, content_type)
+
+    def upload_bytes(self, key: str, data: bytes, content_type: str) -> str:
+        """Upload bytes; multipart above S3_MULTIPART_THRESHOLD_MB."""
+        return self.upload_file(key, BytesIO(data), content_type)
+
+    async def upload_bytes_async(self, key: str, data: bytes, content_type: str) -> str:
+        """Upload bytes without blocking the event loop."""
+        return await self.run(self.upload_bytes, key, data, content_type)
+
     def get_bytes(self, key: str) -> bytes:
         """Download object from S3 and return bytes."""
         response = self._get_client().get_object(Bucket=settings.S3_BUCKET_NAME, Key=key)
         return response["Body"].read()
 
+    async def get_bytes_async(self, key: str) -> bytes:
+        """Download object without blocking the event loop."""
+        return await self.run(self.get_bytes, key)
+
     def stream_chunks(self, key: str, chunk_size: int = 65536):
         """
         Download object from S3 as a generator of chunks (for streaming response).
@@ -56,6 +144,52 @@ class S3Service:
         """Delete object from S3 by key."""
         self._get_client().delete_object(Bucket=settings.S3_BUCKET_NAME, Key=key)
 
+    def presigned_post(self, key: str, content_type: str, max_size: int, expires_in: int) -> dict:
+        """Presigned POST for direct browser upload: fixed key and content type, size limited by policy."""
+        return self._get_client().generate_presigned_post(
+            Bucket=settings.S3_BUCKET_NAME,
+            Key=key,
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, max_size]],
+            ExpiresIn=expires_in,
+        )
+
+    def head_object(self, key: str) -> dict | None:
+        """Object metadata (ContentLength, ContentType) or None if the object does not exist."""
+        from botocore.exceptions import ClientError
+
+        try:
+            return self._get_client().head_object(Bucket=settings.S3_BUCKET_NAME, Key=key)
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in {"404", "NoSuchKey", "NotFound"}:
+                return None
+            raise
+
+    async def head_object_async(self, key: str) -> dict | None:
+        """Object metadata without blocking the event loop."""
+        return await self.run(self.head_object, key)
+
+    def list_objects_page(
+        self,
+        prefix: str,
+        continuation_token: str | None = None,
+        max_keys: int = 1000,
+    ) -> tuple[list[dict], str | None]:
+        """One page of objects under prefix (Key, LastModified, Size) and the token for the next page."""
+        params = {"Bucket": settings.S3_BUCKET_NAME, "Prefix": prefix, "MaxKeys": max_keys}
+        if continuation_token:
+            params["ContinuationToken"] = continuation_token
+        response = self._get_client().list_objects_v2(**params)
+        return response.get("Contents", []), response.get("NextContinuationToken")
+
+    def delete_objects(self, keys: list[str]) -> None:
+        """Delete up to 1000 objects in one request."""
+        if keys:
+            self._get_client().delete_objects(
+                Bucket=settings.S3_BUCKET_NAME,
+                Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+            )
+
     def build_public_url(self, key: str) -> str:
         """Build public URL from key."""
         base = settings.FILE_PUBLIC_BASE_URL.rstrip("/")
@@ -0,0 +1,64 @@
+"""Text search over a normalized search_text column (products, users).
+
+search_text заполняется при записи (ORM-события в моделях, app.db.search_text): нижний регистр, ё → е, одиночные пробелы.
+PostgreSQL: GIN-индекс pg_trgm по search_text — подстрока (LIKE '%x%') и нечёткое совпадение
+(word_similarity, оператор <%) идут по индексу. Ранжирование: точное совпадение ШК/артикула →
+префикс → похожесть. Остальные диалекты (SQLite в тестах): LIKE по тому же столбцу, ранжирование
+по точному совпадению и префиксу.
+"""
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from sqlalchemy import and_, case, func, literal, or_
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.db.search_text import normalize_search_text
+
+MAX_SEARCH_TOKENS = 8
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@dataclass(frozen=True)
+class SearchClause:
+    """WHERE condition and ranking keys (best match first) for a search term."""
+
+    condition: ColumnElement[bool]
+    keys: tuple  # (выражение, по убыванию) — для ORDER BY и keyset-курсора
+
+    @property
+    def order_by(self) -> tuple:
+        return tuple(expr.desc() if descending else expr.asc() for expr, descending in self.keys)
+
+
+def build_search(
+    column,
+    term: str | None,
+    dialect: str,
+    exact: Sequence = (),
+) -> SearchClause | None:
+    """Build search over normalized column. None for an empty term.
+
+    exact — столбцы, точное совпадение с которыми (ШК, артикул) ранжируется первым.
+    """
+    raw = (term or "").strip()
+    normalized = normalize_search_text(raw)
+    if not normalized:
+        return None
+    tokens = normalized.split(" ")[:MAX_SEARCH_TOKENS]
+    condition = and_(*(column.like(f"%{_escape_like(token)}%", escape="\\") for token in tokens))
+    exact_match = or_(*(col == raw for col in exact)) if exact else None
+    if exact_match is not None:
+        condition = or_(condition, exact_match)
+    rank = [
+        (column.like(f"{_escape_like(normalized)}%", escape="\\"), 1),
+    ]
+    if exact_match is not None:
+        rank.insert(0, (exact_match, 0))
+    keys: list = [(case(*rank, else_=2), False)]
+    if dialect == "postgresql":
+        condition = or_(condition, literal(normalized).op("<%")(column))
+        keys.append((func.word_similarity(normalized, column), True))
+    return SearchClause(condition=condition, keys=tuple(keys))
@@ -1,110 +1,143 @@
-"""Фоновая задача: автоматическая смена статуса отгрузок по дате поставки."""
+"""Фоновая задача: автоматическая смена статуса отгрузок по дате поставки.
+
+Запускается в каждом воркере, но выполняет работу только лидер (advisory-блокировка, см.
+app.services.leader). Переход делается пачками по SHIPMENT_SCHEDULER_BATCH_SIZE: один
+UPDATE ... RETURNING для отгрузок и один для заявок на пачку, без загрузки ORM-объектов.
+"""
 import asyncio
 from datetime import date, datetime, timezone
 
 from sqlalchemy import select, update
-from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.core.logging import logger
 from app.db.models.company import Company
 from app.db.models.order import Order
 from app.db.models.shipment_request import ShipmentRequest
+from app.db.models.user import User
 from app.db.session import AsyncSessionLocal
-from app.services.telegram import send_notification
+from app.services.aggregates import bump_company_stats
+from app.services.leader import LeaderLock
+from app.services.notifications import enqueue_notification, order_coalesce_key
 
 SHIPPED_STATUS = "Отгружено"
 ORDER_COMPLETED_STATUS = "Завершено"
 
 
-async def auto_close_expired_shipments() -> int:
+async def _close_shipments_batch(db: AsyncSession, today: date, batch_size: int) -> int:
+    """Close one batch of expired shipments and complete their orders in one transaction. Returns batch size."""
+    expired_ids = (
+        select(ShipmentRequest.id)
+        .where(
+            ShipmentRequest.delivery_date.isnot(None),
+            ShipmentRequest.delivery_date <= today,
+            ShipmentRequest.status != SHIPPED_STATUS,
+        )
+        .order_by(ShipmentRequest.id)
+        .limit(batch_size)
+        .scalar_subquery()
+    )
+    shipped = (
+        await db.execute(
+            update(ShipmentRequest)
+            .where(ShipmentRequest.id.in_(expired_ids))
+            .values(status=SHIPPED_STATUS)
+            .returning(ShipmentRequest.id, ShipmentRequest.order_id)
+            .execution_options(synchronize_session=False)
+        )
+    ).all()
+    if not shipped:
+        return 0
+    logger.info("shipments_auto_closed", shipment_request_ids=[row[0] for row in shipped])
+
+    order_ids = {order_id for _, order_id in shipped if order_id is not None}
+    closed_orders = []
+    if order_ids:
+        now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+        closed_orders = (
+            await db.execute(
+                update(Order)
+                .where(Order.id.in_(order_ids), Order.status != ORDER_COMPLETED_STATUS)
+                .values(status=ORDER_COMPLETED_STATUS, completed_at=now_utc, updated_at=now_utc)
+                .returning(Order.id, Order.company_id, Order.order_number, Order.packed_qty)
+                .execution_options(synchronize_session=False)
+            )
+        ).all()
+
+    closed_by_company: dict[int, int] = {}
+    for _, company_id, _, _ in closed_orders:
+        closed_by_company[company_id] = closed_by_company.get(company_id, 0) + 1
+    for company_id, closed in sorted(closed_by_company.items()):
+        await bump_company_stats(db, company_id, orders_open=-closed)
+
+    # Уведомления клиентам — в очередь, в той же транзакции (без ПДн в логах)
+    if closed_orders:
+        logger.info("orders_auto_completed_by_shipment", order_ids=[row[0] for row in closed_orders])
+        telegram_result = await db.execute(
+            select(Company.id, User.telegram_id)
+            .join(User, User.id == Company.user_id)
+            .where(Company.id.in_(closed_by_company))
+        )
+        telegram_ids = dict(telegram_result.all())
+        for order_id, company_id, order_number, packed_qty in closed_orders:
+            if telegram_ids.get(company_id):
+                enqueue_notification(
+                    db,
+                    telegram_ids[company_id],
+                    f"Заявка {order_number}: Завершено (автоматически по дате отгрузки). "
+                    f"Упаковано всего {packed_qty} шт.",
+                    coalesce_key=order_coalesce_key(order_id),
+                )
+    await db.commit()
+    return len(shipped)
+
+
+async def close_expired_shipments(db: AsyncSession, today: date | None = None, batch_size: int | None = None) -> int:
     """Перевести в 'Отгружено' все ShipmentRequest с delivery_date <= сегодня и статусом != 'Отгружено'.
 
-    Для каждой такой отгрузки также обновляет связанный Order: status = 'Завершено', completed_at = now,
-    если заказ ещё не завершён.
+    Связанные Order получают status = 'Завершено', completed_at = now (если ещё не завершены).
+    Каждая пачка — отдельная транзакция.
 
     Returns:
         Количество обновлённых заявок на отгрузку.
     """
-    today = date.today()
-    async with AsyncSessionLocal() as db:
-        result = await db.execute(
-            select(ShipmentRequest).where(
-                ShipmentRequest.delivery_date.isnot(None),
-                ShipmentRequest.delivery_date <= today,
-                ShipmentRequest.status != SHIPPED_STATUS,
-            )
-        )
-        requests = list(result.scalars().all())
-        if not requests:
-            return 0
-
-        order_ids_to_complete: set[int] = set()
-        for req in requests:
-            req.status = SHIPPED_STATUS
-            if req.order_id is not None:
-                order_ids_to_complete.add(req.order_id)
-            logger.info(
-                "shipment_auto_closed",
-                shipment_request_id=req.id,
-                delivery_date=str(req.delivery_date),
-            )
-
-        if order_ids_to_complete:
-            now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
-            await db.execute(
-                update(Order).where(
-                    Order.id.in_(order_ids_to_complete),
-                    Order.status != ORDER_COMPLETED_STATUS,
-                ).values(
-                    status=ORDER_COMPLETED_STATUS,
-                    completed_at=now_utc,
-                    updated_at=now_utc,
-                )
-            )
-            for oid in order_ids_to_complete:
-                logger.info("order_auto_completed_by_shipment", order_id=oid)
+    today = today or date.today()
+    batch_size = batch_size or settings.SHIPMENT_SCHEDULER_BATCH_SIZE
+    total = 0
+    while True:
+        closed = await _close_shipments_batch(db, today, batch_size)
+        total += closed
+        if closed < batch_size:
+            return total
 
-        await db.commit()
 
-        # Уведомить клиентов о завершении заказа по дате отгрузки (без ПДн в логах)
-        if order_ids_to_complete:
-            orders_result = await db.execute(
-                select(Order)
-                .where(Order.id.in_(order_ids_to_complete))
-                .options(joinedload(Order.company).joinedload(Company.user))
-            )
-            for order in orders_result.unique().scalars().all():
-                if order.company and order.company.user and order.company.user.telegram_id:
-                    msg = (
-                        f"Заявка {order.order_number}: Завершено (автоматически по дате отгрузки). "
-                        f"Упаковано всего {order.packed_qty} шт."
-                    )
-                    try:
-                        await send_notification(order.company.user.telegram_id, msg)
-                    except Exception as exc:
-                        logger.warning(
-                            "shipment_auto_complete_notification_failed",
-                            order_id=order.id,
-                            error=str(exc),
-                        )
-
-        return len(requests)
+async def auto_close_expired_shipments() -> int:
+    """close_expired_shipments in a new session."""
+    async with AsyncSessionLocal() as db:
+        return await close_expired_shipments(db)
 
 
 async def run_shipment_scheduler(interval_seconds: int = 600) -> None:
-    """Запускать auto_close_expired_shipments каждые interval_seconds секунд.
+    """Запускать auto_close_expired_shipments каждые interval_seconds секунд (только в воркере-лидере).
 
     Не прерывает цикл при исключениях — логирует и продолжает.
     """
     logger.info("shipment_scheduler_started", interval_seconds=interval_seconds)
-    while True:
-        try:
-            count = await auto_close_expired_shipments()
-            if count > 0:
-                logger.info("shipment_scheduler_run", closed_count=count)
-            await asyncio.sleep(interval_seconds)
-        except asyncio.CancelledError:
-            logger.info("shipment_scheduler_stopped")
-            raise
-        except Exception as exc:
-            logger.exception("shipment_scheduler_error", error=str(exc))
+    leader = LeaderLock("shipment_scheduler")
+    try:
+        while True:
+            try:
+                if await leader.acquire():
+                    count = await auto_close_expired_shipments()
+                    if count > 0:
+                        logger.info("shipment_scheduler_run", closed_count=count)
+                await asyncio.sleep(interval_seconds)
+            except asyncio.CancelledError:
+                logger.info("shipment_scheduler_stopped")
+                raise
+            except Exception as exc:
+                logger.exception("shipment_scheduler_error", error=str(exc))
+                await asyncio.sleep(interval_seconds)
+    finally:
+        await leader.release()
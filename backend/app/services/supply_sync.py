@@ -0,0 +1,382 @@
+"""Background FBO supply sync with Wildberries and Ozon.
+
+Пользователи читают поставки из БД; сверка с маркетплейсами идёт в фоне (периодическая задача):
+- новые поставки — инкрементально, страницами от сохранённого курсора (marketplace_sync_state.cursor:
+  WB — next, Ozon — last_supply_order_id), не больше SUPPLY_SYNC_MAX_PAGES страниц за запуск;
+- открытые поставки (не completed) — обновление статуса и коробов, давно не сверенные первыми,
+  не больше SUPPLY_SYNC_REFRESH_LIMIT за запуск.
+Компании синхронизируются параллельно (не больше SUPPLY_SYNC_CONCURRENCY), у каждой своя сессия БД;
+детали заявок Ozon со страницы запрашиваются параллельно (не больше SUPPLY_SYNC_DETAIL_CONCURRENCY).
+Запросы к маркетплейсам идут вне транзакции: страница поставок коммитится вместе с курсором,
+сверенная открытая поставка — отдельно, так что соединение и блокировки строк не держатся на время HTTP.
+"""
+import asyncio
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.db.models.company_api_keys import CompanyAPIKeys
+from app.db.models.fbo_supply import FBOSupply, FBOSupplyBox, MarketplaceSyncState
+from app.db.session import AsyncSessionLocal
+from app.services.barcode_index import KIND_BOX, barcode_index, box_entry
+from app.services.marketplace_credentials import MarketplaceClients, get_marketplace_clients
+from app.services.ozon_api import OzonAPI
+from app.services.wb_api import WildberriesAPI
+
+# Состояния заявки на поставку Ozon → статус FBOSupply.
+OZON_STATUS = {
+    "ORDER_STATE_DATA_FILLING": "created",
+    "ORDER_STATE_READY_TO_SUPPLY": "created",
+    "ORDER_STATE_ACCEPTED_AT_SUPPLY_WAREHOUSE": "in_progress",
+    "ORDER_STATE_IN_TRANSIT": "in_progress",
+    "ORDER_STATE_ACCEPTANCE_AT_STORAGE_WAREHOUSE": "in_progress",
+    "ORDER_STATE_REPORTS_CONFIRMATION_AWAITING": "in_progress",
+    "ORDER_STATE_REPORT_REJECTED": "in_progress",
+    "ORDER_STATE_COMPLETED": "completed",
+    "ORDER_STATE_REJECTED_AT_SUPPLY_WAREHOUSE": "completed",
+    "ORDER_STATE_CANCELLED": "completed",
+    "ORDER_STATE_OVERDUE": "completed",
+}
+
+
+class SupplySyncError(Exception):
+    """Marketplace API unavailable during sync."""
+
+
+@dataclass(frozen=True)
+class RemoteSupply:
+    """Supply as reported by the marketplace."""
+
+    external_id: str
+    status: str
+    warehouse_name: str | None = None
+
+
+@dataclass
+class BoxChanges:
+    """Boxes removed by apply_supply_boxes (to drop from the barcode index after commit)."""
+
+    removed: list[tuple[str | None, int]]
+
+
+def wb_supply_status(data: dict) -> str:
+    """WB supply → FBOSupply status (done — closed and handed over)."""
+    return "completed" if data.get("done") else "created"
+
+
+def ozon_supply_status(data: dict) -> str:
+    """Ozon supply order state → FBOSupply status."""
+    return OZON_STATUS.get(str(data.get("state") or data.get("status") or ""), "in_progress")
+
+
+def ozon_supply_barcodes(data: dict) -> list[str]:
+    """Box barcodes from Ozon supply order details."""
+    barcodes = data.get("barcodes") or (data.get("package") or {}).get("barcodes")
+    if barcodes is None:
+        packages = data.get("packages") or []
+        barcodes = packages[0].get("barcodes") if packages else []
+    if not isinstance(barcodes, list):
+        return []
+    return [str(b).strip() for b in barcodes if b and str(b).strip()]
+
+
+async def apply_supply_boxes(
+    db: AsyncSession,
+    supply: FBOSupply,
+    boxes_data: Sequence[tuple[str | None, str]],
+) -> BoxChanges:
+    """Make supply boxes match boxes_data (external_box_id, external_barcode) in order.
+
+    Совпавшие короба сохраняются (id не меняется), отсутствующие удаляются, новые добавляются;
+    box_number — порядок в boxes_data. supply.boxes должен быть загружен. Вызывающий коммитит.
+    """
+    existing = {(box.external_box_id, box.external_barcode): box for box in supply.boxes}
+    wanted = set(boxes_data)
+    removed = []
+    for key, box in existing.items():
+        if key not in wanted:
+            removed.append((box.external_barcode, box.id))
+            await db.delete(box)
+    for number, key in enumerate(boxes_data, start=1):
+        box = existing.get(key)
+        if box is None:
+            db.add(
+                FBOSupplyBox(supply_id=supply.id, box_number=number, external_box_id=key[0], external_barcode=key[1])
+            )
+        elif box.box_number != number:
+            box.box_number = number
+    await db.flush()
+    return BoxChanges(removed=removed)
+
+
+async def reindex_supply_boxes(db: AsyncSession, supply_id: int, changes: BoxChanges) -> None:
+    """After commit: drop removed boxes from the barcode index and put current ones."""
+    for barcode, box_id in changes.removed:
+        barcode_index.discard(barcode, KIND_BOX, box_id)
+    result = await db.execute(select(FBOSupplyBox).where(FBOSupplyBox.supply_id == supply_id))
+    for box in result.scalars().all():
+        barcode_index.put(box_entry(box))
+
+
+async def _get_state(db: AsyncSession, company_id: int, marketplace: str) -> MarketplaceSyncState:
+    result = await db.execute(
+        select(MarketplaceSyncState).where(
+            MarketplaceSyncState.company_id == company_id,
+            MarketplaceSyncState.marketplace == marketplace,
+        )
+    )
+    state = result.scalar_one_or_none()
+    if state is None:
+        state = MarketplaceSyncState(company_id=company_id, marketplace=marketplace)
+        db.add(state)
+        await db.flush()
+    return state
+
+
+async def _set_state(db: AsyncSession, state_id: int, **values) -> None:
+    """Update sync state by id (no ORM object: after commit it is expired). Caller commits."""
+    await db.execute(update(MarketplaceSyncState).where(MarketplaceSyncState.id == state_id).values(**values))
+
+
+async def upsert_supplies(
+    db: AsyncSession,
+    company_id: int,
+    marketplace: str,
+    remotes: Sequence[RemoteSupply],
+) -> int:
+    """Insert new supplies and update status/warehouse of known ones (one SELECT for the page)."""
+    if not remotes:
+        return 0
+    result = await db.execute(
+        select(FBOSupply).where(
+            FBOSupply.company_id == company_id,
+            FBOSupply.marketplace == marketplace,
+            FBOSupply.external_supply_id.in_([remote.external_id for remote in remotes]),
+        )
+    )
+    known = {supply.external_supply_id: supply for supply in result.scalars().all()}
+    for remote in remotes:
+        supply = known.get(remote.external_id)
+        if supply is None:
+            supply = FBOSupply(company_id=company_id, marketplace=marketplace, external_supply_id=remote.external_id)
+            db.add(supply)
+            known[remote.external_id] = supply
+        supply.status = remote.status
+        if remote.warehouse_name:
+            supply.warehouse_name = remote.warehouse_name
+    await db.flush()
+    return len(remotes)
+
+
+async def _pull_wb(db: AsyncSession, company_id: int, api: WildberriesAPI, state_id: int, cursor: str | None) -> int:
+    """Page WB supplies from the saved next cursor; each page commits with the advanced cursor."""
+    next_ = int(cursor or 0)
+    limit = settings.SUPPLY_SYNC_PAGE_SIZE
+    pulled = 0
+    for _ in range(settings.SUPPLY_SYNC_MAX_PAGES):
+        page = await api.get_supplies_page(limit=limit, next_=next_)
+        if page is None:
+            raise SupplySyncError("WB API недоступен")
+        supplies, page_next = page
+        remotes = [
+            RemoteSupply(external_id=str(item["id"]), status=wb_supply_status(item))
+            for item in supplies
+            if item.get("id")
+        ]
+        pulled += await upsert_supplies(db, company_id, "wb", remotes)
+        if supplies:
+            next_ = page_next
+            await _set_state(db, state_id, cursor=str(next_))
+        await db.commit()
+        if len(supplies) < limit:
+            break
+    return pulled
+
+
+async def _get_ozon_supply_orders(api: OzonAPI, ids: Sequence[int]) -> list[dict | None]:
+    """Load supply order details, at most SUPPLY_SYNC_DETAIL_CONCURRENCY requests at a time (order kept)."""
+    semaphore = asyncio.Semaphore(settings.SUPPLY_SYNC_DETAIL_CONCURRENCY)
+
+    async def get_one(supply_order_id: int) -> dict | None:
+        async with semaphore:
+            return await api.get_supply_order(supply_order_id)
+
+    return list(await asyncio.gather(*(get_one(supply_order_id) for supply_order_id in ids)))
+
+
+async def _pull_ozon(db: AsyncSession, company_id: int, api: OzonAPI, state_id: int, cursor: str | None) -> int:
+    """Page Ozon supply order ids after the saved last id and load their details; each page commits."""
+    last_id = int(cursor or 0)
+    limit = settings.SUPPLY_SYNC_PAGE_SIZE
+    pulled = 0
+    for _ in range(settings.SUPPLY_SYNC_MAX_PAGES):
+        page = await api.list_supply_order_ids(from_supply_order_id=last_id, limit=limit)
+        if page is None:
+            raise SupplySyncError("Ozon API недоступен")
+        ids, page_last = page
+        details = await _get_ozon_supply_orders(api, ids)
+        remotes = []
+        for supply_order_id, data in zip(ids, details):
+            if data is None:
+                raise SupplySyncError("Ozon API недоступен")
+            warehouse = data.get("drop_off_warehouse") or {}
+            remotes.append(
+                RemoteSupply(
+                    external_id=str(supply_order_id),
+                    status=ozon_supply_status(data),
+                    warehouse_name=warehouse.get("name") if isinstance(warehouse, dict) else None,
+                )
+            )
+        pulled += await upsert_supplies(db, company_id, "ozon", remotes)
+        if ids:
+            last_id = page_last
+            await _set_state(db, state_id, cursor=str(last_id))
+        await db.commit()
+        if len(ids) < limit:
+            break
+    return pulled
+
+
+async def _refresh_open(
+    db: AsyncSession,
+    company_id: int,
+    marketplace: str,
+    api,
+    changed: list[tuple[int, BoxChanges]],
+) -> None:
+    """Update status and boxes of open supplies, least recently synced first; one commit per supply.
+
+    Запросы к маркетплейсу идут вне транзакции; изменённые короба добавляются в changed
+    (индекс штрихкодов обновляет вызывающий после всех коммитов).
+    """
+    result = await db.execute(
+        select(FBOSupply.id, FBOSupply.external_supply_id)
+        .where(
+            FBOSupply.company_id == company_id,
+            FBOSupply.marketplace == marketplace,
+            FBOSupply.external_supply_id.is_not(None),
+            FBOSupply.status != "completed",
+        )
+        .order_by(FBOSupply.synced_at.asc().nulls_first(), FBOSupply.id)
+        .limit(settings.SUPPLY_SYNC_REFRESH_LIMIT)
+    )
+    open_supplies = result.all()
+    await db.rollback()
+    for supply_id, external_id in open_supplies:
+        status, boxes_data = await fetch_remote_boxes(marketplace, external_id, api)
+        if marketplace == "wb":
+            details = await api.get_supply(external_id)
+            if details:
+                status = wb_supply_status(details)
+        supply = (
+            await db.execute(
+                select(FBOSupply)
+                .where(FBOSupply.id == supply_id)
+                .options(selectinload(FBOSupply.boxes))
+                .execution_options(populate_existing=True)
+            )
+        ).scalar_one_or_none()
+        if supply is None:
+            await db.rollback()
+            continue
+        if status:
+            supply.status = status
+        changes = await apply_supply_boxes(db, supply, boxes_data) if boxes_data else None
+        supply.synced_at = datetime.utcnow()
+        await db.commit()
+        if changes is not None:
+            changed.append((supply_id, changes))
+
+
+async def fetch_remote_boxes(
+    marketplace: str, external_supply_id: str, api
+) -> tuple[str | None, list[tuple[str | None, str]]]:
+    """Box list (external_box_id, external_barcode) from WB trbx or Ozon order barcodes, without the DB.
+
+    Для Ozon возвращает и статус из деталей заявки (для WB — None).
+    """
+    if marketplace == "wb":
+        boxes = await api.get_supply_boxes(external_supply_id)
+        return None, [(str(box["id"]), str(box["id"])) for box in boxes if box.get("id")]
+    try:
+        supply_order_id = int(external_supply_id)
+    except (TypeError, ValueError):
+        return None, []
+    data = await api.get_supply_order(supply_order_id)
+    if not data:
+        return None, []
+    return ozon_supply_status(data), [(None, barcode) for barcode in ozon_supply_barcodes(data)]
+
+
+async def fetch_supply_boxes(supply: FBOSupply, api) -> list[tuple[str | None, str]]:
+    """Box list (external_box_id, external_barcode) for a supply from WB trbx or Ozon order barcodes.
+
+    Для Ozon заодно обновляет supply.status из деталей заявки.
+    """
+    status, boxes = await fetch_remote_boxes(supply.marketplace, supply.external_supply_id, api)
+    if status:
+        supply.status = status
+    return boxes
+
+
+async def sync_company_supplies(
+    db: AsyncSession,
+    company_id: int,
+    clients: MarketplaceClients | None = None,
+) -> int:
+    """Sync WB/Ozon supplies of one company; errors go to sync state.
+
+    Транзакция не держится на время запросов к маркетплейсу: каждая страница новых поставок
+    коммитится вместе с курсором, каждая сверенная поставка — отдельно. Ошибка прерывает сверку
+    маркетплейса, но уже сохранённые страницы и поставки остаются.
+    """
+    if clients is None:
+        clients = await get_marketplace_clients(db, company_id)
+    synced = 0
+    for marketplace, api in clients.items():
+        state = await _get_state(db, company_id, marketplace)
+        state_id, cursor = state.id, state.cursor
+        await db.commit()
+        changed: list[tuple[int, BoxChanges]] = []
+        try:
+            if marketplace == "wb":
+                pulled = await _pull_wb(db, company_id, api, state_id, cursor)
+            else:
+                pulled = await _pull_ozon(db, company_id, api, state_id, cursor)
+            await _refresh_open(db, company_id, marketplace, api, changed)
+            await _set_state(db, state_id, synced_at=datetime.utcnow(), last_error=None)
+            await db.commit()
+            synced += pulled + len(changed)
+        except Exception as exc:
+            await db.rollback()
+            await _set_state(db, state_id, last_error=str(exc)[:512])
+            await db.commit()
+            logger.warning("supply_sync_failed", company_id=company_id, marketplace=marketplace, error=str(exc))
+        for supply_id, changes in changed:
+            await reindex_supply_boxes(db, supply_id, changes)
+    return synced
+
+
+async def sync_all_supplies() -> int:
+    """Sync every company with marketplace credentials, SUPPLY_SYNC_CONCURRENCY companies at a time."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(CompanyAPIKeys.company_id))
+        company_ids = list(result.scalars().all())
+    semaphore = asyncio.Semaphore(settings.SUPPLY_SYNC_CONCURRENCY)
+
+    async def sync_one(company_id: int) -> int:
+        async with semaphore:
+            async with AsyncSessionLocal() as db:
+                return await sync_company_supplies(db, company_id)
+
+    results = await asyncio.gather(*(sync_one(company_id) for company_id in company_ids), return_exceptions=True)
+    for company_id, outcome in zip(company_ids, results):
+        if isinstance(outcome, Exception):
+            logger.warning("supply_sync_company_failed", company_id=company_id, error=str(outcome))
+    return sum(outcome for outcome in results if isinstance(outcome, int))
@@ -1,28 +1,82 @@
 """Telegram helpers."""
+import hashlib
 import json
+from collections import OrderedDict
+from dataclasses import dataclass
 from urllib.parse import parse_qsl
 
 import httpx
 
 from app.core.config import settings
 
+MAX_CACHED_FILE_IDS = 256
 
-async def send_notification(chat_id: int, text: str, parse_mode: str | None = None) -> bool:
-    """Send a text message to Telegram chat. Returns True on success."""
+
+@dataclass(frozen=True)
+class TelegramSendResult:
+    """Outcome of a sendMessage call."""
+
+    ok: bool
+    retry_after: float | None = None  # 429: сколько секунд ждать (из ответа Telegram)
+    permanent: bool = False  # 400/403: чат недоступен или бот заблокирован — повтор бесполезен
+    error: str | None = None
+
+
+async def post_message(
+    client: httpx.AsyncClient,
+    chat_id: int,
+    text: str,
+    parse_mode: str | None = None,
+) -> TelegramSendResult:
+    """Call sendMessage with a caller-owned client and classify the result."""
     if not settings.TELEGRAM_BOT_TOKEN:
-        return False
+        return TelegramSendResult(ok=False, permanent=True, error="TELEGRAM_BOT_TOKEN not set")
     url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
     payload: dict = {"chat_id": chat_id, "text": text}
     if parse_mode:
         payload["parse_mode"] = parse_mode
+    try:
+        resp = await client.post(url, json=payload, timeout=10.0)
+    except httpx.HTTPError as exc:
+        return TelegramSendResult(ok=False, error=type(exc).__name__)
+    if resp.status_code == 200:
+        return TelegramSendResult(ok=True)
+    try:
+        body = resp.json()
+    except ValueError:
+        body = {}
+    description = str(body.get("description") or resp.status_code)[:256]
+    if resp.status_code == 429:
+        retry_after = (body.get("parameters") or {}).get("retry_after")
+        return TelegramSendResult(ok=False, retry_after=float(retry_after or 1), error=description)
+    return TelegramSendResult(ok=False, permanent=resp.status_code in (400, 403), error=description)
+
+
+async def send_notification(chat_id: int, text: str, parse_mode: str | None = None) -> bool:
+    """Send a text message to Telegram chat. Returns True on success."""
+    if not settings.TELEGRAM_BOT_TOKEN:
+        return False
     try:
         async with httpx.AsyncClient() as client:
-            resp = await client.post(url, json=payload, timeout=10.0)
-            return resp.status_code == 200
+            return (await post_message(client, chat_id, text, parse_mode)).ok
     except Exception:
         return False
 
 
+def _document_url() -> str:
+    return f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendDocument"
+
+
+async def _post_document(
+    client: httpx.AsyncClient, chat_id: int, caption: str, document: str | tuple[str, bytes]
+) -> httpx.Response:
+    """sendDocument with a file_id of an earlier upload (str) or a new file ((filename, bytes))."""
+    data = {"chat_id": chat_id, "caption": caption[:1024] if caption else ""}
+    if isinstance(document, str):
+        return await client.post(_document_url(), data={**data, "document": document}, timeout=10.0)
+    return await client.post(_document_url(), data=data, files={"document": document}, timeout=30.0)
+
+
 async def send_document(chat_id: int, file_bytes: bytes, filename: str, caption: str = "") -> bool:
     """
     Send a document to the user in the chat with the bot.
@@ -30,20 +84,88 @@ async def send_document(chat_id: int, file_bytes: bytes, filename: str, caption:
     """
     if not settings.TELEGRAM_BOT_TOKEN:
         return False
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendDocument"
     try:
         async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                url,
-                data={"chat_id": chat_id, "caption": caption[:1024] if caption else ""},
-                files={"document": (filename, file_bytes)},
-                timeout=30.0,
-            )
+            resp = await _post_document(client, chat_id, caption, (filename, file_bytes))
             return resp.status_code == 200
     except Exception:
         return False
 
 
+class DocumentFileIds:
+    """file_id of uploaded documents keyed by content hash (with filename), LRU-bounded, per process.
+
+    Telegram хранит загруженный файл и возвращает file_id: повторная отправка того же файла —
+    короткий JSON-запрос без загрузки байтов.
+    """
+
+    def __init__(self, max_size: int = MAX_CACHED_FILE_IDS) -> None:
+        self._ids: OrderedDict[str, str] = OrderedDict()
+        self._max_size = max_size
+
+    @staticmethod
+    def key(file_bytes: bytes, filename: str) -> str:
+        digest = hashlib.blake2b(filename.encode(), digest_size=32)
+        digest.update(b"\0")
+        digest.update(file_bytes)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> str | None:
+        file_id = self._ids.get(key)
+        if file_id is not None:
+            self._ids.move_to_end(key)
+        return file_id
+
+    def put(self, key: str, file_id: str) -> None:
+        self._ids[key] = file_id
+        self._ids.move_to_end(key)
+        while len(self._ids) > self._max_size:
+            self._ids.popitem(last=False)
+
+    def forget(self, key: str) -> None:
+        self._ids.pop(key, None)
+
+    def clear(self) -> None:
+        self._ids.clear()
+
+
+document_file_ids = DocumentFileIds()
+
+
+def _uploaded_file_id(resp: httpx.Response) -> str | None:
+    try:
+        return resp.json()["result"]["document"]["file_id"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+async def send_cached_document(chat_id: int, file_bytes: bytes, filename: str, caption: str = "") -> bool:
+    """
+    Send a document that is sent repeatedly with identical content (templates, price lists).
+    Uses the file_id of an earlier upload; if Telegram rejects it (400), uploads again.
+    """
+    if not settings.TELEGRAM_BOT_TOKEN:
+        return False
+    key = document_file_ids.key(file_bytes, filename)
+    try:
+        async with httpx.AsyncClient() as client:
+            file_id = document_file_ids.get(key)
+            if file_id is not None:
+                resp = await _post_document(client, chat_id, caption, file_id)
+                if resp.status_code != 400:
+                    return resp.status_code == 200
+                document_file_ids.forget(key)
+            resp = await _post_document(client, chat_id, caption, (filename, file_bytes))
+            if resp.status_code != 200:
+                return False
+            file_id = _uploaded_file_id(resp)
+            if file_id:
+                document_file_ids.put(key, file_id)
+            return True
+    except Exception:
+        return False
+
+
 def parse_init_data_user(init_data: str) -> dict | None:
     """Extract user payload from init_data."""
     data = dict(parse_qsl(init_data))
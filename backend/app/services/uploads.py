@@ -0,0 +1,80 @@
+"""Size-capped reading of uploaded files.
+
+Вместо `await file.read()` с проверкой размера после чтения: файл читается частями, чтение
+прерывается, как только превышен лимит (слишком большой файл не попадает в память целиком).
+`read_upload` копит данные в SpooledTemporaryFile (в памяти до UPLOAD_SPOOL_THRESHOLD_BYTES,
+дальше — на диске) для потоковой передачи в S3; `read_upload_bytes` собирает части сразу в bytes.
+"""
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from tempfile import SpooledTemporaryFile
+
+from fastapi import UploadFile
+
+from app.core.config import settings
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Upload exceeds the size limit."""
+
+    def __init__(self, max_bytes: int) -> None:
+        super().__init__(f"Upload exceeds {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+@dataclass
+class SpooledUpload:
+    """Uploaded content: spooled file positioned at start and its size."""
+
+    file: SpooledTemporaryFile
+    size: int
+    filename: str | None
+    content_type: str | None
+
+    def getvalue(self) -> bytes:
+        """Whole content as bytes (for parsers that need bytes)."""
+        self.file.seek(0)
+        data = self.file.read()
+        self.file.seek(0)
+        return data
+
+    def close(self) -> None:
+        """Release memory / remove the temp file."""
+        self.file.close()
+
+
+async def _read_chunks(file: UploadFile, max_bytes: int) -> AsyncIterator[bytes]:
+    """Yield upload chunks; UploadTooLarge as soon as more than max_bytes are read."""
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLarge(max_bytes)
+    size = 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        yield chunk
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> SpooledUpload:
+    """Read upload in chunks into a spooled file (UploadTooLarge past max_bytes)."""
+    spool = SpooledTemporaryFile(max_size=settings.UPLOAD_SPOOL_THRESHOLD_BYTES)
+    size = 0
+    try:
+        async for chunk in _read_chunks(file, max_bytes):
+            size += len(chunk)
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return SpooledUpload(file=spool, size=size, filename=file.filename, content_type=file.content_type)
+
+
+async def read_upload_bytes(file: UploadFile, max_bytes: int) -> bytes:
+    """Size-capped read straight into bytes (UploadTooLarge past max_bytes)."""
+    data = bytearray()
+    async for chunk in _read_chunks(file, max_bytes):
+        data += chunk
+    return bytes(data)
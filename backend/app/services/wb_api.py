@@ -4,9 +4,13 @@ Docs: https://openapi.wildberries.ru/marketplace/swagger/api/en/ (Supplies, v3)
 Authorization: Header Authorization: {API_KEY}
 """
 
+from copy import copy
+
 import httpx
 
+from app.core.config import settings
 from app.core.logging import logger
+from app.services.marketplace_limiter import MarketplaceBusy, marketplace_limiter
 
 SUPPLIES_BASE_URL = "https://marketplace-api.wildberries.ru"
 
@@ -17,15 +21,44 @@ class WildberriesAPI:
     def __init__(self, api_key: str) -> None:
         self.api_key = api_key
         self._headers = {"Authorization": api_key}
+        self.budget: float | None = None  # бюджет времени вызова в лимитере; None — фоновый по умолчанию
+
+    def interactive(self) -> "WildberriesAPI":
+        """Copy for request handlers: rate-limit waits beyond MARKETPLACE_INTERACTIVE_BUDGET_SECONDS fail fast."""
+        api = copy(self)
+        api.budget = settings.MARKETPLACE_INTERACTIVE_BUDGET_SECONDS
+        return api
+
+    async def _request(
+        self,
+        client: httpx.AsyncClient,
+        group: str,
+        method: str,
+        url: str,
+        idempotent: bool = True,
+        **kwargs,
+    ) -> httpx.Response:
+        """Send through the per-key rate limiter (429/Retry-After aware, see marketplace_limiter)."""
+        return await marketplace_limiter.send(
+            "wb",
+            self.api_key,
+            group,
+            lambda: getattr(client, method)(url, headers=self._headers, **kwargs),
+            idempotent=idempotent,
+            budget=self.budget,
+        )
 
     async def create_supply(self, name: str = "Поставка") -> str | None:
         """Create a new supply. POST /api/v3/supplies. Returns supply ID (WB-GI-xxx) or None."""
         try:
             async with httpx.AsyncClient(timeout=30) as client:
-                r = await client.post(
+                r = await self._request(
+                    client,
+                    "supplies_write",
+                    "post",
                     f"{SUPPLIES_BASE_URL}/api/v3/supplies",
-                    headers=self._headers,
                     json={"name": name},
+                    idempotent=False,
                 )
                 if r.status_code in (401, 403):
                     logger.warning("wb_api_create_supply_unauthorized", status=r.status_code)
@@ -33,17 +66,24 @@ class WildberriesAPI:
                 r.raise_for_status()
                 data = r.json()
                 return data.get("id")
+        except MarketplaceBusy:
+            raise
         except Exception as e:
             logger.warning("wb_api_create_supply_failed", error=str(e))
             return None
 
-    async def get_supplies(self, limit: int = 1000, next_: int = 0) -> list | None:
-        """List supplies. GET /api/v3/supplies. Returns None on auth/connection error."""
+    async def get_supplies_page(self, limit: int = 1000, next_: int = 0) -> tuple[list[dict], int] | None:
+        """One page of supplies and the cursor for the next one. GET /api/v3/supplies.
+
+        Returns None on auth/connection error.
+        """
         try:
             async with httpx.AsyncClient(timeout=30) as client:
-                r = await client.get(
+                r = await self._request(
+                    client,
+                    "supplies",
+                    "get",
                     f"{SUPPLIES_BASE_URL}/api/v3/supplies",
-                    headers=self._headers,
                     params={"limit": limit, "next": next_},
                 )
                 if r.status_code in (401, 403):
@@ -51,21 +91,52 @@ class WildberriesAPI:
                     return None
                 r.raise_for_status()
                 data = r.json() or {}
-                return data.get("supplies") or []
+                return data.get("supplies") or [], int(data.get("next") or next_)
+        except MarketplaceBusy:
+            raise
         except Exception as e:
             logger.warning("wb_api_supplies_failed", error=str(e))
             return None
 
+    async def get_supplies(self, limit: int = 1000, next_: int = 0) -> list | None:
+        """List supplies (one page). GET /api/v3/supplies. Returns None on auth/connection error."""
+        page = await self.get_supplies_page(limit=limit, next_=next_)
+        return page[0] if page is not None else None
+
+    async def get_supply(self, supply_id: str) -> dict | None:
+        """Get supply details (done, closedAt, ...). GET /api/v3/supplies/{supplyId}."""
+        try:
+            async with httpx.AsyncClient(timeout=30) as client:
+                r = await self._request(
+                    client,
+                    "supplies",
+                    "get",
+                    f"{SUPPLIES_BASE_URL}/api/v3/supplies/{supply_id}",
+                )
+                if r.status_code in (401, 403):
+                    logger.warning("wb_api_supply_unauthorized", status=r.status_code)
+                    return None
+                r.raise_for_status()
+                return r.json() or None
+        except MarketplaceBusy:
+            raise
+        except Exception as e:
+            logger.warning("wb_api_supply_failed", supply_id=supply_id, error=str(e))
+            return None
+
     async def create_supply_boxes(self, supply_id: str, amount: int) -> list[str]:
         """Create boxes in a supply. POST /api/v3/supplies/{supplyId}/trbx. Returns list of trbx IDs."""
         if amount < 1 or amount > 1000:
             return []
         try:
             async with httpx.AsyncClient(timeout=30) as client:
-                r = await client.post(
+                r = await self._request(
+                    client,
+                    "supplies_write",
+                    "post",
                     f"{SUPPLIES_BASE_URL}/api/v3/supplies/{supply_id}/trbx",
-                    headers=self._headers,
                     json={"amount": amount},
+                    idempotent=False,
                 )
                 if r.status_code in (401, 403):
                     logger.warning("wb_api_create_boxes_unauthorized", status=r.status_code)
@@ -74,6 +145,8 @@ class WildberriesAPI:
                 data = r.json() or {}
                 ids = data.get("trbxIds") or []
                 return [str(i) for i in ids]
+        except MarketplaceBusy:
+            raise
         except Exception as e:
             logger.warning(
                 "wb_api_create_boxes_failed", supply_id=supply_id, amount=amount, error=str(e)
@@ -84,15 +157,19 @@ class WildberriesAPI:
         """Add order to supply (moves to confirm). PATCH /api/v3/supplies/{supplyId}/orders/{orderId}."""
         try:
             async with httpx.AsyncClient(timeout=30) as client:
-                r = await client.patch(
+                r = await self._request(
+                    client,
+                    "supplies_write",
+                    "patch",
                     f"{SUPPLIES_BASE_URL}/api/v3/supplies/{supply_id}/orders/{order_id}",
-                    headers=self._headers,
                 )
                 if r.status_code in (401, 403):
                     logger.warning("wb_api_add_order_unauthorized", status=r.status_code)
                     return False
                 r.raise_for_status()
                 return True
+        except MarketplaceBusy:
+            raise
         except Exception as e:
             logger.warning(
                 "wb_api_add_order_failed",
@@ -106,13 +183,17 @@ class WildberriesAPI:
         """Get boxes (trbx) for a supply. GET /api/v3/supplies/{supplyId}/trbx."""
         try:
             async with httpx.AsyncClient(timeout=30) as client:
-                r = await client.get(
+                r = await self._request(
+                    client,
+                    "supplies",
+                    "get",
                     f"{SUPPLIES_BASE_URL}/api/v3/supplies/{supply_id}/trbx",
-                    headers=self._headers,
                 )
                 r.raise_for_status()
                 data = r.json() or {}
                 return data.get("trbxes") or []
+        except MarketplaceBusy:
+            raise
         except Exception as e:
             logger.warning("wb_api_supply_boxes_failed", supply_id=supply_id, error=str(e))
             return []
@@ -137,15 +218,19 @@ class WildberriesAPI:
             return []
         try:
             async with httpx.AsyncClient(timeout=30) as client:
-                r = await client.post(
+                r = await self._request(
+                    client,
+                    "stickers",
+                    "post",
                     f"{SUPPLIES_BASE_URL}/api/v3/supplies/{supply_id}/trbx/stickers",
-                    headers=self._headers,
                     params={"type": fmt},
                     json={"trbxIds": trbx_ids},
                 )
                 r.raise_for_status()
                 data = r.json() or {}
                 return data.get("stickers") or []
+        except MarketplaceBusy:
+            raise
         except Exception as e:
             logger.warning(
                 "wb_api_box_stickers_failed",
@@ -50,6 +50,21 @@ async def client(db_session):
     app.dependency_overrides.clear()
 
 
+@pytest.fixture()
+async def expiring_client(engine):
+    """Client whose requests get a fresh session with expire_on_commit=True, as in production."""
+    async_session = sessionmaker(engine, class_=AsyncSession)
+
+    async def override_get_db():
+        async with async_session() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
 @pytest.fixture()
 async def auth_headers(db_session):
     telegram_id = next(_telegram_id_counter)
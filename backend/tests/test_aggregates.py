@@ -0,0 +1,153 @@
+"""Tests for materialized company/order aggregates."""
+from sqlalchemy import select, update
+
+from app.db.models.company_stats import CompanyStats
+from app.db.models.order import Order
+from app.db.models.order_photo import OrderPhoto
+from app.db.models.product import Product
+from app.services.aggregates import open_orders_delta, reconcile_aggregates
+
+
+def test_open_orders_delta():
+    """Only transitions into or out of the closed status change orders_open."""
+    assert open_orders_delta("Принято", "Упаковка") == 0
+    assert open_orders_delta("Готово к отгрузке", "Завершено") == -1
+    assert open_orders_delta("Завершено", "Упаковка") == 1
+
+
+async def _stats(client, company_id, headers) -> dict:
+    response = await client.get(f"/api/v1/companies/{company_id}/stats", headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_company_stats_follow_order_lifecycle(client, auth_headers, warehouse_headers):
+    """Counters change on order creation, receiving, packing and completion."""
+    company_resp = await client.post("/api/v1/companies", json={"inn": "3334445550"}, headers=auth_headers)
+    company_id = company_resp.json()["id"]
+    product_resp = await client.post(
+        "/api/v1/products",
+        json={"company_id": company_id, "name": "Агрегат"},
+        headers=auth_headers,
+    )
+    product_id = product_resp.json()["id"]
+    order_resp = await client.post(
+        "/api/v1/orders",
+        json={"company_id": company_id, "items": [{"product_id": product_id, "planned_qty": 8}]},
+        headers=auth_headers,
+    )
+    order_id = order_resp.json()["id"]
+    stats = await _stats(client, company_id, auth_headers)
+    assert stats["products_total"] == 1
+    assert stats["orders_total"] == 1
+    assert stats["orders_open"] == 1
+    assert stats["orders_planned_qty"] == 8
+
+    order_item_id = (await client.get(f"/api/v1/orders/{order_id}/items", headers=auth_headers)).json()[0]["id"]
+    await client.post(
+        "/api/v1/warehouse/receiving/complete",
+        json={"order_id": order_id, "items": [{"order_item_id": order_item_id, "received_qty": 8, "defect_qty": 0}]},
+        headers=warehouse_headers,
+    )
+    await client.post(
+        "/api/v1/warehouse/packing/record",
+        json={
+            "order_id": order_id,
+            "order_item_id": order_item_id,
+            "product_id": product_id,
+            "employee_code": "EMP1",
+            "quantity": 3,
+        },
+        headers=warehouse_headers,
+    )
+    stats = await _stats(client, company_id, auth_headers)
+    assert stats["orders_received_qty"] == 8
+    assert stats["orders_packed_qty"] == 3
+    assert stats["stock_quantity"] == 5
+
+    await client.post(f"/api/v1/warehouse/order/{order_id}/complete", headers=warehouse_headers)
+    stats = await _stats(client, company_id, auth_headers)
+    assert stats["orders_open"] == 0
+
+
+async def test_partial_receiving_accumulates(client, auth_headers, warehouse_headers, db_session):
+    """Receiving an item in two parts adds received and defect quantities instead of overwriting them."""
+    company_resp = await client.post("/api/v1/companies", json={"inn": "6667778898"}, headers=auth_headers)
+    company_id = company_resp.json()["id"]
+    product_resp = await client.post(
+        "/api/v1/products",
+        json={"company_id": company_id, "name": "Частичная приёмка"},
+        headers=auth_headers,
+    )
+    product_id = product_resp.json()["id"]
+    order_resp = await client.post(
+        "/api/v1/orders",
+        json={"company_id": company_id, "items": [{"product_id": product_id, "planned_qty": 10}]},
+        headers=auth_headers,
+    )
+    order_id = order_resp.json()["id"]
+    order_item_id = (await client.get(f"/api/v1/orders/{order_id}/items", headers=auth_headers)).json()[0]["id"]
+    db_session.add(OrderPhoto(order_id=order_id, product_id=product_id, s3_key="defect.jpg", photo_type="defect"))
+    await db_session.commit()
+
+    for received, defect in ((6, 1), (4, 2)):
+        response = await client.post(
+            "/api/v1/warehouse/receiving/complete",
+            json={
+                "order_id": order_id,
+                "items": [{"order_item_id": order_item_id, "received_qty": received, "defect_qty": defect}],
+            },
+            headers=warehouse_headers,
+        )
+        assert response.status_code == 200
+
+    item = (await client.get(f"/api/v1/orders/{order_id}/items", headers=auth_headers)).json()[0]
+    assert (item["received_qty"], item["defect_qty"]) == (10, 3)
+    order_totals = await db_session.execute(select(Order.received_qty, Order.defect_qty).where(Order.id == order_id))
+    assert tuple(order_totals.one()) == (10, 3)
+    stats = await _stats(client, company_id, auth_headers)
+    assert stats["orders_received_qty"] == 10
+    assert stats["stock_quantity"] == 7
+    assert stats["defect_quantity"] == 3
+    assert stats["products_with_defects"] == 1
+
+    # Остаток меньше упакованного: списывается только остаток, товар не уходит в минус.
+    await db_session.execute(update(Product).where(Product.id == product_id).values(stock_quantity=2))
+    await db_session.commit()
+    response = await client.post(
+        "/api/v1/warehouse/packing/record",
+        json={
+            "order_id": order_id,
+            "order_item_id": order_item_id,
+            "product_id": product_id,
+            "employee_code": "EMP-PARTIAL",
+            "quantity": 3,
+        },
+        headers=warehouse_headers,
+    )
+    assert response.status_code == 200
+    stock = await db_session.execute(select(Product.stock_quantity).where(Product.id == product_id))
+    assert stock.scalar_one() == 0
+    assert (await _stats(client, company_id, auth_headers))["stock_quantity"] == 5
+
+
+async def test_reconcile_fixes_drifted_company_stats(client, auth_headers, db_session):
+    """Reconciliation restores counters from source rows."""
+    company_resp = await client.post("/api/v1/companies", json={"inn": "3334445551"}, headers=auth_headers)
+    company_id = company_resp.json()["id"]
+    await client.post(
+        "/api/v1/products",
+        json={"company_id": company_id, "name": "Сверка"},
+        headers=auth_headers,
+    )
+    await db_session.execute(
+        update(CompanyStats).where(CompanyStats.company_id == company_id).values(products_total=42, stock_quantity=7)
+    )
+    await db_session.commit()
+
+    fixed = await reconcile_aggregates(db_session)
+
+    assert fixed["companies_fixed"] >= 1
+    stats = await _stats(client, company_id, auth_headers)
+    assert stats["products_total"] == 1
+    assert stats["stock_quantity"] == 0
@@ -0,0 +1,118 @@
+"""Tests for in-memory barcode index."""
+from sqlalchemy import delete, update
+
+from app.core.config import settings
+from app.db.models.company import Company
+from app.db.models.product import Product
+from app.services.barcode_index import KIND_BOX, KIND_PRODUCT, BarcodeEntry, BarcodeIndex
+
+
+def _product(barcode: str, entity_id: int = 1) -> BarcodeEntry:
+    return BarcodeEntry(barcode=barcode, kind=KIND_PRODUCT, entity_id=entity_id, summary={"id": entity_id})
+
+
+def _box(barcode: str, entity_id: int = 1) -> BarcodeEntry:
+    return BarcodeEntry(barcode=barcode, kind=KIND_BOX, entity_id=entity_id, summary={"id": entity_id})
+
+
+def test_resolve_strips_whitespace():
+    """Lookup ignores surrounding whitespace from the scanner."""
+    index = BarcodeIndex()
+    index.put(_product("460123"))
+    assert index.resolve(" 460123 \n").entity_id == 1
+    assert index.resolve("000") is None
+
+
+def test_box_does_not_displace_product():
+    """Product barcode wins over a box with the same barcode."""
+    index = BarcodeIndex()
+    index.put(_product("SAME", entity_id=5))
+    index.put(_box("SAME", entity_id=7))
+    assert index.resolve("SAME").kind == KIND_PRODUCT
+    index.put(_product("OTHER", entity_id=6))
+    assert index.resolve("OTHER").entity_id == 6
+
+
+def test_discard_only_matching_entity():
+    """Discard is a no-op when the barcode was re-assigned to another entity."""
+    index = BarcodeIndex()
+    index.put(_product("X1", entity_id=1))
+    index.put(_product("X1", entity_id=2))
+    index.discard("X1", KIND_PRODUCT, 1)
+    assert index.resolve("X1").entity_id == 2
+    index.discard("X1", KIND_PRODUCT, 2)
+    assert index.resolve("X1") is None
+
+
+async def test_validate_after_barcode_change(client, auth_headers, warehouse_headers):
+    """Changing product barcode drops the old one from the index."""
+    company_resp = await client.post("/api/v1/companies", json={"inn": "2223334440"}, headers=auth_headers)
+    company_id = company_resp.json()["id"]
+    product_resp = await client.post(
+        "/api/v1/products",
+        json={"company_id": company_id, "name": "Смена ШК", "barcode": "IDX-OLD-1"},
+        headers=auth_headers,
+    )
+    product_id = product_resp.json()["id"]
+    await client.patch(f"/api/v1/products/{product_id}", json={"barcode": "IDX-NEW-1"}, headers=auth_headers)
+
+    old_resp = await client.post(
+        "/api/v1/warehouse/barcode/validate", json={"barcode": "IDX-OLD-1"}, headers=warehouse_headers
+    )
+    assert old_resp.json()["valid"] is False
+    new_resp = await client.post(
+        "/api/v1/warehouse/barcode/validate", json={"barcode": "IDX-NEW-1"}, headers=warehouse_headers
+    )
+    assert new_resp.json()["valid"] is True
+    assert new_resp.json()["product"]["id"] == product_id
+
+
+def test_index_is_lru_bounded():
+    index = BarcodeIndex(max_size=2)
+    index.put(_product("A", entity_id=1))
+    index.put(_product("B", entity_id=2))
+    index.put(_product("A", entity_id=1))
+    index.put(_product("C", entity_id=3))
+    assert index.resolve("B") is None
+    assert index.resolve("A").entity_id == 1 and index.resolve("C").entity_id == 3
+
+
+async def test_validate_trusts_fresh_hit(client, db_session, auth_headers, warehouse_headers, monkeypatch):
+    """A hit younger than the TTL is answered from memory, without reading the DB."""
+    monkeypatch.setattr(settings, "BARCODE_INDEX_TTL_SECONDS", 3600)
+    company_resp = await client.post("/api/v1/companies", json={"inn": "6667778907"}, headers=auth_headers)
+    await client.post(
+        "/api/v1/products",
+        json={"company_id": company_resp.json()["id"], "name": "Свежий ШК", "barcode": "IDX-FRESH-1"},
+        headers=auth_headers,
+    )
+    await db_session.execute(update(Product).where(Product.barcode == "IDX-FRESH-1").values(name="Другой воркер"))
+    await db_session.commit()
+    resp = await client.post("/api/v1/warehouse/barcode/validate", json={"barcode": "IDX-FRESH-1"}, headers=warehouse_headers)
+    assert resp.json()["product"]["name"] == "Свежий ШК"
+
+
+async def test_validate_rechecks_index_hit(client, db_session, auth_headers, warehouse_headers, monkeypatch):
+    """An expired hit is re-read from DB: changes made by another worker and deleted companies are seen."""
+    company_resp = await client.post("/api/v1/companies", json={"inn": "6667778897"}, headers=auth_headers)
+    company_id = company_resp.json()["id"]
+    for barcode in ("IDX-STALE-1", "IDX-STALE-2"):
+        await client.post(
+            "/api/v1/products",
+            json={"company_id": company_id, "name": "Кеш ШК", "barcode": barcode},
+            headers=auth_headers,
+        )
+        resp = await client.post("/api/v1/warehouse/barcode/validate", json={"barcode": barcode}, headers=warehouse_headers)
+        assert resp.json()["valid"] is True
+
+    # Другой воркер сменил ШК: индекс этого процесса об этом не знает, пока не истёк TTL.
+    monkeypatch.setattr(settings, "BARCODE_INDEX_TTL_SECONDS", 0)
+    await db_session.execute(update(Product).where(Product.barcode == "IDX-STALE-1").values(barcode="IDX-MOVED-1"))
+    await db_session.commit()
+    resp = await client.post("/api/v1/warehouse/barcode/validate", json={"barcode": "IDX-STALE-1"}, headers=warehouse_headers)
+    assert resp.json()["valid"] is False
+
+    await db_session.execute(delete(Company).where(Company.id == company_id))
+    await db_session.commit()
+    resp = await client.post("/api/v1/warehouse/barcode/validate", json={"barcode": "IDX-STALE-2"}, headers=warehouse_headers)
+    assert resp.json()["valid"] is False
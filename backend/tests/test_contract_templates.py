@@ -185,17 +185,17 @@ async def test_list_contract_templates(client, admin_headers):
 
 
 async def test_upload_contract_template(client, admin_headers, minimal_docx):
-    """Upload DOCX template with mocked S3; heavy work runs via to_thread."""
+    """Upload DOCX template with mocked S3; the upload runs in the S3 thread pool (S3Service.run)."""
     async def run_sync_in_mock(fn, *args, **kwargs):
         return fn(*args, **kwargs)
 
     with (
-        patch("app.api.v1.routes.admin.asyncio.to_thread", new_callable=AsyncMock) as mock_to_thread,
+        patch("app.api.v1.routes.admin.S3Service.run", new_callable=AsyncMock) as mock_run,
         patch("app.api.v1.routes.admin.upload_template_file") as mock_upload,
         patch("app.api.v1.routes.admin.head_check_upload", new_callable=AsyncMock) as mock_head,
     ):
         mock_upload.return_value = ("contract-templates/fake-key.docx", None)
-        mock_to_thread.side_effect = run_sync_in_mock
+        mock_run.side_effect = run_sync_in_mock
         mock_head.return_value = True
 
         response = await client.post(
@@ -210,7 +210,8 @@ async def test_upload_contract_template(client, admin_headers, minimal_docx):
         assert body["file_name"] == "template.docx"
         assert body["file_type"] == "docx"
         assert body["is_default"] is True
-        mock_to_thread.assert_called_once()
+        mock_run.assert_called_once()
+        assert mock_run.call_args[0][0] is mock_upload
         mock_upload.assert_called_once()
 
 
@@ -220,13 +221,13 @@ async def test_upload_head_check_failure_returns_503_and_deletes_files(client, a
         return fn(*args, **kwargs)
 
     with (
-        patch("app.api.v1.routes.admin.asyncio.to_thread", new_callable=AsyncMock) as mock_to_thread,
+        patch("app.api.v1.routes.admin.S3Service.run", new_callable=AsyncMock) as mock_run,
         patch("app.api.v1.routes.admin.upload_template_file") as mock_upload,
         patch("app.api.v1.routes.admin.head_check_upload", new_callable=AsyncMock) as mock_head,
         patch("app.api.v1.routes.admin.delete_template_files") as mock_delete,
     ):
         mock_upload.return_value = ("contract-templates/key.docx", None)
-        mock_to_thread.side_effect = run_sync_in_mock
+        mock_run.side_effect = run_sync_in_mock
         mock_head.return_value = False
 
         response = await client.post(
@@ -423,7 +424,10 @@ async def test_generate_contract_file_template_uses_to_thread(client, auth_heade
     with patch(
         "app.api.v1.routes.companies.render_contract_pdf_from_docx_template",
         return_value=fake_pdf,
-    ) as mock_render:
+    ) as mock_render, patch(
+        "app.api.v1.routes.companies.get_docx_bytes_for_template",
+        return_value=b"docx",
+    ) as mock_docx:
 
         response = await client.get(
             f"/api/v1/companies/{company.id}/contract",
@@ -433,3 +437,5 @@ async def test_generate_contract_file_template_uses_to_thread(client, auth_heade
         assert response.headers.get("content-type", "").startswith("application/pdf")
         assert response.content == fake_pdf
         mock_render.assert_called_once()
+        mock_docx.assert_called_once()
+        assert mock_render.call_args[0][0] == b"docx"
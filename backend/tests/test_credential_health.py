@@ -0,0 +1,115 @@
+"""Marketplace credential health cache: probe once per TTL, invalidation on key update."""
+from unittest.mock import AsyncMock, patch
+
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+from app.db.models.company_api_keys import CompanyAPIKeys, MarketplaceCredentialHealth
+from app.services import credential_health
+from app.services.credential_health import check_credentials, record_health, refresh_credential_health
+from app.services.wb_api import WildberriesAPI
+
+
+async def test_check_credentials_cached_until_keys_change(client, auth_headers, db_session):
+    company = await client.post("/api/v1/companies", json={"inn": "6667778888"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    put = await client.put(
+        f"/api/v1/companies/{company_id}/api-keys", json={"wb_api_key": "wb-key-1"}, headers=auth_headers
+    )
+    assert put.status_code == 200
+    api = WildberriesAPI(api_key="wb-key-1")
+
+    with patch.object(WildberriesAPI, "get_supplies", AsyncMock(return_value=[])) as probe:
+        assert await check_credentials(db_session, company_id, "wb", api) is True
+        await db_session.commit()
+        assert await check_credentials(db_session, company_id, "wb", api) is True
+        assert probe.await_count == 1
+
+        await client.put(
+            f"/api/v1/companies/{company_id}/api-keys", json={"wb_api_key": "wb-key-2"}, headers=auth_headers
+        )
+        count = await db_session.scalar(
+            select(func.count(MarketplaceCredentialHealth.id)).where(
+                MarketplaceCredentialHealth.company_id == company_id
+            )
+        )
+        assert count == 0
+        assert await check_credentials(db_session, company_id, "wb", api) is True
+        assert probe.await_count == 2
+
+
+async def test_check_credentials_records_failure(client, auth_headers, db_session):
+    company = await client.post("/api/v1/companies", json={"inn": "6667778889"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    api = WildberriesAPI(api_key="wb-bad")
+
+    with patch.object(WildberriesAPI, "get_supplies", AsyncMock(return_value=None)) as probe:
+        assert await check_credentials(db_session, company_id, "wb", api) is False
+        await db_session.commit()
+        assert await check_credentials(db_session, company_id, "wb", api) is False
+        assert probe.await_count == 1
+    health = await db_session.scalar(
+        select(MarketplaceCredentialHealth).where(MarketplaceCredentialHealth.company_id == company_id)
+    )
+    assert health.last_error is not None
+    assert health.last_failed_at is not None
+    assert health.last_ok_at is None
+
+
+async def test_result_for_old_keys_is_not_reused(client, auth_headers, db_session):
+    """A late probe of replaced keys neither counts as fresh nor overwrites the newer result."""
+    company = await client.post("/api/v1/companies", json={"inn": "6667778901"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    await client.put(f"/api/v1/companies/{company_id}/api-keys", json={"wb_api_key": "wb-v1"}, headers=auth_headers)
+    old_version = await db_session.scalar(
+        select(CompanyAPIKeys.updated_at).where(CompanyAPIKeys.company_id == company_id)
+    )
+    await client.put(f"/api/v1/companies/{company_id}/api-keys", json={"wb_api_key": "wb-v2"}, headers=auth_headers)
+    new_version = await db_session.scalar(
+        select(CompanyAPIKeys.updated_at)
+        .where(CompanyAPIKeys.company_id == company_id)
+        .execution_options(populate_existing=True)
+    )
+    assert new_version > old_version
+
+    # Фоновая проверка старого ключа закончилась после смены ключей.
+    await record_health(db_session, company_id, "wb", old_version, "bot blocked")
+    await db_session.commit()
+    api = WildberriesAPI(api_key="wb-v2")
+    with patch.object(WildberriesAPI, "get_supplies", AsyncMock(return_value=[])) as probe:
+        assert await check_credentials(db_session, company_id, "wb", api) is True
+        await db_session.commit()
+    assert probe.await_count == 1
+
+    await record_health(db_session, company_id, "wb", old_version - timedelta(seconds=1), "stale")
+    await db_session.commit()
+    health = await db_session.scalar(
+        select(MarketplaceCredentialHealth)
+        .where(MarketplaceCredentialHealth.company_id == company_id)
+        .execution_options(populate_existing=True)
+    )
+    assert health.last_error is None and health.keys_updated_at == new_version
+
+
+async def test_refresh_decrypts_only_due_credentials(client, auth_headers, db_session):
+    company = await client.post("/api/v1/companies", json={"inn": "6667778902"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    await client.put(f"/api/v1/companies/{company_id}/api-keys", json={"wb_api_key": "wb-refresh"}, headers=auth_headers)
+    decrypted: list[int] = []
+    real_clients = credential_health.marketplace_clients
+
+    def counting_clients(keys):
+        decrypted.append(keys.company_id)
+        return real_clients(keys)
+
+    with (
+        patch.object(credential_health, "marketplace_clients", side_effect=counting_clients),
+        patch.object(WildberriesAPI, "get_supplies", AsyncMock(return_value=[])),
+        patch("app.services.ozon_api.OzonAPI.list_supply_order_ids", AsyncMock(return_value=([], 0))),
+    ):
+        await refresh_credential_health(db_session)
+        assert company_id in decrypted
+        decrypted.clear()
+        await refresh_credential_health(db_session)
+    assert company_id not in decrypted
@@ -1,7 +1,7 @@
 """Tests for encryption helpers (API keys storage)."""
 from cryptography.fernet import Fernet
 
-from app.core.crypto import decrypt_value, encrypt_value
+from app.core.crypto import decrypt_value, encrypt_value, reencrypt_value
 
 
 def test_encrypt_decrypt_roundtrip():
@@ -65,3 +65,26 @@ def test_invalid_fernet_key_decrypt_returns_cipher():
     """When secret is not a valid Fernet key, decrypt returns cipher as-is."""
     cipher = "stored-value"
     assert decrypt_value(cipher, "not-a-valid-fernet-key") == cipher
+
+
+def test_multiple_keys_encrypt_with_first_decrypt_with_any():
+    """Comma-separated ENCRYPTION_KEY: new values use the first key, old ones still decrypt."""
+    old_key = Fernet.generate_key().decode()
+    new_key = Fernet.generate_key().decode()
+    old_cipher = encrypt_value("old-secret", old_key)
+    secret = f"{new_key},{old_key}"
+    assert decrypt_value(old_cipher, secret) == "old-secret"
+    assert decrypt_value(encrypt_value("new-secret", secret), new_key) == "new-secret"
+
+
+def test_reencrypt_value_moves_to_primary_key():
+    """Old-key tokens and plaintext are re-encrypted with the primary key; primary-key tokens are left alone."""
+    old_key = Fernet.generate_key().decode()
+    new_key = Fernet.generate_key().decode()
+    secret = f"{new_key},{old_key}"
+    rotated = reencrypt_value(encrypt_value("wb-key", old_key), secret)
+    assert decrypt_value(rotated, new_key) == "wb-key"
+    assert decrypt_value(reencrypt_value("legacy-plain", secret), new_key) == "legacy-plain"
+    assert reencrypt_value(encrypt_value("wb-key", secret), secret) is None
+    assert reencrypt_value(None, secret) is None
+    assert reencrypt_value(encrypt_value("wb-key", Fernet.generate_key().decode()), secret) is None
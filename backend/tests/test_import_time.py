@@ -0,0 +1,42 @@
+"""Cold start: import-time report for app.main with a budget and lazily imported heavy dependencies."""
+import subprocess
+import sys
+from pathlib import Path
+
+# Тяжёлые зависимости загружаются при первом использовании (Excel, PDF, S3, фото, LLM), не при старте воркера.
+LAZY_MODULES = ("pandas", "boto3", "botocore", "openai", "PIL", "weasyprint", "barcode", "docx", "docxtpl", "pdf2docx")
+IMPORT_BUDGET_SECONDS = 5.0
+REPORT_TOP = 15
+
+
+def _import_times() -> dict[str, tuple[int, int]]:
+    """module → (self, cumulative) microseconds from `python -X importtime -c "import app.main"`."""
+    backend_dir = Path(__file__).resolve().parents[1]
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=backend_dir,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if self_us.isdigit():
+            times[name] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def test_app_import_time_budget():
+    times = _import_times()
+    top = sorted(times.items(), key=lambda item: item[1][1], reverse=True)[:REPORT_TOP]
+    print("\nimport app.main — cumulative, ms:")
+    for name, (_, cumulative) in top:
+        print(f"  {cumulative / 1000:8.1f}  {name}")
+
+    eager = [name for name in times if name.split(".")[0] in LAZY_MODULES]
+    assert not eager, f"Тяжёлые модули импортируются при старте: {sorted(eager)[:10]}"
+    assert times["app.main"][1] / 1e6 < IMPORT_BUDGET_SECONDS
@@ -0,0 +1,96 @@
+"""Online encryption key rotation: batched re-encryption with a checkpoint, compare-and-set updates."""
+from cryptography.fernet import Fernet
+from sqlalchemy import func, select
+
+from app.core.crypto import decrypt_value, encrypt_value, key_fingerprint
+from app.db.models.company_api_keys import CompanyAPIKeys
+from app.db.models.maintenance_checkpoint import MaintenanceCheckpoint
+from app.services.key_rotation import (
+    CHECKPOINT_NAME,
+    _apply,
+    _write_checkpoint,
+    rotate_encryption_keys,
+    rotated_values,
+)
+
+
+async def _company_with_keys(client, auth_headers, db_session, inn: str, secret: str) -> CompanyAPIKeys:
+    company = await client.post("/api/v1/companies", json={"inn": inn}, headers=auth_headers)
+    keys = CompanyAPIKeys(
+        company_id=company.json()["id"],
+        wb_api_key=encrypt_value(f"wb-{inn}", secret),
+        ozon_client_id=encrypt_value(f"cid-{inn}", secret),
+        ozon_api_key=encrypt_value(f"ozon-{inn}", secret),
+    )
+    db_session.add(keys)
+    await db_session.commit()
+    return keys
+
+
+async def test_rotate_encryption_keys_in_batches(client, auth_headers, db_session):
+    old_key = Fernet.generate_key().decode()
+    new_key = Fernet.generate_key().decode()
+    secret = f"{new_key},{old_key}"
+    # Начинаем после строк других тестов: проход идёт с чекпоинта.
+    start_id = await db_session.scalar(select(func.coalesce(func.max(CompanyAPIKeys.id), 0)))
+    await _write_checkpoint(db_session, key_fingerprint(secret), start_id)
+    await db_session.commit()
+    rows = [
+        await _company_with_keys(client, auth_headers, db_session, inn, old_key)
+        for inn in ("6667778891", "6667778892", "6667778893")
+    ]
+
+    assert await rotate_encryption_keys(db_session, secret=secret, batch_size=2, max_batches=1) == 2
+    checkpoint = await db_session.get(MaintenanceCheckpoint, CHECKPOINT_NAME, populate_existing=True)
+    assert checkpoint.value == f"{key_fingerprint(secret)}:{rows[1].id}:1"  # в этом проходе были перешифровки
+
+    assert await rotate_encryption_keys(db_session, secret=secret, batch_size=2) == 1
+    for inn, row in zip(("6667778891", "6667778892", "6667778893"), rows):
+        await db_session.refresh(row)
+        assert decrypt_value(row.wb_api_key, new_key) == f"wb-{inn}"
+        assert decrypt_value(row.ozon_client_id, new_key) == f"cid-{inn}"
+        assert decrypt_value(row.ozon_api_key, new_key) == f"ozon-{inn}"
+    checkpoint = await db_session.get(MaintenanceCheckpoint, CHECKPOINT_NAME, populate_existing=True)
+    assert checkpoint.value.endswith(":0")
+
+    # Проход без перешифровок завершает ротацию для этого ключа: дальше таблица не читается.
+    # Первый полный проход с начала таблицы может перешифровать строки других тестов.
+    await rotate_encryption_keys(db_session, secret=secret)
+    assert await rotate_encryption_keys(db_session, secret=secret) == 0
+    checkpoint = await db_session.get(MaintenanceCheckpoint, CHECKPOINT_NAME, populate_existing=True)
+    assert checkpoint.value == f"{key_fingerprint(secret)}:done"
+    late = await _company_with_keys(client, auth_headers, db_session, "6667778904", old_key)
+    late_cipher = late.wb_api_key
+    assert await rotate_encryption_keys(db_session, secret=secret, batch_size=2) == 0
+    await db_session.refresh(late)
+    assert late.wb_api_key == late_cipher
+
+
+async def test_reencrypt_skips_concurrently_changed_row(client, auth_headers, db_session):
+    old_key = Fernet.generate_key().decode()
+    new_key = Fernet.generate_key().decode()
+    keys = await _company_with_keys(client, auth_headers, db_session, "6667778894", old_key)
+    stale = CompanyAPIKeys(
+        id=keys.id, wb_api_key=keys.wb_api_key, ozon_client_id=keys.ozon_client_id, ozon_api_key=keys.ozon_api_key
+    )
+    keys.wb_api_key = encrypt_value("wb-updated", new_key)
+    await db_session.commit()
+
+    assert await _apply(db_session, stale, rotated_values(stale, f"{new_key},{old_key}")) is False
+    await db_session.commit()
+    await db_session.refresh(keys)
+    assert decrypt_value(keys.wb_api_key, new_key) == "wb-updated"
+
+
+async def test_reencrypt_keeps_updated_at(client, auth_headers, db_session):
+    """Re-encryption is not a key change: cached clients and health results stay valid."""
+    old_key = Fernet.generate_key().decode()
+    new_key = Fernet.generate_key().decode()
+    keys = await _company_with_keys(client, auth_headers, db_session, "6667778905", old_key)
+    updated_at = keys.updated_at
+
+    assert await _apply(db_session, keys, rotated_values(keys, f"{new_key},{old_key}")) is True
+    await db_session.commit()
+    await db_session.refresh(keys)
+    assert decrypt_value(keys.ozon_api_key, new_key) == "ozon-6667778905"
+    assert keys.updated_at == updated_at
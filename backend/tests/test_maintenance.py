@@ -0,0 +1,101 @@
+"""Periodic maintenance: task runner metrics, batched purges, stale upload sweep."""
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from sqlalchemy import func, select
+
+from app.db.models.order_photo import OrderPhoto
+from app.db.models.session import Session
+from app.services import maintenance
+from app.services.maintenance import (
+    maintenance_runner,
+    purge_expired_sessions,
+    reconcile_aggregates_task,
+    sweep_stale_photo_uploads,
+)
+from app.services.periodic import PeriodicTask, TaskRunner
+
+
+async def test_task_runner_records_metrics():
+    async def ok() -> int:
+        return 3
+
+    async def broken() -> int:
+        raise RuntimeError("boom")
+
+    runner = TaskRunner(tasks=[PeriodicTask("ok", 60, ok), PeriodicTask("broken", 60, broken)])
+    assert await runner.run_once(runner.tasks[0]) == 3
+    assert await runner.run_once(runner.tasks[0]) == 3
+    assert await runner.run_once(runner.tasks[1]) is None
+
+    snapshot = {item["name"]: item for item in runner.snapshot()}
+    assert snapshot["ok"]["runs"] == 2
+    assert snapshot["ok"]["total_processed"] == 6
+    assert snapshot["ok"]["failures"] == 0
+    assert snapshot["broken"]["failures"] == 1
+    assert snapshot["broken"]["last_error"] == "boom"
+
+
+
+async def test_aggregates_reconciliation_is_leader_only_task(db_session):
+    """Reconciliation runs from the maintenance runner (leader only), not in every worker."""
+    [task] = [task for task in maintenance_runner.tasks if task.name == "reconcile_aggregates"]
+    assert task.leader_only
+    assert isinstance(await reconcile_aggregates_task(db_session), int)
+
+async def test_purge_expired_sessions_in_batches(db_session, auth_headers):
+    user_id = (await db_session.execute(select(Session.user_id).limit(1))).scalar_one()
+    expired = datetime.utcnow() - timedelta(hours=1)
+    db_session.add_all(
+        [Session(user_id=user_id, token=f"expired-{i}-{expired.timestamp()}", expires_at=expired) for i in range(5)]
+    )
+    await db_session.commit()
+
+    deleted = await purge_expired_sessions(db_session, batch_size=2)
+    assert deleted >= 5
+    remaining = await db_session.scalar(select(func.count(Session.id)).where(Session.expires_at <= datetime.utcnow()))
+    assert remaining == 0
+    assert await db_session.scalar(
+        select(func.count(Session.id)).where(Session.token == auth_headers["X-Session-Token"])
+    ) == 1
+
+
+async def test_sweep_stale_photo_uploads_keeps_confirmed(client, auth_headers, db_session, monkeypatch):
+    company = await client.post("/api/v1/companies", json={"inn": "6667778885"}, headers=auth_headers)
+    product = await client.post(
+        "/api/v1/products", json={"company_id": company.json()["id"], "name": "Фото"}, headers=auth_headers
+    )
+    order = await client.post(
+        "/api/v1/orders",
+        json={"company_id": company.json()["id"], "items": [{"product_id": product.json()["id"], "planned_qty": 1}]},
+        headers=auth_headers,
+    )
+    order_id = order.json()["id"]
+    confirmed = f"orders/{order_id}/{'a' * 32}.jpg"
+    orphan = f"orders/{order_id}/{'b' * 32}.jpg"
+    fresh = f"orders/{order_id}/{'c' * 32}.jpg"
+    db_session.add(OrderPhoto(order_id=order_id, s3_key=confirmed))
+    await db_session.commit()
+
+    old = datetime.now(timezone.utc) - timedelta(days=3)
+    pages = {
+        "orders/": [
+            {"Key": confirmed, "LastModified": old},
+            {"Key": orphan, "LastModified": old},
+            {"Key": fresh, "LastModified": datetime.now(timezone.utc)},
+            {"Key": f"orders/{order_id}/legacy.jpg", "LastModified": old},
+        ],
+        "products/": [],
+    }
+    s3 = MagicMock()
+    s3.list_objects_page.side_effect = lambda prefix, token, max_keys: (pages[prefix], None)
+
+    async def run(func, *args):
+        return func(*args)
+
+    s3.run = run
+    monkeypatch.setattr(maintenance, "_sweep_tokens", {})
+
+    removed = await sweep_stale_photo_uploads(db_session, s3)
+    assert removed == 1
+    s3.delete_objects.assert_called_once_with([orphan])
@@ -0,0 +1,67 @@
+"""Marketplace client cache: reused within the TTL, dropped on local key update, refetched when keys are rejected."""
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.crypto import encrypt_value
+from app.db.models.company_api_keys import CompanyAPIKeys
+from app.services.credential_health import check_credentials
+from app.services.marketplace_credentials import MarketplaceClientCache, marketplace_client_cache
+from app.services.wb_api import WildberriesAPI
+
+
+async def test_clients_cached_until_keys_updated(client, auth_headers, db_session):
+    company = await client.post("/api/v1/companies", json={"inn": "6667778890"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    await client.put(f"/api/v1/companies/{company_id}/api-keys", json={"wb_api_key": "wb-one"}, headers=auth_headers)
+
+    clients = await marketplace_client_cache.get(db_session, company_id)
+    assert isinstance(clients["wb"], WildberriesAPI)
+    assert clients["wb"].api_key == "wb-one"
+    assert "ozon" not in clients
+
+    # В пределах TTL — кеш, без запроса к БД, даже если ключи сменил другой воркер.
+    row = await db_session.scalar(select(CompanyAPIKeys).where(CompanyAPIKeys.company_id == company_id))
+    row.wb_api_key = encrypt_value("wb-direct", settings.ENCRYPTION_KEY or "")
+    await db_session.commit()
+    with patch.object(db_session, "execute", AsyncMock(side_effect=AssertionError("DB read on cache hit"))):
+        assert (await marketplace_client_cache.get(db_session, company_id)) is clients
+
+    # Смена ключей в этом процессе сбрасывает запись сразу.
+    await client.put(f"/api/v1/companies/{company_id}/api-keys", json={"wb_api_key": "wb-two"}, headers=auth_headers)
+    refreshed = await marketplace_client_cache.get(db_session, company_id)
+    assert refreshed["wb"].api_key == "wb-two"
+
+
+async def test_other_worker_cache_sees_key_update_after_ttl(client, auth_headers, db_session, monkeypatch):
+    company = await client.post("/api/v1/companies", json={"inn": "6667778903"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    await client.put(f"/api/v1/companies/{company_id}/api-keys", json={"wb_api_key": "wb-old"}, headers=auth_headers)
+    monkeypatch.setattr(settings, "MARKETPLACE_CLIENT_CACHE_TTL_SECONDS", 0.2)
+    other_worker = MarketplaceClientCache()
+    assert (await other_worker.get(db_session, company_id))["wb"].api_key == "wb-old"
+
+    await client.put(f"/api/v1/companies/{company_id}/api-keys", json={"wb_api_key": "wb-new"}, headers=auth_headers)
+    assert (await other_worker.get(db_session, company_id))["wb"].api_key == "wb-old"
+    await asyncio.sleep(0.25)
+    assert (await other_worker.get(db_session, company_id))["wb"].api_key == "wb-new"
+
+
+async def test_rejected_cached_keys_are_refetched(client, auth_headers, db_session):
+    """A failed probe with a stale cached client reloads the keys and checks the current ones."""
+    company = await client.post("/api/v1/companies", json={"inn": "6667778909"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    await client.put(f"/api/v1/companies/{company_id}/api-keys", json={"wb_api_key": "wb-stale"}, headers=auth_headers)
+    stale = (await marketplace_client_cache.get(db_session, company_id))["wb"]
+    row = await db_session.scalar(select(CompanyAPIKeys).where(CompanyAPIKeys.company_id == company_id))
+    row.wb_api_key = encrypt_value("wb-current", settings.ENCRYPTION_KEY or "")
+    await db_session.commit()
+
+    async def get_supplies(self, limit):
+        return [] if self.api_key == "wb-current" else None
+
+    with patch.object(WildberriesAPI, "get_supplies", get_supplies):
+        assert await check_credentials(db_session, company_id, "wb", stale.interactive()) is True
+    assert (await marketplace_client_cache.get(db_session, company_id))["wb"].api_key == "wb-current"
@@ -0,0 +1,108 @@
+"""Outbound marketplace limiter: per-key buckets, 429 Retry-After, retries only where safe."""
+import time
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.services.marketplace_limiter import MarketplaceBusy, MarketplaceLimiter, TokenBucket, retry_after_seconds
+from app.services.wb_api import WildberriesAPI
+
+
+def _responses(*items):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        item = items[len(calls) - 1]
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    return call, calls
+
+
+async def test_retries_429_after_retry_after(monkeypatch):
+    monkeypatch.setattr(settings, "MARKETPLACE_RETRY_BASE_SECONDS", 0.01)
+    limiter = MarketplaceLimiter()
+    call, calls = _responses(httpx.Response(429, headers={"Retry-After": "0"}), httpx.Response(200))
+
+    response = await limiter.send("wb", "key-a", "supplies", call, idempotent=False)
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+
+async def test_server_errors_retried_only_for_idempotent(monkeypatch):
+    monkeypatch.setattr(settings, "MARKETPLACE_RETRY_BASE_SECONDS", 0.01)
+    limiter = MarketplaceLimiter()
+    call, calls = _responses(httpx.Response(502), httpx.Response(200))
+    assert (await limiter.send("wb", "key-b", "supplies", call)).status_code == 200
+    assert len(calls) == 2
+
+    call, calls = _responses(httpx.Response(502), httpx.Response(200))
+    assert (await limiter.send("wb", "key-b", "supplies_write", call, idempotent=False)).status_code == 502
+    assert len(calls) == 1
+
+    call, calls = _responses(httpx.ConnectError("down"))
+    with pytest.raises(httpx.ConnectError):
+        await limiter.send("wb", "key-b", "supplies_write", call, idempotent=False)
+
+
+async def test_buckets_are_per_credential():
+    limiter = MarketplaceLimiter()
+    blocked = limiter.bucket("wb", "key-c", "supplies")
+    blocked.block_for(30)
+    other = limiter.bucket("wb", "key-d", "supplies")
+    assert other is not blocked
+    started = time.monotonic()
+    await other.acquire()
+    assert time.monotonic() - started < 0.1
+    assert limiter.bucket("wb", "key-c", "supplies") is blocked
+
+
+async def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    started = time.monotonic()
+    for _ in range(4):
+        await bucket.acquire()
+    assert time.monotonic() - started >= 0.05
+
+
+async def test_call_budget_fails_fast():
+    """Waits that do not fit the call budget raise MarketplaceBusy instead of sleeping."""
+    limiter = MarketplaceLimiter()
+    limiter.bucket("wb", "key-e", "supplies").block_for(30)
+    call, calls = _responses(httpx.Response(200))
+    started = time.monotonic()
+    with pytest.raises(MarketplaceBusy) as busy:
+        await limiter.send("wb", "key-e", "supplies", call, budget=1)
+    assert busy.value.retry_after > 25
+    assert calls == [] and time.monotonic() - started < 0.1
+
+    call, calls = _responses(httpx.Response(429, headers={"Retry-After": "30"}), httpx.Response(200))
+    with pytest.raises(MarketplaceBusy):
+        await limiter.send("wb", "key-f", "supplies", call, budget=1)
+    assert len(calls) == 1
+    assert limiter.bucket("wb", "key-f", "supplies").blocked_until > time.monotonic()
+
+
+async def test_server_error_retry_stops_at_budget(monkeypatch):
+    monkeypatch.setattr(settings, "MARKETPLACE_RETRY_BASE_SECONDS", 10)
+    limiter = MarketplaceLimiter()
+    call, calls = _responses(httpx.Response(503), httpx.Response(200))
+    assert (await limiter.send("wb", "key-g", "supplies", call, budget=1)).status_code == 503
+    assert len(calls) == 1
+
+
+async def test_interactive_client_uses_short_budget(monkeypatch):
+    monkeypatch.setattr(settings, "MARKETPLACE_INTERACTIVE_BUDGET_SECONDS", 2.5)
+    api = WildberriesAPI(api_key="key-h")
+    interactive = api.interactive()
+    assert interactive.budget == 2.5 and interactive.api_key == "key-h"
+    assert api.budget is None
+
+
+def test_retry_after_headers():
+    assert retry_after_seconds(httpx.Response(429, headers={"X-Ratelimit-Retry": "3"})) == 3
+    assert retry_after_seconds(httpx.Response(429, headers={"Retry-After": "7"})) == 7
+    assert retry_after_seconds(httpx.Response(429)) is None
@@ -0,0 +1,177 @@
+"""Notification outbox: handlers enqueue, dispatcher coalesces, retries and rate-limits."""
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.models.notification_outbox import NotificationOutbox
+from app.services import notifications
+from app.services.notifications import (
+    TELEGRAM_TEXT_LIMIT,
+    ChatRateLimiter,
+    _merge_texts,
+    dispatch_notifications,
+    enqueue_notification,
+)
+from app.services.telegram import TelegramSendResult
+
+
+async def test_order_events_enqueued_and_coalesced(client, auth_headers, warehouse_headers, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_BOT_TOKEN", "token")
+    company = await client.post("/api/v1/companies", json={"inn": "6667778883"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    product = await client.post(
+        "/api/v1/products", json={"company_id": company_id, "name": "Уведомление"}, headers=auth_headers
+    )
+    order = await client.post(
+        "/api/v1/orders",
+        json={"company_id": company_id, "items": [{"product_id": product.json()["id"], "planned_qty": 2}]},
+        headers=auth_headers,
+    )
+    order_id = order.json()["id"]
+    items = await client.get(f"/api/v1/orders/{order_id}/items", headers=auth_headers)
+
+    with patch("app.services.telegram.post_message", new_callable=AsyncMock) as mock_post:
+        received = await client.post(
+            "/api/v1/warehouse/receiving/complete",
+            json={
+                "order_id": order_id,
+                "items": [{"order_item_id": items.json()[0]["id"], "received_qty": 2, "defect_qty": 0}],
+            },
+            headers=warehouse_headers,
+        )
+        completed = await client.post(f"/api/v1/warehouse/order/{order_id}/complete", headers=warehouse_headers)
+    assert received.status_code == 200 and completed.status_code == 200
+    mock_post.assert_not_called()  # обработчики только ставят в очередь
+
+    rows = (
+        await db_session.execute(select(NotificationOutbox).where(NotificationOutbox.coalesce_key == f"order:{order_id}"))
+    ).scalars().all()
+    assert len(rows) == 2 and {row.status for row in rows} == {"pending"}
+    chat_id = rows[0].chat_id
+
+    with patch(
+        "app.services.notifications.post_message",
+        new_callable=AsyncMock,
+        return_value=TelegramSendResult(ok=True),
+    ) as mock_post:
+        await dispatch_notifications(db_session, client=None, limiter=ChatRateLimiter(1000, 0))
+    calls = [call for call in mock_post.call_args_list if call.args[1] == chat_id]
+    assert len(calls) == 1
+    text = calls[0].args[2]
+    assert "принята на склад" in text and "Завершено" in text
+    for row in rows:
+        await db_session.refresh(row)
+        assert row.status == "sent"
+
+
+async def test_dispatch_retries_and_fails_permanently(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_BOT_TOKEN", "token")
+    enqueue_notification(db_session, 990001, "повтор")
+    enqueue_notification(db_session, 990002, "заблокирован")
+    await db_session.commit()
+
+    def result_for(client, chat_id, text, parse_mode=None):
+        if chat_id == 990001:
+            return TelegramSendResult(ok=False, retry_after=30, error="Too Many Requests")
+        if chat_id == 990002:
+            return TelegramSendResult(ok=False, permanent=True, error="bot was blocked")
+        return TelegramSendResult(ok=True)
+
+    limiter = ChatRateLimiter(1000, 0)
+    with patch("app.services.notifications.post_message", new_callable=AsyncMock, side_effect=result_for):
+        await dispatch_notifications(db_session, client=None, limiter=limiter)
+    rows = {
+        row.chat_id: row
+        for row in (
+            await db_session.execute(select(NotificationOutbox).where(NotificationOutbox.chat_id.in_((990001, 990002))))
+        ).scalars().all()
+    }
+    assert rows[990001].status == "pending" and rows[990001].attempts == 1
+    assert rows[990001].next_attempt_at > datetime.utcnow()
+    assert limiter.chat_delay(990001) > 0
+    assert rows[990002].status == "failed"
+
+
+async def test_dispatch_without_token_keeps_rows_pending(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_BOT_TOKEN", "")
+    enqueue_notification(db_session, 990003, "нет токена")
+    await db_session.commit()
+
+    with patch("app.services.notifications.post_message", new_callable=AsyncMock) as mock_post:
+        result = await dispatch_notifications(db_session, client=None, limiter=ChatRateLimiter(1000, 0))
+    mock_post.assert_not_called()
+    assert result["claimed"] == 0
+    row = (await db_session.execute(select(NotificationOutbox).where(NotificationOutbox.chat_id == 990003))).scalar_one()
+    assert row.status == "pending" and row.attempts == 0
+
+
+async def test_dispatch_sends_outside_claim_transaction(db_session, monkeypatch):
+    """Rows are claimed and committed as sending before Telegram is called."""
+    monkeypatch.setattr(settings, "TELEGRAM_BOT_TOKEN", "token")
+    enqueue_notification(db_session, 990004, "захват")
+    await db_session.commit()
+    seen: list[tuple[str, bool]] = []
+
+    async def post(client, chat_id, text, parse_mode=None):
+        if chat_id == 990004:
+            row = (
+                await db_session.execute(select(NotificationOutbox).where(NotificationOutbox.chat_id == 990004))
+            ).scalar_one()
+            seen.append((row.status, db_session.in_transaction()))
+        return TelegramSendResult(ok=True)
+
+    with patch("app.services.notifications.post_message", side_effect=post):
+        await dispatch_notifications(db_session, client=None, limiter=ChatRateLimiter(1000, 0))
+    assert seen and seen[0][0] == "sending"
+    row = (await db_session.execute(select(NotificationOutbox).where(NotificationOutbox.chat_id == 990004))).scalar_one()
+    assert row.status == "sent"
+
+
+
+async def test_dispatcher_sends_only_as_leader(monkeypatch):
+    """Workers that are not the leader never claim rows: Telegram limits stay per deployment."""
+    released = []
+
+    class NotLeader:
+        def __init__(self, name):
+            assert name == "notification_dispatcher"
+
+        async def acquire(self):
+            return False
+
+        async def release(self):
+            released.append(1)
+
+    monkeypatch.setattr(notifications, "LeaderLock", NotLeader)
+    dispatch = AsyncMock()
+    monkeypatch.setattr(notifications, "dispatch_notifications", dispatch)
+    task = asyncio.create_task(notifications.run_notification_dispatcher(interval_seconds=0.01))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    dispatch.assert_not_called()
+    assert released == [1]
+
+def test_merge_texts_splits_between_events():
+    event = "<b>Заявка</b> " + "x" * 1500
+    messages = _merge_texts([(1, event), (2, event), (3, event + "1"), (4, event + "2"), (5, event + "3")])
+    assert [ids for _, ids in messages] == [[1, 2, 3], [4, 5]]
+    assert all(len(text) <= TELEGRAM_TEXT_LIMIT for text, _ in messages)
+    assert messages[1][0] == f"{event}2\n{event}3"  # события не разрезаны посередине тега
+
+    long_event = "\n".join(["<i>строка</i>"] * 600)
+    parts = _merge_texts([(7, long_event)])
+    assert all(len(text) <= TELEGRAM_TEXT_LIMIT for text, _ in parts)
+    assert all(text.startswith("<i>") and text.endswith("</i>") for text, _ in parts)
+    assert parts[-1][1] == [7]
+
+
+async def test_notification_queue_stats(client, admin_headers):
+    response = await client.get("/api/v1/admin/notifications/stats", headers=admin_headers)
+    assert response.status_code == 200
+    assert set(response.json()) == {"pending", "failed", "oldest_pending_seconds"}
@@ -0,0 +1,56 @@
+"""Daily order numbers: atomic block reservation, existing "Заявка dd/mm/yy №N" format."""
+from datetime import date, datetime
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+from app.services import order_numbers
+from app.services.order_numbers import allocate_order_numbers
+
+
+async def test_allocate_order_numbers_sequential_blocks(db_session):
+    moment = datetime(2031, 1, 2, 9, 30)
+    day = date(2031, 1, 2)
+    assert await allocate_order_numbers(db_session, moment=moment, day=day) == ["Заявка 02/01/31 №1"]
+    assert await allocate_order_numbers(db_session, count=3, moment=moment, day=day) == [
+        "Заявка 02/01/31 №2",
+        "Заявка 02/01/31 №3",
+        "Заявка 02/01/31 №4",
+    ]
+    assert await allocate_order_numbers(db_session, moment=datetime(2031, 1, 3), day=date(2031, 1, 3)) == [
+        "Заявка 03/01/31 №1"
+    ]
+    await db_session.commit()
+
+
+async def test_postgres_reserves_in_counter_session(monkeypatch):
+    """On PostgreSQL the upsert runs and commits in the counter pool's session, not the caller's."""
+    pg_bind = SimpleNamespace(dialect=postgresql.dialect())
+    executed, commits = [], []
+
+    class CounterSession:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        def get_bind(self):
+            return pg_bind
+
+        async def execute(self, stmt):
+            executed.append(stmt)
+            return SimpleNamespace(scalar_one=lambda: 7)
+
+        async def commit(self):
+            commits.append(1)
+
+    monkeypatch.setattr(order_numbers, "CounterSessionLocal", CounterSession)
+    caller = SimpleNamespace(get_bind=lambda: pg_bind)
+
+    numbers = await allocate_order_numbers(caller, count=2, moment=datetime(2031, 2, 1), day=date(2031, 2, 1))
+    assert numbers == ["Заявка 01/02/31 №6", "Заявка 01/02/31 №7"]
+    assert commits == [1]
+    sql = str(executed[0].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (counter_date) DO UPDATE" in sql
+    assert "RETURNING order_counters.value" in sql
@@ -1,4 +1,5 @@
 """Orders tests."""
+from app.schemas.order import OrderItemOut, OrderOut
 
 
 async def test_create_order(client, auth_headers):
@@ -16,3 +17,72 @@ async def test_create_order(client, auth_headers):
     assert response.status_code == 200
     data = response.json()
     assert data["company_id"] == company_id
+
+
+async def test_create_orders_batch(expiring_client, auth_headers):
+    """Runs with production-like sessions: the response must not read orders expired by commit."""
+    client = expiring_client
+    company = await client.post("/api/v1/companies", json={"inn": "6667778895"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    product = await client.post(
+        "/api/v1/products",
+        json={"company_id": company_id, "name": "Носки"},
+        headers=auth_headers,
+    )
+    product_id = product.json()["id"]
+
+    payload = {
+        "orders": [
+            {"company_id": company_id, "destination": "Коледино", "items": [{"product_id": product_id, "planned_qty": 5}]},
+            {"company_id": company_id, "items": [{"product_id": 999999, "planned_qty": 1}]},
+            {"company_id": company_id, "destination": "Казань", "items": [{"product_id": product_id, "planned_qty": 7}]},
+        ]
+    }
+    response = await client.post("/api/v1/orders/batch", json=payload, headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 2
+    first, skipped, last = data["results"]
+    assert first["order"]["planned_qty"] == 5
+    assert first["order"]["destination"] == "Коледино"
+    assert skipped["order"] is None
+    assert skipped["error"] == "Один или несколько товаров не найдены"
+    assert last["order"]["planned_qty"] == 7
+    first_number = int(first["order"]["order_number"].rsplit("№", 1)[1])
+    assert last["order"]["order_number"].endswith(f"№{first_number + 1}")
+
+    detail = await client.get(f"/api/v1/orders/{last['order']['id']}/items", headers=auth_headers)
+    assert detail.status_code == 200
+    assert [item["planned_qty"] for item in detail.json()] == [7]
+
+
+async def test_list_orders_rows_match_schema(client, auth_headers):
+    company = await client.post("/api/v1/companies", json={"inn": "6667778896"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    product = await client.post(
+        "/api/v1/products",
+        json={"company_id": company_id, "name": "Шарфы", "barcode": "4600000000961"},
+        headers=auth_headers,
+    )
+    product_id = product.json()["id"]
+    order = await client.post(
+        "/api/v1/orders",
+        json={"company_id": company_id, "items": [{"product_id": product_id, "planned_qty": 3}]},
+        headers=auth_headers,
+    )
+    order_id = order.json()["id"]
+
+    listing = await client.get(f"/api/v1/orders?company_id={company_id}", headers=auth_headers)
+    assert listing.status_code == 200
+    data = listing.json()
+    assert data["total"] == 1
+    assert set(data["items"][0]) == set(OrderOut.model_fields)
+    assert data["items"][0]["photo_count"] == 0
+
+    items = await client.get(f"/api/v1/orders/{order_id}/items", headers=auth_headers)
+    assert items.status_code == 200
+    [item] = items.json()
+    assert set(item) == set(OrderItemOut.model_fields)
+    assert item["product_name"] == "Шарфы"
+    assert item["barcode"] == "4600000000961"
+    assert item["planned_qty"] == 3
@@ -0,0 +1,55 @@
+"""Tests for keyset (cursor) pagination."""
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from app.api.v1.pagination import decode_cursor, encode_cursor
+from app.api.v1.responses import FastJSONResponse
+
+
+def test_cursor_roundtrip():
+    """Cursor encodes created_at and id losslessly."""
+    created_at = datetime(2026, 1, 2, 3, 4, 5, 678901)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+
+async def test_products_cursor_pages_do_not_overlap(client, auth_headers):
+    """Walking next_cursor returns every product exactly once, newest first."""
+    company_resp = await client.post("/api/v1/companies", json={"inn": "4445556660"}, headers=auth_headers)
+    company_id = company_resp.json()["id"]
+    created_ids = []
+    for index in range(5):
+        product_resp = await client.post(
+            "/api/v1/products",
+            json={"company_id": company_id, "name": f"Курсор {index}"},
+            headers=auth_headers,
+        )
+        created_ids.append(product_resp.json()["id"])
+
+    first = (await client.get(f"/api/v1/products?company_id={company_id}&limit=2", headers=auth_headers)).json()
+    assert first["total"] == 5
+    seen = [item["id"] for item in first["items"]]
+    cursor = first["next_cursor"]
+    while cursor:
+        page = (
+            await client.get(
+                f"/api/v1/products?company_id={company_id}&limit=2&cursor={cursor}", headers=auth_headers
+            )
+        ).json()
+        assert "total" not in page and "page" not in page
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+    assert seen == list(reversed(created_ids))
+
+
+async def test_orders_invalid_cursor(client, auth_headers):
+    """Malformed cursor is rejected with 400."""
+    company_resp = await client.post("/api/v1/companies", json={"inn": "4445556661"}, headers=auth_headers)
+    company_id = company_resp.json()["id"]
+    response = await client.get(f"/api/v1/orders?company_id={company_id}&cursor=not-a-cursor", headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_fast_json_response_renders_decimal_and_datetime():
+    body = FastJSONResponse({"price": Decimal("10.50"), "at": datetime(2026, 1, 2, 3, 4, 5)}).body
+    assert json.loads(body) == {"price": "10.50", "at": "2026-01-02T03:04:05"}
@@ -0,0 +1,220 @@
+"""Direct-to-S3 photo uploads: presigned POST and confirm."""
+from unittest.mock import patch
+
+from io import BytesIO
+
+from PIL import Image
+
+from app.services.photos import build_variants, is_photo_key, variant_key
+
+
+def test_is_photo_key_checks_prefix_and_name():
+    assert is_photo_key("orders/5/" + "a" * 32 + ".jpg", "orders/5")
+    assert not is_photo_key("orders/6/" + "a" * 32 + ".jpg", "orders/5")
+    assert not is_photo_key("orders/5/../6/" + "a" * 32 + ".jpg", "orders/5")
+    assert not is_photo_key("orders/5/photo.jpg", "orders/5")
+
+
+def test_build_variants_sizes_and_keys():
+    source = BytesIO()
+    Image.new("RGB", (3000, 2000), "red").save(source, format="JPEG")
+    variants = {variant.name: variant for variant in build_variants(source.getvalue())}
+
+    assert set(variants) == {"full", "medium", "thumb"}
+    assert variants["full"].content_type == "image/jpeg"
+    assert Image.open(BytesIO(variants["full"].data)).size == (1200, 800)
+    assert Image.open(BytesIO(variants["medium"].data)).size == (800, 533)
+    thumb = Image.open(BytesIO(variants["thumb"].data))
+    assert max(thumb.size) == 320 and thumb.format == "WEBP"
+    assert variant_key("orders/1/abc.jpg", variants["full"]) == "orders/1/abc.jpg"
+    assert variant_key("orders/1/abc.jpg", variants["thumb"]) == "orders/1/abc_thumb.webp"
+    assert variant_key("orders/1/abc.png", variants["full"]) == "orders/1/abc_full.jpg"
+
+
+async def test_product_photo_presigned_upload_and_confirm(client, auth_headers):
+    company = await client.post("/api/v1/companies", json={"inn": "6667778881"}, headers=auth_headers)
+    product = await client.post(
+        "/api/v1/products",
+        json={"company_id": company.json()["id"], "name": "Фото"},
+        headers=auth_headers,
+    )
+    product_id = product.json()["id"]
+
+    presigned = {"url": "https://s3.test/bucket", "fields": {"key": "k", "policy": "p"}}
+    with patch("app.services.s3.S3Service.presigned_post", return_value=presigned) as mock_presign:
+        bad = await client.post(
+            f"/api/v1/products/{product_id}/photo/upload-url",
+            json={"content_type": "application/pdf"},
+            headers=auth_headers,
+        )
+        response = await client.post(
+            f"/api/v1/products/{product_id}/photo/upload-url",
+            json={"content_type": "image/png"},
+            headers=auth_headers,
+        )
+    assert bad.status_code == 400
+    assert response.status_code == 200
+    ticket = response.json()
+    assert ticket["url"] == "https://s3.test/bucket"
+    assert ticket["key"].startswith(f"products/{product_id}/") and ticket["key"].endswith(".png")
+    key, content_type, max_size, _ = mock_presign.call_args[0]
+    assert key == ticket["key"] and content_type == "image/png" and max_size == ticket["max_size"]
+
+    head = {"ContentType": "image/png", "ContentLength": 1024}
+    with patch("app.services.s3.S3Service.head_object", return_value=None):
+        missing = await client.post(
+            f"/api/v1/products/{product_id}/photo/confirm", json={"key": ticket["key"]}, headers=auth_headers
+        )
+    assert missing.status_code == 400
+
+    with patch("app.services.s3.S3Service.head_object", return_value={**head, "ContentType": "image/jpeg"}):
+        mismatched = await client.post(
+            f"/api/v1/products/{product_id}/photo/confirm", json={"key": ticket["key"]}, headers=auth_headers
+        )
+    assert mismatched.status_code == 400
+
+    with (
+        patch("app.services.s3.S3Service.head_object", return_value=head),
+        patch("app.api.v1.routes.products.process_uploaded_photo") as mock_normalize,
+    ):
+        foreign = await client.post(
+            f"/api/v1/products/{product_id}/photo/confirm",
+            json={"key": "products/999999/" + "b" * 32 + ".jpg"},
+            headers=auth_headers,
+        )
+        confirmed = await client.post(
+            f"/api/v1/products/{product_id}/photo/confirm", json={"key": ticket["key"]}, headers=auth_headers
+        )
+        repeated = await client.post(
+            f"/api/v1/products/{product_id}/photo/confirm", json={"key": ticket["key"]}, headers=auth_headers
+        )
+    assert foreign.status_code == 400
+    assert confirmed.status_code == 200
+    assert repeated.status_code == 200
+    mock_normalize.assert_called_once()
+    assert mock_normalize.call_args[0][3] == ticket["key"]
+
+
+async def test_order_photo_confirm_registers_photo(client, auth_headers):
+    company = await client.post("/api/v1/companies", json={"inn": "6667778882"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    product = await client.post(
+        "/api/v1/products", json={"company_id": company_id, "name": "Коробка"}, headers=auth_headers
+    )
+    product_id = product.json()["id"]
+    order = await client.post(
+        "/api/v1/orders",
+        json={"company_id": company_id, "items": [{"product_id": product_id, "planned_qty": 3}]},
+        headers=auth_headers,
+    )
+    order_id = order.json()["id"]
+    key = f"orders/{order_id}/" + "c" * 32 + ".jpg"
+    head = {"ContentType": "image/jpeg", "ContentLength": 2048}
+
+    with (
+        patch("app.services.s3.S3Service.head_object", return_value=head),
+        patch("app.api.v1.routes.orders.process_uploaded_photo") as mock_normalize,
+    ):
+        wrong_product = await client.post(
+            f"/api/v1/orders/{order_id}/photo/confirm",
+            json={"key": key, "product_id": product_id + 1000},
+            headers=auth_headers,
+        )
+        wrong_type = await client.post(
+            f"/api/v1/orders/{order_id}/photo/confirm",
+            json={"key": key, "photo_type": "selfie"},
+            headers=auth_headers,
+        )
+        response = await client.post(
+            f"/api/v1/orders/{order_id}/photo/confirm",
+            json={"key": key, "photo_type": "order", "product_id": product_id},
+            headers=auth_headers,
+        )
+    assert wrong_product.status_code == 400
+    assert wrong_type.status_code == 422
+    assert response.status_code == 200
+    mock_normalize.assert_called_once()
+
+    photos = await client.get(f"/api/v1/orders/{order_id}/photos", headers=auth_headers)
+    assert [(p["s3_key"], p["photo_type"], p["product_id"]) for p in photos.json()] == [(key, "order", product_id)]
+    # Пока варианты не построены — thumb_url указывает на само фото.
+    assert photos.json()[0]["thumb_url"] == photos.json()[0]["url"]
+
+
+async def test_photo_confirm_with_expiring_session(expiring_client, auth_headers):
+    """Confirm reads the new photo id before commit: production sessions expire attributes on commit."""
+    client = expiring_client
+    company = await client.post("/api/v1/companies", json={"inn": "6667778899"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    product = await client.post(
+        "/api/v1/products", json={"company_id": company_id, "name": "Истекающая сессия"}, headers=auth_headers
+    )
+    product_id = product.json()["id"]
+    order = await client.post(
+        "/api/v1/orders",
+        json={"company_id": company_id, "items": [{"product_id": product_id, "planned_qty": 1}]},
+        headers=auth_headers,
+    )
+    order_id = order.json()["id"]
+    product_key = f"products/{product_id}/" + "d" * 32 + ".jpg"
+    order_key = f"orders/{order_id}/" + "e" * 32 + ".jpg"
+    head = {"ContentType": "image/jpeg", "ContentLength": 2048}
+
+    with (
+        patch("app.services.s3.S3Service.head_object", return_value=head),
+        patch("app.api.v1.routes.products.process_uploaded_photo") as mock_product_task,
+        patch("app.api.v1.routes.orders.process_uploaded_photo") as mock_order_task,
+    ):
+        product_resp = await client.post(
+            f"/api/v1/products/{product_id}/photo/confirm", json={"key": product_key}, headers=auth_headers
+        )
+        order_resp = await client.post(
+            f"/api/v1/orders/{order_id}/photo/confirm", json={"key": order_key}, headers=auth_headers
+        )
+    assert product_resp.status_code == 200
+    assert order_resp.status_code == 200
+    assert isinstance(mock_product_task.call_args[0][2], int)
+    assert isinstance(mock_order_task.call_args[0][2], int)
+
+
+async def test_legacy_order_photo_upload_png(client, auth_headers):
+    """Multipart upload of a .png stores the full JPEG at the photo key and checks that key."""
+    company = await client.post("/api/v1/companies", json={"inn": "6667778906"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    product = await client.post(
+        "/api/v1/products", json={"company_id": company_id, "name": "PNG"}, headers=auth_headers
+    )
+    order = await client.post(
+        "/api/v1/orders",
+        json={"company_id": company_id, "items": [{"product_id": product.json()["id"], "planned_qty": 1}]},
+        headers=auth_headers,
+    )
+    order_id = order.json()["id"]
+    source = BytesIO()
+    Image.new("RGB", (40, 30), "blue").save(source, format="PNG")
+
+    uploaded: dict[str, str] = {}
+
+    async def upload(self, key, data, content_type):
+        uploaded[key] = content_type
+        return key
+
+    async def head_check(self, url):
+        return any(url.endswith(key) for key in uploaded)
+
+    with (
+        patch("app.services.s3.S3Service.upload_bytes_async", upload),
+        patch("app.services.s3.S3Service.head_check", head_check),
+        patch("app.services.s3.S3Service.build_public_url", lambda self, key: f"https://cdn.test/{key}"),
+    ):
+        response = await client.post(
+            f"/api/v1/orders/{order_id}/photo",
+            files={"file": ("Label.PNG", source.getvalue(), "image/png")},
+            headers=auth_headers,
+        )
+    assert response.status_code == 200
+    key = response.json()["key"]
+    assert key.startswith(f"orders/{order_id}/") and key.endswith("_Label.jpg")
+    assert uploaded[key] == "image/jpeg"
+    photos = await client.get(f"/api/v1/orders/{order_id}/photos", headers=auth_headers)
+    assert photos.json()[0]["s3_key"] == key
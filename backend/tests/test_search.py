@@ -0,0 +1,69 @@
+"""Tests for normalized product/user search."""
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.db.models.product import Product
+from app.db.search_text import normalize_search_text
+from app.services.search import build_search
+
+
+def test_normalize_search_text():
+    """Lowercase, ё → е, collapsed whitespace, empty parts skipped."""
+    assert normalize_search_text("  Ёлка  ЗЕЛЁНАЯ ", None, "", "WB-1") == "елка зеленая wb-1"
+
+
+def test_postgres_search_uses_trigram_operator():
+    """On PostgreSQL the clause adds fuzzy word_similarity matching."""
+    clause = build_search(Product.search_text, "футболка", "postgresql")
+    sql = str(
+        select(Product.id).where(clause.condition).order_by(*clause.order_by).compile(dialect=postgresql.dialect())
+    )
+    assert "<%" in sql
+    assert "word_similarity" in sql
+    assert build_search(Product.search_text, "   ", "postgresql") is None
+
+
+async def test_product_search_ranked(client, auth_headers):
+    """Search is case/ё-insensitive, matches all tokens and ranks exact barcode and prefix first."""
+    company_resp = await client.post("/api/v1/companies", json={"inn": "6667778880"}, headers=auth_headers)
+    company_id = company_resp.json()["id"]
+    for name, barcode in (
+        ("Платье летнее синее", "SRCH-1"),
+        ("Синее платье", "SRCH-2"),
+        ("Ёлочная игрушка", "SRCH-3"),
+    ):
+        await client.post(
+            "/api/v1/products",
+            json={"company_id": company_id, "name": name, "barcode": barcode},
+            headers=auth_headers,
+        )
+
+    response = await client.get(
+        f"/api/v1/products?company_id={company_id}&search=ПЛАТЬЕ", headers=auth_headers
+    )
+    names = [item["name"] for item in response.json()["items"]]
+    assert names == ["Платье летнее синее", "Синее платье"]
+
+    multi = await client.get(f"/api/v1/products?company_id={company_id}&search=синее летнее", headers=auth_headers)
+    assert [item["name"] for item in multi.json()["items"]] == ["Платье летнее синее"]
+
+    yo = await client.get(f"/api/v1/products?company_id={company_id}&search=елочная", headers=auth_headers)
+    assert yo.json()["total"] == 1
+
+    by_barcode = await client.get(f"/api/v1/products?company_id={company_id}&search=SRCH-2", headers=auth_headers)
+    assert by_barcode.json()["items"][0]["barcode"] == "SRCH-2"
+
+    # Курсор по поиску: те же результаты и тот же порядок, что и одной страницей.
+    url = f"/api/v1/products?company_id={company_id}&search=платье&limit=1"
+    first = (await client.get(url, headers=auth_headers)).json()
+    walked = [item["name"] for item in first["items"]]
+    cursor = first["next_cursor"]
+    while cursor:
+        page = (await client.get(f"{url}&cursor={cursor}", headers=auth_headers)).json()
+        assert "total" not in page
+        walked.extend(item["name"] for item in page["items"])
+        cursor = page["next_cursor"]
+    assert walked == names
+    plain = (await client.get(f"/api/v1/products?company_id={company_id}&limit=1", headers=auth_headers)).json()
+    wrong = await client.get(f"{url}&cursor={plain['next_cursor']}", headers=auth_headers)
+    assert wrong.status_code == 400
@@ -1,4 +1,9 @@
 """Services (pricing) and calculator tests."""
+from io import BytesIO
+from unittest.mock import AsyncMock, patch
+
+from app.services.catalog import CatalogCache
+from app.services.price_list import price_list_artifacts
 
 
 async def test_calculate_empty_items(client, auth_headers):
@@ -72,3 +77,95 @@ async def test_calculate_inactive_service(client, auth_headers, db_session, admi
         headers=auth_headers,
     )
     assert response.status_code == 400
+
+
+async def test_services_list_etag_revalidation(client, auth_headers, admin_headers):
+    """Repeat list with If-None-Match gets 304; an admin change invalidates the catalog cache."""
+    create = await client.post(
+        "/api/v1/services",
+        json={"category": "ETag", "name": "Маркировка", "price": "5.00", "unit": "шт"},
+        headers=admin_headers,
+    )
+    service_id = create.json()["id"]
+
+    first = await client.get("/api/v1/services?category=ETag", headers=auth_headers)
+    assert first.status_code == 200
+    assert first.headers["cache-control"] == "private, no-cache"
+    assert [s["price"] for s in first.json()] == ["5.00"]
+    etag = first.headers["etag"]
+
+    repeat = await client.get("/api/v1/services?category=ETag", headers={**auth_headers, "If-None-Match": etag})
+    assert repeat.status_code == 304
+    assert repeat.content == b""
+
+    await client.patch(f"/api/v1/services/{service_id}", json={"price": "6.50"}, headers=admin_headers)
+    changed = await client.get("/api/v1/services?category=ETag", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert [s["price"] for s in changed.json()] == ["6.50"]
+
+    categories = await client.get("/api/v1/services/categories", headers=auth_headers)
+    assert "ETag" in categories.json()
+    calc = await client.post(
+        "/api/v1/services/calculate",
+        json={"items": [{"service_id": service_id, "quantity": 2}]},
+        headers=auth_headers,
+    )
+    assert calc.json()["total"] == "13.00"
+
+
+async def test_destinations_list_etag(client, auth_headers, admin_headers):
+    created = await client.post("/api/v1/destinations", json={"name": "Электросталь"}, headers=admin_headers)
+    assert created.status_code == 200
+    first = await client.get("/api/v1/destinations", headers=auth_headers)
+    assert "Электросталь" in [d["name"] for d in first.json()]
+    repeat = await client.get("/api/v1/destinations", headers={**auth_headers, "If-None-Match": first.headers["etag"]})
+    assert repeat.status_code == 304
+    weak_list = f'W/"stale", W/{first.headers["etag"]}'
+    weak = await client.get("/api/v1/destinations", headers={**auth_headers, "If-None-Match": weak_list})
+    assert weak.status_code == 304
+    other = await client.get("/api/v1/destinations", headers={**auth_headers, "If-None-Match": '"stale", W/"old"'})
+    assert other.status_code == 200
+    anything = await client.get("/api/v1/destinations", headers={**auth_headers, "If-None-Match": "*"})
+    assert anything.status_code == 304
+
+    await client.delete(f"/api/v1/destinations/{created.json()['id']}", headers=admin_headers)
+    after = await client.get("/api/v1/destinations", headers=auth_headers)
+    assert "Электросталь" not in [d["name"] for d in after.json()]
+
+
+async def test_catalog_reload_raced_by_invalidate_is_not_cached(db_session):
+    """A snapshot loaded while invalidate() ran is returned once but not kept for the TTL."""
+    cache = CatalogCache()
+
+    class InvalidatingSession:
+        async def execute(self, stmt):
+            cache.invalidate()
+            return await db_session.execute(stmt)
+
+    await cache.get(InvalidatingSession())
+    assert cache._snapshot is None
+    snapshot = await cache.get(db_session)
+    assert cache._snapshot is snapshot
+
+
+async def test_services_export_built_once_per_catalog_version(client, admin_headers):
+    """Excel export is built once per catalog version; a service change triggers rebuild in the background."""
+    price_list_artifacts.clear()
+    with patch("app.services.price_list.export_services", side_effect=lambda services: BytesIO(b"xlsx")) as build, patch(
+        "app.api.v1.routes.services.prebuild_price_lists", AsyncMock()
+    ) as prebuild:
+        first = await client.get("/api/v1/services/export", headers=admin_headers)
+        second = await client.get("/api/v1/services/export", headers=admin_headers)
+        assert first.content == second.content == b"xlsx"
+        assert build.call_count == 1
+
+        await client.post(
+            "/api/v1/services",
+            json={"category": "Export", "name": "Новая услуга", "price": "1.00", "unit": "шт"},
+            headers=admin_headers,
+        )
+        prebuild.assert_awaited_once()
+        await client.get("/api/v1/services/export", headers=admin_headers)
+        assert build.call_count == 2
+    price_list_artifacts.clear()
@@ -0,0 +1,120 @@
+"""Shipment auto-close: set-based batches, order completion, queued notifications."""
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import select
+
+from app.db.models.notification_outbox import NotificationOutbox
+from app.db.models.order import Order
+from app.db.models.shipment_request import ShipmentRequest
+from app.services.leader import LeaderConnection, LeaderLock, advisory_lock_key
+from app.services.shipment_scheduler import close_expired_shipments
+
+
+async def test_close_expired_shipments_in_batches(client, auth_headers, db_session):
+    company = await client.post("/api/v1/companies", json={"inn": "6667778884"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    product = await client.post(
+        "/api/v1/products", json={"company_id": company_id, "name": "Отгрузка"}, headers=auth_headers
+    )
+    order_ids = []
+    for _ in range(3):
+        order = await client.post(
+            "/api/v1/orders",
+            json={"company_id": company_id, "items": [{"product_id": product.json()["id"], "planned_qty": 1}]},
+            headers=auth_headers,
+        )
+        order_ids.append(order.json()["id"])
+    yesterday = date.today() - timedelta(days=1)
+    shipments = [
+        ShipmentRequest(company_id=company_id, order_id=order_id, destination_type="WB", delivery_date=yesterday)
+        for order_id in order_ids
+    ]
+    future = ShipmentRequest(
+        company_id=company_id, destination_type="WB", delivery_date=date.today() + timedelta(days=3)
+    )
+    db_session.add_all([*shipments, future])
+    await db_session.commit()
+    stats_before = (await client.get(f"/api/v1/companies/{company_id}/stats", headers=auth_headers)).json()
+
+    closed = await close_expired_shipments(db_session, batch_size=2)
+    assert closed >= 3
+
+    statuses = dict(
+        (
+            await db_session.execute(
+                select(ShipmentRequest.id, ShipmentRequest.status).where(ShipmentRequest.company_id == company_id)
+            )
+        ).all()
+    )
+    assert all(statuses[shipment.id] == "Отгружено" for shipment in shipments)
+    assert statuses[future.id] != "Отгружено"
+    order_statuses = (await db_session.execute(select(Order.status).where(Order.id.in_(order_ids)))).scalars().all()
+    assert set(order_statuses) == {"Завершено"}
+    queued = (
+        await db_session.execute(
+            select(NotificationOutbox.coalesce_key).where(
+                NotificationOutbox.coalesce_key.in_([f"order:{order_id}" for order_id in order_ids])
+            )
+        )
+    ).scalars().all()
+    assert len(queued) == 3
+    stats_after = (await client.get(f"/api/v1/companies/{company_id}/stats", headers=auth_headers)).json()
+    assert stats_after["orders_open"] == stats_before["orders_open"] - 3
+
+    assert await close_expired_shipments(db_session) == 0
+
+
+async def test_leader_lock_without_postgres_is_always_leader(db_session):
+    lock = LeaderLock("test-job", LeaderConnection(db_session.get_bind()))
+    assert await lock.acquire() is True
+    await lock.release()
+    assert advisory_lock_key("a") == advisory_lock_key("a") != advisory_lock_key("b")
+
+
+async def test_leader_locks_share_one_connection():
+    """All jobs of the process lock on one connection; it is returned once no job is led."""
+    free = {advisory_lock_key("job-a"), advisory_lock_key("job-b")}
+    connects, closed = [], []
+
+    class Result:
+        def __init__(self, value):
+            self.value = value
+
+        def scalar(self):
+            return self.value
+
+    class Conn:
+        async def execute(self, stmt, params=None):
+            sql = str(stmt)
+            if "pg_try_advisory_lock" in sql:
+                return Result(params["key"] in free)
+            return Result(1)
+
+        async def commit(self):
+            pass
+
+        async def close(self):
+            closed.append(self)
+
+    class Engine:
+        dialect = SimpleNamespace(name="postgresql")
+
+        async def connect(self):
+            connects.append(1)
+            return Conn()
+
+    shared = LeaderConnection(Engine())
+    job_a, job_b, job_c = (LeaderLock(name, shared) for name in ("job-a", "job-b", "job-c"))
+    assert await job_a.acquire() and await job_b.acquire()
+    assert not await job_c.acquire()
+    assert await job_a.acquire()
+    assert len(connects) == 1 and closed == []
+    await job_a.release()
+    assert closed == []
+    await job_b.release()
+    assert len(closed) == 1
+
+    # Не лидер ни в одной задаче — соединение сразу возвращается в пул.
+    assert not await job_c.acquire()
+    assert len(connects) == 2 and len(closed) == 2
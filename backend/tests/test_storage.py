@@ -24,3 +24,34 @@ async def test_upload_then_head_check_availability(monkeypatch):
         respx.head(url).mock(return_value=httpx.Response(200))
         available = await service.head_check(url)
     assert available is True
+
+
+def test_s3_client_shared_between_instances(monkeypatch):
+    """All S3Service instances reuse one process-wide client."""
+    from app.services import s3 as s3_module
+
+    created = []
+    monkeypatch.setattr(s3_module, "_client", None)
+    monkeypatch.setattr("boto3.client", lambda *args, **kwargs: created.append(kwargs) or object())
+    first = S3Service()._get_client()
+    second = S3Service()._get_client()
+    assert first is second
+    assert len(created) == 1
+    assert created[0]["config"].max_pool_connections > 1
+
+
+@pytest.mark.asyncio
+async def test_upload_bytes_async_runs_in_s3_pool(monkeypatch):
+    """upload_bytes_async offloads the blocking upload to the S3 thread pool."""
+    import threading
+
+    threads = []
+
+    def fake_upload(self, key, data, content_type):
+        threads.append(threading.current_thread().name)
+        return key
+
+    monkeypatch.setattr(S3Service, "upload_bytes", fake_upload)
+    key = await S3Service().upload_bytes_async("photos/x.jpg", b"data", "image/jpeg")
+    assert key == "photos/x.jpg"
+    assert threads and threads[0].startswith("s3")
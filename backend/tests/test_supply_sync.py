@@ -0,0 +1,156 @@
+"""Background supply sync: incremental paging, upsert, open supply refresh, error state."""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, sessionmaker
+
+from app.core.config import settings
+from app.db.models.fbo_supply import FBOSupply, MarketplaceSyncState
+from app.services.supply_sync import sync_company_supplies
+
+
+def _wb_api(pages: dict[int, tuple[list[dict], int]]) -> MagicMock:
+    api = MagicMock()
+    api.get_supplies_page = AsyncMock(side_effect=lambda limit, next_: pages.get(next_, ([], next_)))
+    api.get_supply = AsyncMock(return_value={"done": False})
+    api.get_supply_boxes = AsyncMock(return_value=[{"id": "WB-TRBX-1"}, {"id": "WB-TRBX-2"}])
+    return api
+
+
+async def test_sync_wb_supplies_incremental(client, auth_headers, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "SUPPLY_SYNC_PAGE_SIZE", 2)
+    company = await client.post("/api/v1/companies", json={"inn": "6667778886"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    api = _wb_api(
+        {
+            0: ([{"id": "WB-GI-1", "done": True}, {"id": "WB-GI-2", "done": False}], 20),
+            20: ([{"id": "WB-GI-3", "done": False}], 30),
+        }
+    )
+
+    await sync_company_supplies(db_session, company_id, clients={"wb": api})
+
+    supplies = (
+        await db_session.execute(
+            select(FBOSupply)
+            .where(FBOSupply.company_id == company_id)
+            .options(selectinload(FBOSupply.boxes))
+            .execution_options(populate_existing=True)
+        )
+    ).scalars().all()
+    by_external = {supply.external_supply_id: supply for supply in supplies}
+    assert set(by_external) == {"WB-GI-1", "WB-GI-2", "WB-GI-3"}
+    assert by_external["WB-GI-1"].status == "completed"
+    assert by_external["WB-GI-1"].boxes == []
+    assert sorted(box.external_box_id for box in by_external["WB-GI-2"].boxes) == ["WB-TRBX-1", "WB-TRBX-2"]
+    assert by_external["WB-GI-3"].synced_at is not None
+    state = await db_session.scalar(
+        select(MarketplaceSyncState).where(MarketplaceSyncState.company_id == company_id)
+    )
+    assert state.cursor == "30"
+    assert state.last_error is None
+
+    # Следующий запуск продолжает с курсора; повтор коробов не дублирует их.
+    api.get_supplies_page.reset_mock()
+    await sync_company_supplies(db_session, company_id, clients={"wb": api})
+    assert api.get_supplies_page.await_args.kwargs["next_"] == 30
+    supply = (
+        await db_session.execute(
+            select(FBOSupply)
+            .where(FBOSupply.external_supply_id == "WB-GI-2")
+            .options(selectinload(FBOSupply.boxes))
+            .execution_options(populate_existing=True)
+        )
+    ).scalar_one()
+    assert len(supply.boxes) == 2
+
+
+async def test_sync_records_marketplace_error(client, auth_headers, db_session):
+    company = await client.post("/api/v1/companies", json={"inn": "6667778887"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    api = MagicMock()
+    api.get_supplies_page = AsyncMock(return_value=None)
+
+    assert await sync_company_supplies(db_session, company_id, clients={"wb": api}) == 0
+    state = await db_session.scalar(
+        select(MarketplaceSyncState)
+        .where(MarketplaceSyncState.company_id == company_id)
+        .execution_options(populate_existing=True)
+    )
+    assert state.last_error == "WB API недоступен"
+    assert state.cursor is None
+
+
+async def test_sync_ozon_loads_details_concurrently(client, auth_headers, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "SUPPLY_SYNC_DETAIL_CONCURRENCY", 2)
+    company = await client.post("/api/v1/companies", json={"inn": "6667778900"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    in_flight = peak = 0
+
+    async def get_supply_order(supply_order_id: int) -> dict:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0)
+        in_flight -= 1
+        state = "ORDER_STATE_COMPLETED" if supply_order_id == 501 else "ORDER_STATE_DATA_FILLING"
+        return {"state": state, "drop_off_warehouse": {"name": f"Склад {supply_order_id}"}}
+
+    api = MagicMock()
+    api.list_supply_order_ids = AsyncMock(return_value=([501, 502, 503, 504, 505], 505))
+    api.get_supply_order = AsyncMock(side_effect=get_supply_order)
+
+    await sync_company_supplies(db_session, company_id, clients={"ozon": api})
+
+    assert peak == 2
+    supplies = (
+        await db_session.execute(select(FBOSupply).where(FBOSupply.company_id == company_id))
+    ).scalars().all()
+    by_external = {supply.external_supply_id: supply for supply in supplies}
+    assert set(by_external) == {"501", "502", "503", "504", "505"}
+    assert by_external["501"].status == "completed"
+    assert by_external["503"].warehouse_name == "Склад 503"
+
+
+async def test_sync_calls_marketplace_outside_transaction(client, auth_headers, engine, monkeypatch):
+    """No transaction is open during API calls; pages already pulled survive a later failure."""
+    monkeypatch.setattr(settings, "SUPPLY_SYNC_PAGE_SIZE", 1)
+    company = await client.post("/api/v1/companies", json={"inn": "6667778908"}, headers=auth_headers)
+    company_id = company.json()["id"]
+    async_session = sessionmaker(engine, class_=AsyncSession)
+    open_during_call = []
+
+    async with async_session() as db:
+
+        def outside_transaction(result):
+            async def call(*args, **kwargs):
+                open_during_call.append(db.in_transaction())
+                return result(*args, **kwargs) if callable(result) else result
+
+            return call
+
+        pages = {0: ([{"id": "WB-TX-1"}], 40)}
+        api = MagicMock()
+        # Вторая страница — ошибка API: первая уже закоммичена вместе с курсором.
+        api.get_supplies_page = AsyncMock(side_effect=outside_transaction(lambda limit, next_: pages.get(next_)))
+        assert await sync_company_supplies(db, company_id, clients={"wb": api}) == 0
+
+        api.get_supplies_page = AsyncMock(side_effect=outside_transaction(lambda limit, next_: ([], next_)))
+        api.get_supply = AsyncMock(side_effect=outside_transaction({"done": False}))
+        api.get_supply_boxes = AsyncMock(side_effect=outside_transaction([{"id": "WB-TX-BOX"}]))
+        assert await sync_company_supplies(db, company_id, clients={"wb": api}) == 1
+
+    assert open_during_call and not any(open_during_call)
+    async with async_session() as db:
+        state = await db.scalar(select(MarketplaceSyncState).where(MarketplaceSyncState.company_id == company_id))
+        assert state.cursor == "40"
+        assert state.last_error is None
+        supply = (
+            await db.execute(
+                select(FBOSupply).where(FBOSupply.company_id == company_id).options(selectinload(FBOSupply.boxes))
+            )
+        ).scalar_one()
+        assert supply.external_supply_id == "WB-TX-1"
+        assert [box.external_barcode for box in supply.boxes] == ["WB-TX-BOX"]
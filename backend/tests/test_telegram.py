@@ -0,0 +1,32 @@
+"""Telegram documents: repeated sends reuse the uploaded file_id."""
+from unittest.mock import AsyncMock, patch
+
+import httpx
+
+from app.core.config import settings
+from app.services.telegram import document_file_ids, send_cached_document
+
+
+def _response(status_code: int, body: dict) -> httpx.Response:
+    return httpx.Response(status_code, json=body, request=httpx.Request("POST", "https://api.telegram.org"))
+
+
+async def test_send_cached_document_reuses_file_id_and_reuploads_on_rejection():
+    document_file_ids.clear()
+    uploaded = _response(200, {"ok": True, "result": {"document": {"file_id": "FILE-1"}}})
+    responses = [uploaded, _response(200, {"ok": True}), _response(400, {"ok": False}), uploaded]
+    post = AsyncMock(side_effect=responses)
+    with patch.object(settings, "TELEGRAM_BOT_TOKEN", "token"), patch.object(httpx.AsyncClient, "post", post):
+        assert await send_cached_document(1, b"price-list", "prajs.pdf") is True
+        assert "files" in post.await_args_list[0].kwargs
+
+        assert await send_cached_document(2, b"price-list", "prajs.pdf") is True
+        reuse = post.await_args_list[1].kwargs
+        assert "files" not in reuse
+        assert reuse["data"]["document"] == "FILE-1"
+
+        # file_id отклонён (400) — файл загружается заново.
+        assert await send_cached_document(3, b"price-list", "prajs.pdf") is True
+        assert "files" in post.await_args_list[3].kwargs
+    assert post.await_count == 4
+    document_file_ids.clear()
@@ -0,0 +1,68 @@
+"""Size-capped upload reading."""
+from io import BytesIO
+
+import pytest
+from fastapi import UploadFile
+
+from app.services.uploads import UploadTooLarge, read_upload, read_upload_bytes
+
+
+class _CountingFile(BytesIO):
+    """BytesIO that records how many bytes were read."""
+
+    def __init__(self, data: bytes) -> None:
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+async def test_read_upload_spools_large_file(monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_THRESHOLD_BYTES", 1024)
+    data = bytes(range(256)) * 800
+    upload = await read_upload(UploadFile(BytesIO(data), filename="a.bin"), max_bytes=len(data))
+    try:
+        assert upload.size == len(data)
+        assert upload.file.read() == data  # файл отдаётся с начала — его можно сразу передать в S3
+        assert upload.getvalue() == data
+    finally:
+        upload.close()
+
+
+async def test_read_upload_bytes_returns_content():
+    data = b"photo" * 30_000
+    source = _CountingFile(data)
+    assert await read_upload_bytes(UploadFile(source, filename="p.jpg"), max_bytes=len(data)) == data
+    assert source.bytes_read == len(data)
+
+
+async def test_read_upload_aborts_past_limit():
+    source = _CountingFile(b"y" * 1_000_000)
+    with pytest.raises(UploadTooLarge):
+        await read_upload_bytes(UploadFile(source, filename="big.bin"), max_bytes=100_000)
+    assert source.bytes_read < 200_000
+
+
+async def test_read_upload_rejects_by_declared_size():
+    source = _CountingFile(b"z" * 10)
+    with pytest.raises(UploadTooLarge):
+        await read_upload(UploadFile(source, size=500, filename="f.bin"), max_bytes=100)
+    assert source.bytes_read == 0
+
+
+async def test_product_photo_upload_too_large(client, auth_headers, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE_BYTES", 1000)
+    response = await client.post(
+        "/api/v1/products/1/photo",
+        files={"file": ("big.jpg", b"\xff" * 5000, "image/jpeg")},
+        headers=auth_headers,
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Файл слишком большой"
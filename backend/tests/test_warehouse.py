@@ -118,6 +118,73 @@ async def test_barcode_validate_in_order_order_not_found(client, warehouse_heade
     assert "заявк" in data.get("message", "").lower()
 
 
+async def test_barcode_validate_in_order_batch(client, auth_headers, warehouse_headers):
+    """Batch validate-in-order merges duplicate scans and reports per-barcode remainders."""
+    company_resp = await client.post("/api/v1/companies", json={"inn": "1112223344"}, headers=auth_headers)
+    company_id = company_resp.json()["id"]
+    product_ids = []
+    for name, barcode in (("Пакет А", "BATCH-SCAN-A"), ("Пакет Б", "BATCH-SCAN-B")):
+        product_resp = await client.post(
+            "/api/v1/products",
+            json={"company_id": company_id, "name": name, "barcode": barcode},
+            headers=auth_headers,
+        )
+        product_ids.append(product_resp.json()["id"])
+    order_resp = await client.post(
+        "/api/v1/orders",
+        json={
+            "company_id": company_id,
+            "items": [
+                {"product_id": product_ids[0], "planned_qty": 4},
+                {"product_id": product_ids[1], "planned_qty": 2},
+            ],
+        },
+        headers=auth_headers,
+    )
+    order_id = order_resp.json()["id"]
+
+    response = await client.post(
+        "/api/v1/warehouse/barcode/validate-in-order/batch",
+        json={
+            "order_id": order_id,
+            "scans": [
+                {"barcode": "BATCH-SCAN-A", "count": 2},
+                {"barcode": "UNKNOWN-SCAN"},
+                {"barcode": " BATCH-SCAN-A ", "count": 1},
+                {"barcode": "BATCH-SCAN-B", "count": 3},
+            ],
+        },
+        headers=warehouse_headers,
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["order_found"] is True
+    items = {item["barcode"]: item for item in data["items"]}
+    assert [item["barcode"] for item in data["items"]] == ["BATCH-SCAN-A", "UNKNOWN-SCAN", "BATCH-SCAN-B"]
+    assert items["BATCH-SCAN-A"]["count"] == 3
+    assert items["BATCH-SCAN-A"]["found"] is True
+    assert items["BATCH-SCAN-A"]["remaining_to_receive"] == 4
+    assert items["BATCH-SCAN-A"]["excess_to_receive"] == 0
+    assert items["BATCH-SCAN-A"]["excess_to_pack"] == 3
+    assert items["BATCH-SCAN-B"]["excess_to_receive"] == 1
+    assert "сверх плана 1" in items["BATCH-SCAN-B"]["message"]
+    assert items["BATCH-SCAN-B"]["order_item"]["product_name"] == "Пакет Б"
+    assert items["UNKNOWN-SCAN"]["found"] is False
+
+
+async def test_barcode_validate_in_order_batch_order_not_found(client, warehouse_headers):
+    """Batch validate-in-order reports missing order."""
+    response = await client.post(
+        "/api/v1/warehouse/barcode/validate-in-order/batch",
+        json={"order_id": 99998, "scans": [{"barcode": "4601234567890"}]},
+        headers=warehouse_headers,
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["order_found"] is False
+    assert data["items"] == []
+
+
 async def test_barcode_validate_box_found(client, auth_headers, warehouse_headers):
     """Validate returns type box when barcode matches FBO supply box."""
     company_resp = await client.post("/api/v1/companies", json={"inn": "1112223343"}, headers=auth_headers)
@@ -463,3 +530,87 @@ async def test_packing_status_flow_and_complete(client, auth_headers, warehouse_
     order_final = next((o for o in list_resp3.json()["items"] if o["id"] == order_id), None)
     assert order_final is not None
     assert order_final["status"] == "Завершено"
+
+
+async def _received_two_line_order(client, auth_headers, warehouse_headers, inn: str) -> tuple[int, list[dict]]:
+    """Create order with two products, receive 5 of each; return order_id and order items."""
+    company_resp = await client.post("/api/v1/companies", json={"inn": inn}, headers=auth_headers)
+    company_id = company_resp.json()["id"]
+    product_ids = []
+    for name in ("Батч 1", "Батч 2"):
+        product_resp = await client.post(
+            "/api/v1/products",
+            json={"company_id": company_id, "name": name},
+            headers=auth_headers,
+        )
+        product_ids.append(product_resp.json()["id"])
+    order_resp = await client.post(
+        "/api/v1/orders",
+        json={"company_id": company_id, "items": [{"product_id": pid, "planned_qty": 5} for pid in product_ids]},
+        headers=auth_headers,
+    )
+    order_id = order_resp.json()["id"]
+    items = (await client.get(f"/api/v1/orders/{order_id}/items", headers=auth_headers)).json()
+    await client.post(
+        "/api/v1/warehouse/receiving/complete",
+        json={
+            "order_id": order_id,
+            "items": [{"order_item_id": item["id"], "received_qty": 5, "defect_qty": 0} for item in items],
+        },
+        headers=warehouse_headers,
+    )
+    return order_id, items
+
+
+async def test_packing_batch_applies_all_records(client, auth_headers, warehouse_headers):
+    """Batch packing increments item/order counters and returns the derived status."""
+    order_id, items = await _received_two_line_order(client, auth_headers, warehouse_headers, "1112223345")
+    records = [
+        {
+            "order_id": order_id,
+            "order_item_id": item["id"],
+            "product_id": item["product_id"],
+            "employee_code": "EMP1",
+            "quantity": 5,
+        }
+        for item in items
+    ]
+    response = await client.post(
+        "/api/v1/warehouse/packing/records/batch", json={"records": records}, headers=warehouse_headers
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 2
+    assert data["orders"] == [{"order_id": order_id, "packed_qty": 10, "status": "Готово к отгрузке"}]
+    items_after = (await client.get(f"/api/v1/orders/{order_id}/items", headers=auth_headers)).json()
+    assert [item["packed_qty"] for item in items_after] == [5, 5]
+
+
+async def test_packing_batch_is_all_or_nothing(client, auth_headers, warehouse_headers):
+    """Overpack in one record rejects the whole batch without partial updates."""
+    order_id, items = await _received_two_line_order(client, auth_headers, warehouse_headers, "1112223346")
+    records = [
+        {
+            "order_id": order_id,
+            "order_item_id": items[0]["id"],
+            "product_id": items[0]["product_id"],
+            "employee_code": "EMP1",
+            "quantity": 3,
+        },
+        {
+            "order_id": order_id,
+            "order_item_id": items[1]["id"],
+            "product_id": items[1]["product_id"],
+            "employee_code": "EMP1",
+            "quantity": 6,
+        },
+    ]
+    response = await client.post(
+        "/api/v1/warehouse/packing/records/batch", json={"records": records}, headers=warehouse_headers
+    )
+    assert response.status_code == 400
+    assert "перепаковк" in response.json()["detail"].lower()
+    items_after = (await client.get(f"/api/v1/orders/{order_id}/items", headers=auth_headers)).json()
+    assert [item["packed_qty"] for item in items_after] == [0, 0]
+    records_resp = await client.get(f"/api/v1/orders/{order_id}/packing-records", headers=auth_headers)
+    assert records_resp.json() == []
@@ -12,19 +12,11 @@ export function useOrderPhotos(orderId?: number) {
   });
 
   const upload = useMutation({
-    mutationFn: (payload: { orderId: number; file: File; photo_type?: string; product_id?: number }) => {
-      const formData = new FormData();
-      formData.append("file", payload.file);
-      const params = new URLSearchParams();
-      if (payload.photo_type) {
-        params.set("photo_type", payload.photo_type);
-      }
-      if (payload.product_id) {
-        params.set("product_id", String(payload.product_id));
-      }
-      const suffix = params.toString() ? `?${params.toString()}` : "";
-      return apiClient.apiForm<{ key: string }>(`/orders/${payload.orderId}/photo${suffix}`, formData);
-    },
+    mutationFn: (payload: { orderId: number; file: File; photo_type?: string; product_id?: number }) =>
+      apiClient.uploadPhotoDirect(`/orders/${payload.orderId}/photo`, payload.file, {
+        photo_type: payload.photo_type,
+        product_id: payload.product_id,
+      }),
     onSuccess: (_, payload) => {
       queryClient.invalidateQueries({ queryKey: ["order-photos", payload.orderId] });
     },
@@ -68,11 +68,8 @@ export function useProducts(companyId?: number, page = 1, limit = 20, search?: s
   });
 
   const uploadPhoto = useMutation({
-    mutationFn: (payload: { productId: number; file: File }) => {
-      const formData = new FormData();
-      formData.append("file", payload.file);
-      return apiClient.apiForm<{ key: string }>(`/products/${payload.productId}/photo`, formData);
-    },
+    mutationFn: (payload: { productId: number; file: File }) =>
+      apiClient.uploadPhotoDirect(`/products/${payload.productId}/photo`, payload.file),
   });
 
   const importExcel = useMutation({
@@ -136,7 +136,7 @@ export function OrderDetail() {
       <div className="rounded-xl border border-slate-200 bg-white p-4 shadow-soft">
         <div className="text-sm font-semibold text-slate-900">Фото</div>
         <div className="mt-2">
-          <PhotoGallery photos={photos.map((photo) => photo.url)} />
+          <PhotoGallery photos={photos.map((photo) => photo.thumb_url ?? photo.url)} />
         </div>
         <div className="mt-3">
           <PhotoUpload
@@ -169,7 +169,7 @@ export function PackingPage() {
             <div className="rounded-lg border border-slate-200 bg-white p-3 shadow-soft">
               <div className="text-sm font-semibold text-slate-900">Фото заявки</div>
               <div className="mt-2">
-                <PhotoGallery photos={photos.map((photo) => photo.url)} />
+                <PhotoGallery photos={photos.map((photo) => photo.thumb_url ?? photo.url)} />
               </div>
               <div className="mt-3">
                 <PhotoUpload
@@ -224,4 +224,32 @@ export async function downloadFile(path: string, fallbackFilename: string): Prom
   setTimeout(() => URL.revokeObjectURL(url), 5000);
 }
 
-export const apiClient = { api, apiForm, apiFormWithProgress, apiFile };
+type PhotoUploadTicket = { key: string; url: string; fields: Record<string, string> };
+
+/**
+ * Загрузка фото напрямую в S3: presigned POST от API, файл — в бакет, затем подтверждение.
+ * basePath — например `/orders/15/photo`; confirm — дополнительные поля подтверждения.
+ */
+async function uploadPhotoDirect(
+  basePath: string,
+  file: File,
+  confirm: Record<string, unknown> = {}
+): Promise<{ key: string }> {
+  const ticket = await api<PhotoUploadTicket>(`${basePath}/upload-url`, {
+    method: "POST",
+    body: JSON.stringify({ content_type: file.type }),
+  });
+  const formData = new FormData();
+  Object.entries(ticket.fields).forEach(([name, value]) => formData.append(name, value));
+  formData.append("file", file);
+  const response = await fetch(ticket.url, { method: "POST", body: formData });
+  if (!response.ok) {
+    throw new Error(`Не удалось загрузить файл в хранилище: ${response.status}`);
+  }
+  return api<{ key: string }>(`${basePath}/confirm`, {
+    method: "POST",
+    body: JSON.stringify({ ...confirm, key: ticket.key }),
+  });
+}
+
+export const apiClient = { api, apiForm, apiFormWithProgress, apiFile, uploadPhotoDirect };
@@ -82,6 +82,8 @@ export type OrderPhoto = {
   photo_type: string | null;
   product_id: number | null;
   created_at: string;
+  thumb_url?: string | null;
+  medium_url?: string | null;
 };
 
 export type Destination = {
@@ -139,5 +141,6 @@ export type FBOSupply = {
   status: string;
   warehouse_name: string | null;
   created_at: string;
+  synced_at?: string | null;
   boxes: FBOSupplyBox[];
 };